@@ -1,6 +1,125 @@
+import contextlib
+from dataclasses import asdict, dataclass
+
 import librosa
 import numpy as np
 
+from chords import recognise_chords
+from chroma import PITCH_CLASSES, ChromaSettings, compute_chroma
+from fingerprint import landmark_hashes, spectral_peaks
+from instruments import frame_features, load_tagger
+from structure import segment_structure
+from waveform import WaveformPyramid
+
+# Bump this whenever a change to the pipeline alters its results, so that
+# results cached by older versions are no longer reused.
+ALGORITHM_VERSION = 8
+
+# Krumhansl-Schmuckler key profiles
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.78, 3.98, 2.69, 3.34, 3.17])
+
+def _zscore(x, axis=-1):
+    # Standardise along an axis, leaving constant vectors at zero
+    x = x - x.mean(axis=axis, keepdims=True)
+    std = x.std(axis=axis, keepdims=True)
+    return np.divide(x, std, out=np.zeros_like(x, dtype=np.float64), where=std > 0)
+
+def _build_key_profiles():
+    # Row 2*i is the major profile rotated to root i and row 2*i + 1 the minor
+    rotations = (np.arange(12)[None, :] - np.arange(12)[:, None]) % 12
+    profiles = np.empty((24, 12))
+    profiles[0::2] = MAJOR_PROFILE[rotations]
+    profiles[1::2] = MINOR_PROFILE[rotations]
+    names = [f"{pitch} {mode}" for pitch in PITCH_CLASSES for mode in ("Major", "Minor")]
+    return _zscore(profiles), names
+
+# All 24 rotated profiles, standardised so a matrix product gives correlations
+KEY_PROFILES, KEY_NAMES = _build_key_profiles()
+
+@dataclass(frozen=True)
+class DecodeProfile:
+    """
+    How an audio file is decoded before analysis.
+
+    Attributes:
+        sr (int): The analysis sample rate the audio is resampled to.
+        res_type (str): The librosa/soxr resampler, e.g. 'soxr_hq' or the
+            much cheaper 'soxr_qq'.
+        channel (int): The channel to analyse, or None to downmix all
+            channels to mono.
+        offset (float): Where to start reading, in seconds.
+        duration (float): How many seconds to read, or None for the rest of the file.
+    """
+    sr: int = 22050
+    res_type: str = 'soxr_hq'
+    channel: int | None = None
+    offset: float = 0.0
+    duration: float | None = None
+
+    @classmethod
+    def fast_preview(cls):
+        """
+        A low-rate profile with a cheap resampler, for showing BPM and key
+        quickly before a full-quality pass.
+        """
+        return cls(sr=11025, res_type='soxr_qq')
+
+    def as_dict(self):
+        return asdict(self)
+
+# Candidate meters, keyed by the number of tracked beats per bar
+METERS = {2: "2/4", 3: "3/4", 4: "4/4", 5: "5/4", 6: "6/8", 7: "7/8"}
+
+def score_meters(beat_strengths, meters):
+    """
+    Scores how strongly each candidate meter's downbeats are accented.
+
+    For a meter of m beats the strengths are reshaped into a (bars, m) matrix
+    with a strided view, and each bar position is compared against the other
+    positions with a two-sample t statistic. The best position is taken as
+    the downbeat, so bars do not have to start at the first beat.
+
+    Args:
+        beat_strengths (np.ndarray): The onset strength at each beat.
+        meters (list[int]): Candidate numbers of beats per bar. Meters with
+            fewer than two full bars of beats are skipped.
+
+    Returns:
+        tuple: (meters, scores, phases) arrays for the meters that were scored.
+    """
+    strengths = np.asarray(beat_strengths, dtype=np.float64)
+    std = strengths.std()
+    scored, scores, phases = [], [], []
+    for m in meters:
+        n_bars = len(strengths) // m
+        if n_bars < 2:
+            continue
+        bars = strengths[:n_bars * m].reshape(n_bars, m)
+        position_means = bars.mean(axis=0)
+        other_means = (position_means.sum() - position_means) / (m - 1)
+        standard_error = std * np.sqrt(1 / n_bars + 1 / (n_bars * (m - 1)))
+        t_stats = (position_means - other_means) / standard_error if std > 0 else np.zeros(m)
+
+        phase = int(np.argmax(t_stats))
+        scored.append(m)
+        scores.append(t_stats[phase])
+        phases.append(phase)
+    return np.array(scored, dtype=int), np.array(scores), np.array(phases, dtype=int)
+
+def score_keys(chroma_vectors):
+    """
+    Correlates chroma vectors with all 24 key profiles at once.
+
+    Args:
+        chroma_vectors (np.ndarray): A (12,) vector or a (12, N) matrix of
+            chroma energies, one column per vector.
+
+    Returns:
+        np.ndarray: The (24,) or (24, N) Pearson correlations, ordered like KEY_NAMES.
+    """
+    return KEY_PROFILES @ _zscore(np.asarray(chroma_vectors, dtype=np.float64), axis=0) / 12
+
 class AudioAnalyser:
     """
     A class to analyse audio files and extract musical features.
@@ -10,22 +129,100 @@ class AudioAnalyser:
         y (np.ndarray): The audio time series (waveform).
         sr (int): The sample rate of the audio.
         bpm (float): The estimated tempo in beats per minute.
+        beat_times (np.ndarray): The time of every tracked beat in seconds.
         chromagram (np.ndarray): The chromagram of the audio.
+        chroma_settings (ChromaSettings): How the chromagram is computed.
+        chroma_hop_length (int): The number of samples between chromagram frames.
+        beat_chroma (np.ndarray): The (12, beats + 1) median chroma between
+            consecutive beats, from sync_chroma(). Column 0 covers the audio
+            before the first beat.
+        time_signature (str): The estimated time signature, e.g. "3/4".
+        meter_confidence (float): How clearly the time signature won, from 0 to 1.
+        downbeat_phase (int): The index of the first downbeat in beat_frames.
+        beats_per_bar (int): The number of beats in a bar of the time signature.
+        key (str): The estimated key, e.g. "C# Minor".
+        key_track (tuple): (start_times, keys) from estimate_key_track().
+        chord_track (tuple): (start_times, chords) from estimate_chords().
+        sections (tuple): (start_times, labels) from estimate_structure().
+        instruments (list[str]): The instruments tagged by tag_instruments().
+        instrument_scores (dict): Each instrument's share of segments in which
+            it was detected.
+        duration (float): The length of the audio in seconds.
+        waveform_overview (np.ndarray): A (2, bins) array of per-bin min/max amplitudes.
+        profile (DecodeProfile): How the file is decoded.
+        waveform_pyramid (WaveformPyramid): Multi-resolution min/max envelopes for plotting.
+        fingerprint (tuple): (hashes, offsets) from compute_fingerprint().
+        spectrogram (np.ndarray): The magnitude STFT shared by all feature stages.
+        mel_power (np.ndarray): The mel power spectrogram of spectrogram.
+        onset_env (np.ndarray): The onset strength envelope.
+        tempo (np.ndarray): The tempo reported by the shared beat tracker.
+        beat_frames (np.ndarray): The frame indices of the tracked beats.
     """
 
-    def __init__(self, file_path):
+    # The stages yielded by iter_analysis(), each with the approximate
+    # fraction of a typical run that has passed once it is done
+    STAGES = (
+        ('waveform', 0.35),
+        ('fingerprint', 0.45),
+        ('bpm', 0.75),
+        ('chroma', 0.85),
+        ('key', 0.87),
+        ('chords', 0.88),
+        ('meter', 0.9),
+        ('structure', 0.92),
+        ('instruments', 0.96),
+        ('overview', 1.0),
+    )
+
+    def __init__(self, file_path, profile=None, n_fft=2048, hop_length=512, telemetry=None, chroma=None):
         """
         Initializes the AudioAnalyser with the path to an audio file.
 
         Args:
             file_path (str): The full path to the .wav or .mp3 file.
+            profile (DecodeProfile): How to decode the file. Defaults to
+                22050 Hz mono with a high-quality resampler.
+            n_fft (int): The FFT window size used for the shared spectrogram.
+            hop_length (int): The number of samples between analysis frames.
+            telemetry (Telemetry): Collects per-stage timings and memory use
+                during iter_analysis(). Nothing is recorded if None.
+            chroma (ChromaSettings): How the chromagram is computed. Defaults
+                to STFT chroma at the analysis hop length.
         """
         self.file_path = file_path
+        self.profile = profile or DecodeProfile()
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.chroma_settings = chroma or ChromaSettings()
+        self.chroma_hop_length = self.chroma_settings.hop_length or hop_length
+        self.telemetry = telemetry
         self.y = None
         self.sr = None
         self.bpm = 0.0
+        self.beat_times = None
         self.chromagram = None
+        self.beat_chroma = None
         self.time_signature = "N/A"
+        self.meter_confidence = 0.0
+        self.downbeat_phase = 0
+        self.beats_per_bar = 0
+        self.key = "N/A"
+        self.key_track = None
+        self.chord_track = None
+        self.sections = None
+        self.instruments = None
+        self.instrument_scores = None
+        self.duration = 0.0
+        self.waveform_overview = None
+        self.waveform_pyramid = None
+        self.fingerprint = None
+
+        # Shared spectral front-end, filled in once by compute_features()
+        self.spectrogram = None
+        self.mel_power = None
+        self.onset_env = None
+        self.tempo = None
+        self.beat_frames = None
 
     def load_audio(self):
         """
@@ -33,145 +230,501 @@ class AudioAnalyser:
 
         Handles potential errors if the file cannot be loaded.
         """
+        profile = self.profile
         try:
             # librosa.load reads the audio file and returns the waveform (y)
             # and the sample rate (sr).
-            self.y, self.sr = librosa.load(self.file_path)
+            if profile.channel is None:
+                self.y, self.sr = librosa.load(
+                    self.file_path, sr=profile.sr, mono=True, res_type=profile.res_type,
+                    offset=profile.offset, duration=profile.duration
+                )
+            else:
+                # Pick the channel before resampling so only one is resampled
+                y, native_sr = librosa.load(
+                    self.file_path, sr=None, mono=False,
+                    offset=profile.offset, duration=profile.duration
+                )
+                y = y[profile.channel] if y.ndim > 1 else y
+                self.y = librosa.resample(y, orig_sr=native_sr, target_sr=profile.sr, res_type=profile.res_type)
+                self.sr = profile.sr
+            self.duration = len(self.y) / self.sr
+            self._count('bytes_decoded', self.y.nbytes)
             print(f"Successfully loaded {self.file_path}")
             return True
         except Exception as e:
             print(f"Error loading file: {e}")
             return False
 
+    def compute_spectrogram(self):
+        """
+        Computes the magnitude STFT that every later stage starts from.
+
+        This is split from compute_features() so the fingerprint can be
+        taken before the beat tracker runs. Calling this again is a no-op.
+
+        This must be called after load_audio().
+        """
+        if self.y is None:
+            print("Audio not loaded. Please call load_audio() first.")
+            return False
+
+        if self.spectrogram is None:
+            self.spectrogram = np.abs(librosa.stft(self.y, n_fft=self.n_fft, hop_length=self.hop_length))
+        return True
+
+    def compute_fingerprint(self):
+        """
+        Computes the landmark hashes that recognise this recording in other
+        files, from peaks of the shared spectrogram.
+
+        This must be called after load_audio().
+        """
+        if self.compute_spectrogram():
+            self.fingerprint = landmark_hashes(*spectral_peaks(self.spectrogram, self.sr, self.hop_length))
+
+    def compute_features(self):
+        """
+        Computes the spectral front-end shared by every analysis stage.
+
+        The magnitude STFT, onset envelope and beat frames are calculated a
+        single time and reused by extract_bpm(), extract_chromagram() and
+        estimate_time_signature(). Calling this again is a no-op.
+
+        This must be called after load_audio().
+        """
+        if self.y is None:
+            print("Audio not loaded. Please call load_audio() first.")
+            return False
+
+        if self.onset_env is not None:
+            return True
+
+        self.compute_spectrogram()
+
+        # This mirrors librosa.onset.onset_strength(y=...), which works on a
+        # log-power mel spectrogram, but reuses the STFT computed above.
+        self.mel_power = librosa.feature.melspectrogram(S=self.spectrogram**2, sr=self.sr)
+        self.onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(self.mel_power), sr=self.sr, hop_length=self.hop_length)
+
+        self.tempo, self.beat_frames = librosa.beat.beat_track(onset_envelope=self.onset_env, sr=self.sr, hop_length=self.hop_length)
+        return True
+
     def extract_bpm(self):
         """
         Extracts the beats per minute (BPM) from the audio.
 
         This must be called after load_audio().
         """
-        if self.y is not None:
-            # Using beat_track is generally more robust than feature.tempo
-            tempo, _ = librosa.beat.beat_track(y=self.y, sr=self.sr)
-            self.bpm = tempo
-        else:
-            print("Audio not loaded. Please call load_audio() first.")
+        if self.compute_features():
+            # The tempo comes from the beat tracker run by the shared front-end,
+            # which is generally more robust than feature.tempo
+            self.bpm = float(np.median(self.tempo))
+            self.beat_times = librosa.frames_to_time(self.beat_frames, sr=self.sr, hop_length=self.hop_length)
 
     def extract_chromagram(self):
         """
         Creates a chromagram from the audio signal.
 
         A chromagram represents the 12 different pitch classes (C, C#, D, etc.)
+        The method and frame rate come from the chroma settings; STFT chroma
+        at the analysis hop length reuses the shared spectrogram.
+        """
+        if self.compute_features():
+            self.chromagram = compute_chroma(
+                self.y, self.sr, self.chroma_settings, hop_length=self.hop_length,
+                n_fft=self.n_fft, spectrogram=self.spectrogram
+            )
+
+    def sync_chroma(self):
+        """
+        Aggregates the chromagram between consecutive beats.
+
+        Each column of beat_chroma is the median of the chroma frames from
+        one beat to the next, which shrinks tens of thousands of frames to a
+        few hundred columns and smooths out passing notes and transients.
+
+        This must be called after extract_bpm() and extract_chromagram().
+        """
+        if self.chromagram is None or self.beat_times is None:
+            return
+        self.beat_chroma = librosa.util.sync(self.chromagram, self._beat_boundaries(), aggregate=np.median).astype(np.float32)
+
+    def beat_chroma_times(self):
+        """
+        Returns the start time in seconds of every beat_chroma column.
+        """
+        # The same segment boundaries librosa.util.sync uses
+        frames = librosa.util.fix_frames(self._beat_boundaries(), x_min=0, x_max=self.chromagram.shape[1], pad=True)
+        return frames[:-1] * self.chroma_hop_length / self.sr
+
+    def _beat_boundaries(self):
+        # Beats are counted in analysis hops, which can differ from chroma hops
+        boundaries = np.round(self.beat_times * self.sr / self.chroma_hop_length).astype(int)
+        return np.unique(np.clip(boundaries, 0, self.chromagram.shape[1]))
+
+    def instrument_features(self):
+        """
+        Computes the timbre features for tag_instruments().
+
+        Returns:
+            tuple: (features, frames_per_second), the frame features from the
+            shared spectrogram and their frame rate, or (None, 0) if there is
+            no spectrogram.
+        """
+        if self.spectrogram is None:
+            return None, 0
+        features = frame_features(self.spectrogram, self.mel_power, self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+        return features, self.sr / self.hop_length
+
+    def tag_instruments(self):
+        """
+        Tags the instruments heard in the track with the bundled model.
+
+        Every segment of the track is scored in one batch, so this adds a
+        small fraction of a second to a typical song.
+
+        This must be called after compute_features().
+        """
+        features, frames_per_second = self.instrument_features()
+        if features is not None:
+            self.instruments, self.instrument_scores = load_tagger().tag(features, frames_per_second)
+
+    def compute_waveform_overview(self, bins=4096):
+        """
+        Reduces the waveform to per-bin minimum and maximum amplitudes.
+
+        The overview is small enough to cache and to plot without touching
+        the full signal.
+
+        Args:
+            bins (int): The number of bins to reduce the waveform to.
+        """
+        if self.y is None:
+            print("Audio not loaded. Please call load_audio() first.")
+            return
+
+        bins = max(1, min(bins, len(self.y)))
+        samples_per_bin = len(self.y) // bins
+        frames = self.y[:bins * samples_per_bin].reshape(bins, samples_per_bin)
+        self.waveform_overview = np.stack([frames.min(axis=1), frames.max(axis=1)]).astype(np.float32)
+
+    def compute_waveform_pyramid(self):
+        """
+        Builds the multi-resolution waveform envelopes used for plotting.
+
+        The full waveform is used if it is loaded, otherwise the pyramid only
+        holds the min/max overview (e.g. for cached or streamed results).
         """
         if self.y is not None:
-            # librosa.feature.chroma_stft computes a chromagram from a waveform.
-            self.chromagram = librosa.feature.chroma_stft(y=self.y, sr=self.sr)
+            self.waveform_pyramid = WaveformPyramid.from_signal(self.y, self.sr)
+        elif self.waveform_overview is not None:
+            self.waveform_pyramid = WaveformPyramid.from_overview(self.waveform_overview, self.duration, self.sr)
         else:
             print("Audio not loaded. Please call load_audio() first.")
-            
+
     def estimate_key(self, chroma_features):
         """
         Estimates the key from chromagram features.
         """
-        # Pitch class names
-        pitches = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        
-        # Krumhansl-Schmuckler key profiles
-        major_profile = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
-        minor_profile = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.78, 3.98, 2.69, 3.34, 3.17])
-
-        # Sum chroma features across time and normalize
+        # Sum chroma features across time and score against every key at once
         chroma_sum = np.sum(chroma_features, axis=1)
-        chroma_sum_normalized = chroma_sum / np.sum(chroma_sum) if np.sum(chroma_sum) > 0 else chroma_sum
-        
-        correlations = []
-        # Correlate with all 12 major and 12 minor keys
-        for i in range(12):
-            # Major keys
-            major_key_profile = np.roll(major_profile, i)
-            correlations.append(np.corrcoef(chroma_sum_normalized, major_key_profile)[0, 1])
-            # Minor keys
-            minor_key_profile = np.roll(minor_profile, i)
-            correlations.append(np.corrcoef(chroma_sum_normalized, minor_key_profile)[0, 1])
-            
-        # Find the best match
-        best_match_index = np.argmax(correlations)
-        key_index = best_match_index // 2
-        is_major = best_match_index % 2 == 0
-        
-        key = pitches[key_index]
-        mode = "Major" if is_major else "Minor"
-        
-        return f"{key} {mode}"
-    
+        return KEY_NAMES[int(np.argmax(score_keys(chroma_sum)))]
+
+    def estimate_key_track(self, chroma_features, window=30.0, hop=5.0, times=None):
+        """
+        Estimates the key of overlapping windows across the whole chromagram.
+
+        Window sums come from a cumulative sum over time, and every window is
+        scored against every key in a single matrix product.
+
+        Args:
+            chroma_features (np.ndarray): A (12, T) chromagram, or beat-level
+                chroma with `times`.
+            window (float): The window length in seconds.
+            hop (float): The time between window starts in seconds.
+            times (np.ndarray): The start time of each column in seconds.
+                Defaults to evenly spaced chromagram frames.
+
+        Returns:
+            tuple: (start_times, keys), the start of each window in seconds
+            and its estimated key.
+        """
+        n_columns = chroma_features.shape[1]
+        if times is None:
+            times = np.arange(n_columns) * self.chroma_hop_length / self.sr
+        if n_columns == 0:
+            return np.zeros(0), []
+
+        # Windows shorter than the track cover it once
+        window = min(window, max(self.duration, times[-1]))
+        start_times = np.arange(0, max(0.0, max(self.duration, times[-1]) - window) + 1e-9, hop)
+        first = np.searchsorted(times, start_times)
+        last = np.maximum(np.searchsorted(times, start_times + window), first + 1)
+
+        cumulative = np.zeros((12, n_columns + 1))
+        np.cumsum(chroma_features, axis=1, out=cumulative[:, 1:])
+        window_sums = cumulative[:, np.minimum(last, n_columns)] - cumulative[:, np.minimum(first, n_columns - 1)]
+
+        best = np.argmax(score_keys(window_sums), axis=0)
+        return start_times, [KEY_NAMES[i] for i in best]
+
+    def estimate_chords(self):
+        """
+        Labels the track with a chord timeline.
+
+        Chords are decoded from the beat-synchronous chroma, one column per
+        beat, falling back to the full chromagram when there are no beats.
+
+        This must be called after sync_chroma().
+
+        Returns:
+            tuple: (start_times, chords) from chords.recognise_chords().
+        """
+        if self.beat_chroma is not None and self.beat_chroma.shape[1] > 1:
+            return recognise_chords(self.beat_chroma, self.beat_chroma_times(), self.duration)
+        if self.chromagram is None:
+            return np.zeros(0), []
+        times = np.arange(self.chromagram.shape[1]) * self.chroma_hop_length / self.sr
+        return recognise_chords(self.chromagram, times, self.duration)
+
+    def estimate_structure(self):
+        """
+        Splits the track into sections such as verses and choruses.
+
+        The chromagram is averaged down to one column per beat period, so an
+        hour-long recording is a few thousand columns, and only a band of
+        their self-similarity is ever computed. Fixed-length columns are
+        used rather than beat-synchronous ones so that passages where the
+        beat tracker finds no beats still get their share of columns.
+
+        This must be called after extract_bpm() and extract_chromagram().
+
+        Returns:
+            tuple: (start_times, labels) from structure.segment_structure().
+        """
+        if self.chromagram is None:
+            return np.zeros(0), []
+        period = 60.0 / self.bpm if self.bpm > 0 else 0.5
+        hop = max(1, int(round(period * self.sr / self.chroma_hop_length)))
+        n_columns = self.chromagram.shape[1] // hop
+        pooled = self.chromagram[:, :n_columns * hop].reshape(12, n_columns, hop).mean(axis=2)
+        return segment_structure(pooled, hop * self.chroma_hop_length / self.sr)
+
+    def beat_strengths(self, radius=2):
+        """
+        Returns the mean onset strength in a small window around every beat.
+
+        The window means are read off a cumulative sum of the onset envelope,
+        so the cost does not depend on the window size or a per-beat loop.
+
+        Args:
+            radius (int): The window covers frames [beat - radius, beat + radius).
+        """
+        if not self.compute_features():
+            return np.zeros(0)
+
+        beats = np.asarray(self.beat_frames, dtype=int)
+        cumulative = np.concatenate([[0.0], np.cumsum(self.onset_env, dtype=np.float64)])
+        start_frames = np.clip(beats - radius, 0, len(self.onset_env))
+        end_frames = np.clip(beats + radius, 0, len(self.onset_env))
+        counts = end_frames - start_frames
+        sums = cumulative[end_frames] - cumulative[start_frames]
+        return np.divide(sums, counts, out=np.zeros(len(beats)), where=counts > 0)
+
+    def harmonic_change(self):
+        """
+        Returns how much the beat-level chroma changes at every beat.
+
+        Chords tend to change on downbeats, so this complements the onset
+        accents. The value at beat i is one minus the cosine similarity of
+        the beat_chroma columns either side of it.
+        """
+        if self.beat_chroma is None or self.beat_chroma.shape[1] < 2:
+            return np.zeros(0)
+        unit = self.beat_chroma / np.maximum(np.linalg.norm(self.beat_chroma, axis=0), 1e-9)
+        return 1.0 - np.sum(unit[:, :-1] * unit[:, 1:], axis=0)
+
     def estimate_time_signature(self):
         """
-        Estimates the time signature of the track.
+        Estimates the time signature of the track from its beat accents.
+
+        Each beat's accent is its onset strength plus, once sync_chroma()
+        has run, how much the harmony changes there, both standardised.
+        Every candidate meter in METERS is scored by how much one beat
+        position in the bar stands out from the others, and the best-scoring
+        meter is returned. The winning meter's share of the scores is stored
+        in meter_confidence, the bar position of its accent in
+        downbeat_phase and its length in beats_per_bar.
         This is a simplified implementation and may not be accurate for all songs.
         """
-        if self.y is None:
-            print("Audio not loaded.")
-            return "N/A"
+        self.meter_confidence = 0.0
+        self.downbeat_phase = 0
+        self.beats_per_bar = 0
 
-        # Get the onset strength envelope
-        onset_env = librosa.onset.onset_detect(y=self.y, sr=self.sr, units='time')
-        
-        # Find the beats
-        tempo, beats = librosa.beat.beat_track(y=self.y, sr=self.sr)
-        
-        # Calculate beat intervals
-        beat_intervals = np.diff(beats)
-        
-        if len(beat_intervals) < 2:
+        if not self.compute_features():
             return "N/A"
 
-        # We can try to guess the meter by looking at the distribution of beat intervals
-        # This is a very simplified approach
-        # A more robust method would involve looking at accent patterns
-        
-        # Let's try to find a recurring pattern of 2, 3, or 4 beats
-        # We'll check the strength of onsets around each beat
-        
-        # Get onset strength
-        onset_strength = librosa.onset.onset_strength(y=self.y, sr=self.sr)
-        
-        beat_strengths = []
-        for beat_frame in beats:
-            # Get the onset strength at the beat frame
-            # We look at a small window around the beat
-            start_frame = max(0, beat_frame - 2)
-            end_frame = min(len(onset_strength), beat_frame + 2)
-            beat_strengths.append(np.mean(onset_strength[start_frame:end_frame]))
+        if len(self.beat_frames) < 3:
+            return "N/A"
 
+        self.beats_per_bar = 4
+        beat_strengths = self.beat_strengths()
         if len(beat_strengths) < 4:
             return "4/4" # Default for short samples
 
-        # Check for patterns of 2, 3, 4
-        best_meter = 4
-        max_diff = 0
+        accents = _zscore(beat_strengths)
+        change = self.harmonic_change()
+        if len(change) == len(accents):
+            accents = accents + _zscore(change)
 
-        for meter in [2, 3, 4]:
-            # Check the difference between the first beat and the others in a bar
-            avg_first_beat = np.mean([beat_strengths[i] for i in range(len(beat_strengths)) if i % meter == 0])
-            avg_other_beats = np.mean([beat_strengths[i] for i in range(len(beat_strengths)) if i % meter != 0])
-            
-            diff = avg_first_beat - avg_other_beats
-            
-            if diff > max_diff:
-                max_diff = diff
-                best_meter = meter
-                
-        return f"{best_meter}/4"
+        beats_per_bar, scores, phases = score_meters(accents, list(METERS))
+        if len(scores) == 0 or scores.max() <= 0:
+            return "4/4"
+
+        best = int(np.argmax(scores))
+        # Softmax over the candidates, so a clear winner approaches 1
+        weights = np.exp(scores - scores.max())
+        self.meter_confidence = float(weights[best] / weights.sum())
+        self.downbeat_phase = int(phases[best])
+        self.beats_per_bar = int(beats_per_bar[best])
+        return METERS[beats_per_bar[best]]
+
+    def downbeat_times(self):
+        """
+        Returns the time of the first beat of every bar in seconds.
+        """
+        if self.beat_times is None or self.beats_per_bar == 0:
+            return np.zeros(0)
+        return self.beat_times[self.downbeat_phase::self.beats_per_bar]
+
+    def iter_analysis(self):
+        """
+        Runs the pipeline one stage at a time.
+
+        Yields a (stage, fraction) pair after each stage finishes, where stage
+        is one of the names in STAGES and fraction is roughly how much of the
+        pipeline's run time has passed. Nothing is yielded if the file
+        cannot be loaded. This lets callers show each result as soon as it
+        exists, or stop between stages.
+        """
+        fractions = dict(self.STAGES)
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.start_run(self.file_path)
+
+        # Stages are timed between yields, so time spent by the caller
+        # handling each result is not charged to the pipeline
+        try:
+            with self._stage('waveform') as record:
+                loaded = self.load_audio()
+                record.update(self._array_sizes('y'))
+            if not loaded:
+                return
+            yield 'waveform', fractions['waveform']
+
+            # Callers can stop here if the recording has been analysed before
+            with self._stage('fingerprint') as record:
+                self.compute_fingerprint()
+                record['hashes'] = len(self.fingerprint[0])
+            yield 'fingerprint', fractions['fingerprint']
+
+            with self._stage('features') as record:
+                self.compute_features()
+                record.update(self._array_sizes('spectrogram', 'onset_env'))
+            with self._stage('bpm'):
+                self.extract_bpm()
+            yield 'bpm', fractions['bpm']
+
+            with self._stage('chroma') as record:
+                self.extract_chromagram()
+                self.sync_chroma()
+                record.update(self._array_sizes('chromagram', 'beat_chroma'))
+            yield 'chroma', fractions['chroma']
+
+            # Key and meter work on one chroma column per beat where possible
+            with self._stage('key'):
+                if self.beat_chroma is not None and self.beat_chroma.shape[1] > 1:
+                    self.key = self.estimate_key(self.beat_chroma)
+                    self.key_track = self.estimate_key_track(self.beat_chroma, times=self.beat_chroma_times())
+                else:
+                    self.key = self.estimate_key(self.chromagram)
+                    self.key_track = self.estimate_key_track(self.chromagram)
+            yield 'key', fractions['key']
+
+            with self._stage('chords'):
+                self.chord_track = self.estimate_chords()
+            yield 'chords', fractions['chords']
+
+            with self._stage('meter'):
+                self.time_signature = self.estimate_time_signature()
+            yield 'meter', fractions['meter']
+
+            with self._stage('structure'):
+                self.sections = self.estimate_structure()
+            yield 'structure', fractions['structure']
+
+            with self._stage('instruments'):
+                self.tag_instruments()
+            yield 'instruments', fractions['instruments']
+
+            with self._stage('overview'):
+                self.compute_waveform_overview()
+            yield 'overview', fractions['overview']
+        finally:
+            if telemetry is not None:
+                telemetry.end_run()
+
+    def analyse(self):
+        """
+        Loads the audio and runs every analysis stage without printing.
+
+        Returns:
+            bool: True if the file was loaded and analysed.
+        """
+        stages = [stage for stage, _ in self.iter_analysis()]
+        return len(stages) == len(self.STAGES)
 
     def run_analysis(self):
         """
         Runs the full analysis pipeline.
         """
-        if self.load_audio():
-            self.extract_bpm()
-            self.extract_chromagram()
-            self.time_signature = self.estimate_time_signature()
+        if self.analyse():
             self.print_results()
 
+    def _stage(self, name):
+        # Yields the stage's telemetry record, or a throwaway dict when
+        # telemetry is off, so stages can always annotate it
+        if self.telemetry is None:
+            return contextlib.nullcontext({})
+        return self.telemetry.stage(name)
+
+    def _count(self, name, value):
+        if self.telemetry is not None:
+            self.telemetry.count(name, value)
+
+    def _array_sizes(self, *names):
+        sizes = {}
+        for name in names:
+            array = getattr(self, name, None)
+            if isinstance(array, np.ndarray):
+                sizes[f'{name}_shape'] = list(array.shape)
+                sizes[f'{name}_mb'] = round(array.nbytes / 2**20, 2)
+        return sizes
+
+    def summary(self):
+        """
+        Returns the scalar analysis results as a JSON-serialisable dict.
+        """
+        return {
+            'file': self.file_path,
+            'duration': round(float(self.duration), 3),
+            'bpm': round(float(self.bpm), 2),
+            'key': self.key,
+            'time_signature': self.time_signature,
+            'instruments': ', '.join(self.instruments or []),
+        }
+
     def print_results(self):
         """
         Prints the results of the analysis to the console.
@@ -179,26 +732,85 @@ class AudioAnalyser:
         print("\n--- Analysis Results ---")
         if self.bpm is not None:
             print(f"Estimated BPM: {self.bpm:.2f}")
+        print(f"Estimated Key: {self.key}")
+        if self.key_track is not None:
+            # Report each point where the windowed key changes
+            changes = [(t, k) for i, (t, k) in enumerate(zip(*self.key_track)) if i == 0 or k != self.key_track[1][i - 1]]
+            if len(changes) > 1:
+                print("Key changes: " + ", ".join(f"{k} at {t:.0f}s" for t, k in changes))
+        if self.chord_track is not None and len(self.chord_track[1]):
+            chords = self.chord_track[1]
+            print(f"Chords: {' '.join(chords[:16])}" + (f" ... ({len(chords)} changes)" if len(chords) > 16 else ""))
+        print(f"Time Signature: {self.time_signature} (confidence {self.meter_confidence:.0%})")
+        if self.sections is not None and len(self.sections[1]) > 1:
+            print("Sections: " + ", ".join(f"{label} at {t:.0f}s" for t, label in zip(*self.sections)))
+        if self.instruments is not None:
+            print(f"Instruments: {', '.join(self.instruments) or 'None detected'}")
+        if self.beat_times is not None and len(self.beat_times):
+            downbeats = self.downbeat_times()
+            print(f"Beats: {len(self.beat_times)} in {len(downbeats)} bars, first downbeat at {downbeats[0]:.2f}s"
+                  if len(downbeats) else f"Beats: {len(self.beat_times)}")
         
         if self.chromagram is not None:
             # The chromagram is a 2D array (12 pitch classes x time frames).
             # For a simple summary, we can average it over time to see the
             # overall energy of each pitch class.
             mean_chroma = np.mean(self.chromagram, axis=1)
-            pitch_classes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
             
             print("\nChromagram (average energy per pitch class):")
-            for i, pitch in enumerate(pitch_classes):
+            for i, pitch in enumerate(PITCH_CLASSES):
                 print(f"{pitch:<3}: {mean_chroma[i]:.4f}")
         print("------------------------\n")
 
+def warm_up(chroma=None):
+    """
+    Runs the analysis stages on a few seconds of synthetic audio.
+
+    librosa imports its submodules on first use, and numba compiles many of
+    their functions as they are imported or first called, so the first
+    analysis in a process takes several seconds longer than the rest.
+    Calling this on a background thread at startup moves that cost off the
+    critical path and fills numba's on-disk cache for the functions that
+    support caching.
+
+    Args:
+        chroma (ChromaSettings): The chroma settings that will be used, so
+            their transform is warmed up too.
+    """
+    profile = DecodeProfile()
+    rng = np.random.default_rng(0)
+    # Long enough for the lowest octaves of a constant-Q transform
+    y = (0.1 * rng.standard_normal(4 * 44100)).astype(np.float32)
+
+    analyser = AudioAnalyser(None, profile=profile, chroma=chroma)
+    analyser.y = librosa.resample(y, orig_sr=44100, target_sr=profile.sr, res_type=profile.res_type)
+    analyser.sr = profile.sr
+    analyser.duration = len(analyser.y) / analyser.sr
+    analyser.extract_bpm()
+    analyser.extract_chromagram()
+    analyser.sync_chroma()
+    analyser.estimate_key_track(analyser.chromagram)
+    analyser.estimate_chords()
+    analyser.estimate_time_signature()
+    analyser.estimate_structure()
+    analyser.tag_instruments()
+    analyser.compute_waveform_pyramid()
+    # Used by the partial results of streamed recordings
+    librosa.feature.tempo(onset_envelope=analyser.onset_env, sr=analyser.sr, hop_length=analyser.hop_length)
+
 
 if __name__ == '__main__':
-    
-    try:
-        song_name = "Come Away With Me - Norah Jones.mp3"
-        analyser = AudioAnalyser(f'media/{song_name}')
-        analyser.run_analysis()
-    except Exception as e:
-        print(f"\nError: Could not find or process the audio file.")
-        print(f"Error details: {e}")
\ No newline at end of file
+    import sys
+
+    # Analyse the files given on the command line. For whole libraries use
+    # batch.py, which runs files in parallel.
+    song_name = "Come Away With Me - Norah Jones.mp3"
+    file_paths = sys.argv[1:] or [f'media/{song_name}']
+
+    for file_path in file_paths:
+        try:
+            analyser = AudioAnalyser(file_path)
+            analyser.run_analysis()
+        except Exception as e:
+            print(f"\nError: Could not find or process the audio file.")
+            print(f"Error details: {e}")
\ No newline at end of file
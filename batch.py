@@ -0,0 +1,318 @@
+"""
+Headless batch analysis of a music library.
+
+Runs AudioAnalyser over every audio file matched by the given directories or
+glob patterns in a pool of worker processes, writing one JSON Lines or CSV
+record per file as soon as it finishes. Re-running with the same output file
+resumes an interrupted scan by skipping files that already have a result.
+With --telemetry each record also carries per-stage timings, and a summary of
+where the time went across the whole run is printed at the end. With --index
+every result is also added to the library index searched by library.py.
+With --fingerprints every file's fingerprint is stored, and a file whose
+audio was analysed before under another name or format reuses those results.
+
+Example:
+    python batch.py media/ "~/Music/**/*.mp3" --workers 8 --output library.jsonl
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from telemetry import Telemetry, TelemetryAggregator
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.aiff', '.aif')
+FIELDS = ['file', 'duration', 'bpm', 'key', 'time_signature', 'instruments', 'cached', 'copy_of', 'elapsed', 'error']
+
+def find_audio_files(patterns):
+    """
+    Expands directories and glob patterns into a sorted list of audio files.
+
+    Args:
+        patterns (list[str]): Directories (searched recursively), glob
+            patterns or individual file paths.
+    """
+    files = set()
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(glob.escape(pattern), '**', '*'), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        for match in matches:
+            if os.path.isfile(match) and match.lower().endswith(AUDIO_EXTENSIONS):
+                files.add(os.path.abspath(match))
+    return sorted(files)
+
+def _init_worker():
+    # Each process analyses one file at a time, so stop numpy/numba from
+    # also spawning a thread per core and oversubscribing the machine.
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMBA_NUM_THREADS'):
+        os.environ[var] = '1'
+
+def analyse_file(file_path, use_cache=True, fast=False, telemetry=False, profile_dir=None, mean_chroma=False,
+                 chroma_method='stft', chroma_hop=None, fingerprint_path=None):
+    """
+    Analyses a single file and returns its result record.
+
+    This runs inside a worker process, so it never raises; failures are
+    reported in the record's 'error' field instead.
+
+    Args:
+        file_path (str): The path to the audio file.
+        use_cache (bool): Whether to read from and write to the AnalysisCache.
+        fast (bool): Whether to decode with DecodeProfile.fast_preview().
+        telemetry (bool): Whether to add the run's stage timings to the record.
+        profile_dir (str): If set, a cProfile dump of the analysis is saved
+            here as <file name>.prof.
+        mean_chroma (bool): Whether to add the time-averaged chromagram to
+            the record, for the library index.
+        chroma_method (str): The ChromaSettings method: 'stft', 'cqt' or 'cens'.
+        chroma_hop (int): The chroma hop length, or None for the analysis hop.
+        fingerprint_path (str): If set, the fingerprint index to look the
+            file up in. The record then carries the file's fingerprint and
+            content hash for the main process to add, and 'copy_of' names
+            the file whose cached results were reused, if any.
+    """
+    import numpy as np
+
+    from analyse import AudioAnalyser, DecodeProfile
+    from cache import AnalysisCache
+    from chroma import ChromaSettings
+    from fingerprint import FingerprintIndex, find_analysed_copy
+
+    profile = DecodeProfile.fast_preview() if fast else DecodeProfile()
+    chroma = ChromaSettings(chroma_method, chroma_hop)
+    recorder = Telemetry(profile=profile_dir is not None) if telemetry or profile_dir else None
+
+    start = time.perf_counter()
+    record = {'file': file_path, 'cached': False, 'copy_of': None, 'error': None}
+    fingerprints = None
+    try:
+        cache = AnalysisCache() if use_cache else None
+        # Hashed once and reused for the lookup, the store and the index
+        content = cache.file_hash(file_path) if cache is not None else None
+        analyser = cache.load(file_path, profile=profile, chroma=chroma, content_hash=content) if cache is not None else None
+        if analyser is not None:
+            record['cached'] = True
+            if fingerprint_path is not None:
+                # Matched to its copies by content alone, as it is not decoded
+                record['content'] = content
+        else:
+            analyser = AudioAnalyser(file_path, profile=profile, telemetry=recorder, chroma=chroma)
+            if fingerprint_path is not None:
+                fingerprints = FingerprintIndex(fingerprint_path)
+            # Keep the per-file progress prints out of the pool's output
+            stages = 0
+            copy = None
+            with contextlib.redirect_stdout(io.StringIO()):
+                for stage, _ in analyser.iter_analysis():
+                    stages += 1
+                    if stage == 'fingerprint' and fingerprints is not None and cache is not None:
+                        copy, match = find_analysed_copy(analyser, cache, fingerprints)
+                        if copy is not None:
+                            break
+            if copy is None and stages < len(analyser.STAGES):
+                raise ValueError("Could not load the audio file.")
+            # The fingerprint goes back to the main process, which is the
+            # only one that writes to the index
+            if fingerprints is not None:
+                record['fingerprint'] = analyser.fingerprint
+                record['content'] = content
+            if copy is not None:
+                analyser = copy
+                record['cached'] = True
+                record['copy_of'] = match['file']
+            if cache is not None:
+                cache.store(analyser, content_hash=content)
+            if telemetry:
+                record['telemetry'] = recorder.summary()
+            if profile_dir is not None:
+                os.makedirs(profile_dir, exist_ok=True)
+                recorder.dump_profile(os.path.join(profile_dir, os.path.basename(file_path) + '.prof'))
+        record.update(analyser.summary())
+        if mean_chroma:
+            record['chroma'] = np.mean(analyser.chromagram, axis=1, dtype=np.float32).tolist()
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        if fingerprints is not None:
+            fingerprints.close()
+    record['elapsed'] = round(time.perf_counter() - start, 3)
+    return record
+
+def read_completed(output_path, output_format):
+    """
+    Returns the files that already have a successful result in the output.
+
+    Args:
+        output_path (str): The results file from a previous run.
+        output_format (str): Either 'jsonl' or 'csv'.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, 'r', newline='') as f:
+        if output_format == 'csv':
+            records = csv.DictReader(f)
+        else:
+            records = []
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by an interruption; the file is redone
+                    continue
+        for record in records:
+            if record.get('file') and not record.get('error'):
+                completed.add(record['file'])
+    return completed
+
+class ResultWriter:
+    """
+    Appends result records to a JSON Lines or CSV file, flushing after each one.
+    """
+
+    def __init__(self, output_path, output_format):
+        self.output_format = output_format
+        needs_header = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        self._file = open(output_path, 'a', newline='')
+        if not needs_header:
+            # Finish a line cut short by an interruption, so the first new
+            # record is not appended to it and lost as well
+            with open(output_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._file.write('\n')
+        if output_format == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=FIELDS, extrasaction='ignore')
+            if needs_header:
+                self._csv.writeheader()
+
+    def write(self, record):
+        if self.output_format == 'csv':
+            self._csv.writerow(record)
+        else:
+            self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a music library without the GUI.")
+    parser.add_argument('paths', nargs='+', help="Audio files, directories or glob patterns.")
+    parser.add_argument('-o', '--output', required=True, help="Results file to write (and resume from).")
+    parser.add_argument('-f', '--format', choices=['jsonl', 'csv'], default=None,
+                        help="Output format (default: inferred from the output file extension).")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: number of CPUs).")
+    parser.add_argument('--no-cache', action='store_true', help="Do not use the analysis cache.")
+    parser.add_argument('--fast', action='store_true',
+                        help="Decode at a low sample rate with a cheap resampler for a quick first pass.")
+    parser.add_argument('--chroma', choices=['stft', 'cqt', 'cens'], default='stft',
+                        help="How the chromagram is computed (default: stft, the cheapest).")
+    parser.add_argument('--chroma-hop', type=int, default=None,
+                        help="Samples between chroma frames (default: the analysis hop length, 512).")
+    parser.add_argument('--telemetry', action='store_true',
+                        help="Record per-stage timings for each file and print a summary at the end.")
+    parser.add_argument('--profile-dir', help="Save a cProfile dump of each analysis to this directory.")
+    parser.add_argument('--index', nargs='?', const=True, default=None, metavar='LIBRARY',
+                        help="Add every result to the library index (optionally at this database path).")
+    parser.add_argument('--fingerprints', nargs='?', const=True, default=None, metavar='INDEX',
+                        help="Fingerprint every file, reusing the results of copies analysed before "
+                             "(optionally at this database path).")
+    parser.add_argument('--restart', action='store_true', help="Ignore existing results instead of resuming.")
+    args = parser.parse_args(argv)
+
+    if args.fingerprints is not None and args.fast:
+        parser.error("--fingerprints needs full-quality analysis and cannot be used with --fast.")
+    if args.format is None:
+        args.format = 'csv' if args.output.lower().endswith('.csv') else 'jsonl'
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    files = find_audio_files(args.paths)
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    completed = read_completed(args.output, args.format)
+    pending = [f for f in files if f not in completed]
+
+    print(f"Found {len(files)} audio files, {len(files) - len(pending)} already analysed.", file=sys.stderr)
+    if not pending:
+        return 0
+
+    writer = ResultWriter(args.output, args.format)
+    aggregator = TelemetryAggregator()
+    library = None
+    if args.index is not None:
+        from library import DEFAULT_LIBRARY_PATH, LibraryIndex
+        library = LibraryIndex(DEFAULT_LIBRARY_PATH if args.index is True else args.index)
+    fingerprints = None
+    if args.fingerprints is not None:
+        from fingerprint import DEFAULT_FINGERPRINT_PATH, FingerprintIndex
+        fingerprints = FingerprintIndex(DEFAULT_FINGERPRINT_PATH if args.fingerprints is True else args.fingerprints)
+    failures = 0
+    start = time.perf_counter()
+
+    # 'spawn' gives each worker a clean interpreter, so _init_worker can cap
+    # the thread pools before numpy is imported
+    executor = ProcessPoolExecutor(
+        max_workers=max(1, args.workers),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+    )
+    try:
+        futures = [
+            executor.submit(analyse_file, f, not args.no_cache, args.fast, args.telemetry, args.profile_dir,
+                            library is not None, args.chroma, args.chroma_hop,
+                            None if fingerprints is None else fingerprints.db_path)
+            for f in pending
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            chroma = record.pop('chroma', None)
+            fingerprint = record.pop('fingerprint', None)
+            content = record.pop('content', None)
+            writer.write(record)
+            if 'telemetry' in record:
+                aggregator.add(record['telemetry'])
+            if library is not None and chroma is not None:
+                # Only this process writes to the index, so SQLite never
+                # sees concurrent writers
+                library.add_many([(record, chroma)])
+            if fingerprints is not None and not record['error'] and (fingerprint is not None or content is not None):
+                fingerprints.add(record['file'], content, record['duration'], fingerprint)
+            if record['error']:
+                failures += 1
+            status = record['error'] or f"{record['bpm']:.2f} BPM, {record['key']}, {record['time_signature']}, {record['instruments'] or 'no instruments'}"
+            print(f"[{done}/{len(pending)}] {os.path.basename(record['file'])}: {status}", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Interrupted; re-run the same command to resume.", file=sys.stderr)
+        executor.shutdown(wait=False, cancel_futures=True)
+        return 130
+    finally:
+        writer.close()
+        if library is not None:
+            library.close()
+        if fingerprints is not None:
+            fingerprints.close()
+    executor.shutdown()
+
+    print(f"Analysed {len(pending)} files in {time.perf_counter() - start:.1f}s ({failures} failed).", file=sys.stderr)
+    if aggregator.runs:
+        print(aggregator.format_report(), file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Benchmarks for the analysis pipeline on synthetic audio.
+
+Deterministic test tracks are generated offline: a chord progression in a
+known key over a click track at a known tempo, with accented downbeats in a
+known meter. Each track is analysed with AudioAnalyser (or StreamingAnalyser)
+through iter_analysis(), the same path the GUI and batch tools run. The
+script records wall time and peak traced memory for every stage, checks the
+estimated BPM, key and time signature against the ground truth, and writes
+everything to a JSON file that can be compared against a run from another
+commit.
+
+Example:
+    python benchmark.py --output bench.json
+    python benchmark.py --long --output bench-long.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from analyse import PITCH_CLASSES, AudioAnalyser
+from stream import StreamingAnalyser
+from telemetry import Telemetry
+
+SAMPLE_RATE = 22050
+DEFAULT_DURATIONS = [10, 60, 300]
+LONG_DURATIONS = [1800, 7200]
+
+# (name, bpm, tonic, mode, beats per bar, seconds of silence before the music)
+FIXTURES = [
+    ('c_major_120_4', 120.0, 'C', 'Major', 4, 0.0),
+    ('a_minor_96_3', 96.0, 'A', 'Minor', 3, 0.0),
+    ('f#_major_140_4', 140.0, 'F#', 'Major', 4, 0.0),
+    # Digital silence at the start once made structure analysis fail
+    ('g_major_120_lead', 120.0, 'G', 'Major', 4, 12.0),
+]
+
+# Scale degrees (semitones above the tonic) of the chords in a I-IV-V-I or
+# i-iv-V-i progression, one chord per bar
+PROGRESSIONS = {
+    'Major': [(0, 4, 7), (5, 9, 12), (7, 11, 14), (0, 4, 7)],
+    'Minor': [(0, 3, 7), (5, 8, 12), (7, 11, 14), (0, 3, 7)],
+}
+
+def synthesise_loop(bpm, tonic, mode, beats_per_bar, sr=SAMPLE_RATE):
+    """
+    Synthesises one pass of the chord progression over an accented click track.
+
+    Returns:
+        tuple: (loop, true_bpm), where true_bpm accounts for rounding the
+        loop to a whole number of samples.
+    """
+    progression = PROGRESSIONS[mode]
+    n_beats = len(progression) * beats_per_bar
+    loop_samples = int(round(n_beats * 60.0 / bpm * sr))
+    beat_samples = loop_samples / n_beats
+    bar_samples = int(round(beat_samples * beats_per_bar))
+    t = np.arange(bar_samples) / sr
+
+    # A gentle attack/decay envelope per chord avoids clicks at bar lines
+    envelope = np.minimum(1.0, t / 0.02) * np.exp(-t / (bar_samples / sr))
+    tonic_midi = 60 + PITCH_CLASSES.index(tonic)
+
+    loop = np.zeros(loop_samples + bar_samples, dtype=np.float64)
+    for bar, chord in enumerate(progression):
+        tone = np.zeros(bar_samples)
+        for degree in chord:
+            f0 = librosa.midi_to_hz(tonic_midi + degree)
+            for harmonic, amplitude in ((1, 1.0), (2, 0.4), (3, 0.2)):
+                tone += amplitude * np.sin(2 * np.pi * f0 * harmonic * t)
+        bass = librosa.midi_to_hz(tonic_midi - 24 + chord[0])
+        tone += 0.8 * np.sin(2 * np.pi * bass * t)
+        start = int(round(bar * bar_samples))
+        loop[start:start + bar_samples] += 0.08 * tone * envelope
+
+    # Downbeats get a louder, higher click than the other beats
+    beat_times = np.arange(n_beats) * beat_samples / sr
+    downbeats = np.arange(n_beats) % beats_per_bar == 0
+    loop[:loop_samples] += librosa.clicks(times=beat_times[downbeats], sr=sr, click_freq=1500, length=loop_samples)
+    loop[:loop_samples] += 0.35 * librosa.clicks(times=beat_times[~downbeats], sr=sr, click_freq=1000, length=loop_samples)
+
+    true_bpm = n_beats * 60.0 * sr / loop_samples
+    return (0.5 * loop[:loop_samples]).astype(np.float32), true_bpm
+
+def write_fixture(path, fixture, duration, sr=SAMPLE_RATE):
+    """
+    Writes a fixture of the given duration to a WAV file, a loop at a time,
+    so even multi-hour fixtures never sit in memory. The fixture's silent
+    lead-in, if any, is written before and not counted in the duration.
+
+    Returns:
+        dict: The fixture's ground truth.
+    """
+    name, bpm, tonic, mode, beats_per_bar, lead_in = fixture
+    loop, true_bpm = synthesise_loop(bpm, tonic, mode, beats_per_bar, sr)
+
+    # A little seeded noise keeps the onset detector honest
+    rng = np.random.default_rng(0)
+    loop = loop + (0.003 * rng.standard_normal(len(loop))).astype(np.float32)
+
+    total = int(duration * sr)
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=1, subtype='PCM_16') as f:
+        f.write(np.zeros(int(lead_in * sr), dtype=np.float32))
+        written = 0
+        while written < total:
+            chunk = loop[:total - written]
+            f.write(chunk)
+            written += len(chunk)
+
+    meter_labels = {3: "3/4", 4: "4/4"}
+    return {
+        'fixture': name,
+        'duration': duration,
+        'lead_in': lead_in,
+        'bpm': round(true_bpm, 3),
+        'key': f"{tonic} {mode}",
+        'time_signature': meter_labels[beats_per_bar],
+    }
+
+def run_stages(analyser):
+    """
+    Runs the pipeline through iter_analysis(), timing each stage with
+    Telemetry, so the benchmark measures exactly the stages the analyser runs.
+
+    Returns:
+        list[dict]: One record per stage with wall time, CPU time and the
+        peak memory traced by tracemalloc while it ran.
+    """
+    telemetry = Telemetry(trace_memory=True)
+    analyser.telemetry = telemetry
+    stages_done = sum(1 for _ in analyser.iter_analysis())
+    if stages_done < len(analyser.STAGES):
+        raise RuntimeError(f"Could not load {analyser.file_path}")
+
+    return [{
+        'stage': record['stage'],
+        'wall_s': round(record['wall_s'], 4),
+        'cpu_s': round(record['cpu_s'], 4),
+        'peak_mb': max(0.0, record.get('traced_peak_mb', 0.0)),
+    } for record in telemetry.stages]
+
+def check_accuracy(analyser, truth):
+    """
+    Compares the analysis against the fixture's ground truth.
+    """
+    bpm = float(np.median(analyser.bpm))
+    ratio = bpm / truth['bpm']
+    if abs(ratio - 1) <= 0.04:
+        tempo = 'correct'
+    elif any(abs(ratio - octave) <= 0.04 * octave for octave in (0.5, 2.0)):
+        tempo = 'octave_error'
+    else:
+        tempo = 'wrong'
+    return {
+        'bpm': round(bpm, 2),
+        'bpm_result': tempo,
+        'key': analyser.key,
+        'key_correct': analyser.key == truth['key'],
+        'time_signature': analyser.time_signature,
+        'time_signature_correct': analyser.time_signature == truth['time_signature'],
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """
+    Prints the change in per-stage wall time against an earlier results file.
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    previous = {
+        (run['fixture'], run['duration'], stage['stage']): stage['wall_s']
+        for run in baseline['runs'] for stage in run['stages']
+    }
+
+    print(f"\nCompared with {baseline.get('commit') or baseline_path}:")
+    for run in results['runs']:
+        for stage in run['stages']:
+            old = previous.get((run['fixture'], run['duration'], stage['stage']))
+            if old:
+                change = (stage['wall_s'] - old) / old
+                print(f"  {run['fixture']:<16} {run['duration']:>6}s  {stage['stage']:<24} "
+                      f"{old:8.3f}s -> {stage['wall_s']:8.3f}s ({change:+.0%})")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic audio.")
+    parser.add_argument('--durations', type=float, nargs='+', default=None,
+                        help=f"Track lengths in seconds (default: {DEFAULT_DURATIONS}).")
+    parser.add_argument('--long', action='store_true',
+                        help=f"Also run the long tracks ({LONG_DURATIONS} seconds).")
+    parser.add_argument('--fixtures', nargs='+', choices=[f[0] for f in FIXTURES], default=None,
+                        help="Only run these fixtures.")
+    parser.add_argument('--streaming', action='store_true', help="Benchmark StreamingAnalyser instead.")
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help="Where to write the results.")
+    parser.add_argument('--compare', help="An earlier results file to compare against.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    durations = args.durations or DEFAULT_DURATIONS + (LONG_DURATIONS if args.long else [])
+    fixtures = [f for f in FIXTURES if args.fixtures is None or f[0] in args.fixtures]
+    analyser_class = StreamingAnalyser if args.streaming else AudioAnalyser
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'analyser': analyser_class.__name__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'librosa': librosa.__version__,
+        'numpy': np.__version__,
+        'runs': [],
+    }
+
+    # The first analysis pays for numba compilation, which would otherwise
+    # be charged to whichever fixture happens to run first
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        warmup_path = os.path.join(tmp_dir, 'warmup.wav')
+        write_fixture(warmup_path, FIXTURES[0], 5)
+        analyser_class(warmup_path).analyse()
+
+        tracemalloc.start()
+        for duration in durations:
+            for fixture in fixtures:
+                path = os.path.join(tmp_dir, f"{fixture[0]}_{int(duration)}s.wav")
+                truth = write_fixture(path, fixture, duration)
+
+                analyser = analyser_class(path)
+                stages = run_stages(analyser)
+                accuracy = check_accuracy(analyser, truth)
+                os.remove(path)
+
+                total = sum(stage['wall_s'] for stage in stages)
+                results['runs'].append({**truth, 'total_s': round(total, 4), 'stages': stages, 'accuracy': accuracy})
+                print(f"{fixture[0]:<16} {int(duration):>6}s  total {total:7.2f}s  peak "
+                      f"{max(stage['peak_mb'] for stage in stages):8.1f} MB  "
+                      f"bpm {accuracy['bpm']:.1f} ({accuracy['bpm_result']})  "
+                      f"key {accuracy['key']} ({'ok' if accuracy['key_correct'] else 'wrong'})  "
+                      f"meter {accuracy['time_signature']} ({'ok' if accuracy['time_signature_correct'] else 'wrong'})")
+        tracemalloc.stop()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
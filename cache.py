@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from analyse import ALGORITHM_VERSION, DecodeProfile
+from chroma import ChromaSettings
+from results import AnalysisResult
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'music_analyser'
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+
+class AnalysisCache:
+    """
+    A persistent, content-addressed cache of analysis results.
+
+    Entries are keyed by a hash of the audio file's contents combined with the
+    analysis parameters, so renaming or moving a file still hits the cache
+    while changing the decode profile, hop length, chroma settings or algorithm
+    version does not.
+    Each entry is a single uncompressed .npz file, and the least recently used
+    entries are evicted once the cache grows beyond max_bytes.
+
+    Attributes:
+        cache_dir (str): The directory the cache entries are stored in.
+        max_bytes (int): The total size the cache is trimmed back to.
+    """
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Initializes the cache, creating its directory if needed.
+
+        Args:
+            cache_dir (str): The directory to store cache entries in.
+            max_bytes (int): The maximum total size of the cache entries.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._hash_index_path = os.path.join(cache_dir, 'file_hashes.json')
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def file_hash(self, file_path):
+        """
+        Returns a hash of the file's contents.
+
+        Hashing a long track means reading all of it, so digests are remembered
+        against the file's path, size and modification time and only
+        recomputed when one of those changes.
+
+        Args:
+            file_path (str): The path to the audio file.
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+
+        index = self._read_hash_index()
+        entry = index.get(path)
+        if entry is not None and entry[:2] == signature:
+            return entry[2]
+
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+
+        index[path] = signature + [content_hash]
+        self._write_atomic(self._hash_index_path, json.dumps(index).encode())
+        return content_hash
+
+    def make_key(self, file_path, profile, hop_length, chroma=None, content_hash=None):
+        """
+        Builds the cache key for a file analysed with the given parameters.
+
+        Args:
+            file_path (str): The path to the audio file.
+            profile (DecodeProfile): The decode profile, including the sample rate.
+            hop_length (int): The analysis hop length in samples. The chroma
+                hop length, if different, is part of the chroma settings.
+            chroma (ChromaSettings): The chroma settings; defaults to ChromaSettings().
+            content_hash (str): The file_hash() to use instead of the file's own.
+        """
+        params = json.dumps({
+            'content': content_hash or self.file_hash(file_path),
+            'profile': profile.as_dict(),
+            'hop_length': hop_length,
+            'chroma': (chroma or ChromaSettings()).as_dict(),
+            'version': ALGORITHM_VERSION,
+        }, sort_keys=True)
+        return hashlib.sha256(params.encode()).hexdigest()
+
+    def load(self, file_path, profile=None, hop_length=512, chroma=None, content_hash=None):
+        """
+        Looks up a cached analysis without decoding the audio file.
+
+        Args:
+            file_path (str): The path to the audio file.
+            profile (DecodeProfile): The decode profile; defaults to DecodeProfile().
+            hop_length (int): The analysis hop length in samples.
+            chroma (ChromaSettings): The chroma settings; defaults to ChromaSettings().
+            content_hash (str): Load the entry of another file with this
+                file_hash(), e.g. a copy found by its fingerprint, under
+                this file's path.
+
+        Returns:
+            An AnalysisResult holding the cached results, with a waveform
+            pyramid built from the overview, or None on a cache miss.
+        """
+        profile = profile or DecodeProfile()
+        chroma = chroma or ChromaSettings()
+        entry_path = self._entry_path(self.make_key(file_path, profile, hop_length, chroma, content_hash))
+        try:
+            with np.load(entry_path, allow_pickle=False) as data:
+                result = AnalysisResult(
+                    file_path, profile, int(data['sr']), hop_length,
+                    float(data['duration']), data['bpm'], str(data['key']), str(data['time_signature']),
+                    data['chromagram'], data['waveform_overview'],
+                    key_track=(data['key_times'], [str(key) for key in data['key_labels']]),
+                    meter_confidence=float(data['meter_confidence']),
+                    downbeat_phase=int(data['downbeat_phase']),
+                    chroma_settings=chroma,
+                    beat_times=data['beat_times'],
+                    beats_per_bar=int(data['beats_per_bar']),
+                    beat_chroma=data['beat_chroma'] if data['beat_chroma'].size else None,
+                    chord_track=(data['chord_times'], [str(chord) for chord in data['chord_labels']]),
+                    sections=(data['section_times'], [str(label) for label in data['section_labels']]),
+                    instruments=[str(name) for name in data['instruments']],
+                    instrument_scores={str(name): round(float(share), 3) for name, share in zip(data['instrument_classes'], data['instrument_scores'])},
+                )
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+        result.compute_waveform_pyramid()
+
+        # Touch the entry so eviction treats it as recently used
+        os.utime(entry_path)
+        return result
+
+    def store(self, analyser, content_hash=None):
+        """
+        Saves the results of a finished analysis and trims the cache.
+
+        Args:
+            analyser (AudioAnalyser or AnalysisResult): The results of a
+                full analysis.
+            content_hash (str): The file_hash() of the analysed file, if
+                the caller already has it.
+        """
+        if analyser.waveform_overview is None:
+            analyser.compute_waveform_overview()
+
+        key = self.make_key(analyser.file_path, analyser.profile, analyser.hop_length, analyser.chroma_settings,
+                            content_hash)
+        scores = analyser.instrument_scores or {}
+        key_times, key_labels = analyser.key_track or (np.zeros(0), [])
+        chord_times, chord_labels = analyser.chord_track or (np.zeros(0), [])
+        section_times, section_labels = analyser.sections or (np.zeros(0), [])
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                sr=analyser.sr,
+                duration=analyser.duration,
+                bpm=np.asarray(analyser.bpm, dtype=np.float64),
+                key=np.str_(analyser.key),
+                time_signature=np.str_(analyser.time_signature),
+                key_times=key_times,
+                key_labels=np.array(key_labels, dtype=str),
+                meter_confidence=analyser.meter_confidence,
+                downbeat_phase=analyser.downbeat_phase,
+                beat_times=np.zeros(0) if analyser.beat_times is None else analyser.beat_times,
+                beats_per_bar=analyser.beats_per_bar,
+                chromagram=analyser.chromagram.astype(np.float16),
+                beat_chroma=np.zeros((12, 0), dtype=np.float16) if analyser.beat_chroma is None
+                            else analyser.beat_chroma.astype(np.float16),
+                chord_times=chord_times,
+                chord_labels=np.array(chord_labels, dtype=str),
+                section_times=section_times,
+                section_labels=np.array(section_labels, dtype=str),
+                instruments=np.array(analyser.instruments or [], dtype=str),
+                instrument_classes=np.array(list(scores), dtype=str),
+                instrument_scores=np.array(list(scores.values()), dtype=np.float32),
+                waveform_overview=analyser.waveform_overview,
+            )
+        os.replace(tmp_path, self._entry_path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Removes every cached entry.
+        """
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz') or name == os.path.basename(self._hash_index_path):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _read_hash_index(self):
+        try:
+            with open(self._hash_index_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
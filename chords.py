@@ -0,0 +1,94 @@
+import librosa
+import numpy as np
+
+from chroma import PITCH_CLASSES
+
+# Chord qualities as (label suffix, intervals above the root in semitones)
+CHORD_QUALITIES = (
+    ('', (0, 4, 7)),
+    ('m', (0, 3, 7)),
+    ('7', (0, 4, 7, 10)),
+)
+
+NO_CHORD = 'N'
+
+def _build_chord_templates():
+    # One unit-length template per root and quality, plus a flat one for N
+    labels = []
+    templates = []
+    for suffix, intervals in CHORD_QUALITIES:
+        for root, pitch in enumerate(PITCH_CLASSES):
+            template = np.zeros(12)
+            template[[(root + interval) % 12 for interval in intervals]] = 1.0
+            labels.append(pitch + suffix)
+            templates.append(template / np.linalg.norm(template))
+    labels.append(NO_CHORD)
+    templates.append(np.full(12, 1.0 / np.sqrt(12)))
+    return labels, np.array(templates, dtype=np.float32)
+
+CHORD_LABELS, CHORD_TEMPLATES = _build_chord_templates()
+
+def chord_scores(chroma_vectors):
+    """
+    Scores every chroma column against every chord template at once.
+
+    Args:
+        chroma_vectors (np.ndarray): A (12, T) chromagram.
+
+    Returns:
+        np.ndarray: A (len(CHORD_LABELS), T) array of cosine similarities.
+    """
+    norms = np.linalg.norm(chroma_vectors, axis=0, keepdims=True)
+    return CHORD_TEMPLATES @ (chroma_vectors / np.maximum(norms, 1e-10))
+
+def recognise_chords(chroma_vectors, times, duration, chord_seconds=2.0, sharpness=20.0, no_chord_penalty=0.1,
+                      silence_threshold=0.01):
+    """
+    Labels a chromagram with a chord timeline.
+
+    Template scores are turned into per-column chord probabilities and
+    smoothed with a Viterbi decoder that favours staying on the same chord,
+    so passing notes and single noisy columns do not flip the label. On
+    beat-synchronous chroma a whole song is a few hundred columns and
+    decodes in milliseconds.
+
+    Args:
+        chroma_vectors (np.ndarray): A (12, T) chromagram, e.g. one column
+            per beat.
+        times (np.ndarray): The start time in seconds of every column.
+        duration (float): The length of the audio in seconds.
+        chord_seconds (float): The typical time between chord changes,
+            which sets how strongly the decoder holds on to a chord.
+        sharpness (float): How strongly template scores separate into
+            probabilities.
+        no_chord_penalty (float): Subtracted from the no-chord score, so
+            columns only count as N when no chord fits much better.
+        silence_threshold (float): Columns whose chroma norm is below this
+            fraction of the loudest column's are silent and always N.
+
+    Returns:
+        tuple: (start_times, labels), one entry per chord change, like
+        AudioAnalyser.estimate_key_track(). Labels are e.g. 'C', 'F#m',
+        'G7' or 'N' for no chord.
+    """
+    n_columns = chroma_vectors.shape[1]
+    if n_columns == 0:
+        return np.zeros(0), []
+
+    scores = chord_scores(chroma_vectors)
+    scores[-1] -= no_chord_penalty
+    # Silence scores 0 against every template, so it would otherwise take
+    # the label of the chord next to it
+    norms = np.linalg.norm(chroma_vectors, axis=0)
+    scores[-1, norms <= silence_threshold * norms.max()] = 1.0
+    probabilities = np.exp(sharpness * (scores - scores.max(axis=0, keepdims=True)))
+    probabilities /= probabilities.sum(axis=0, keepdims=True)
+
+    # Expected columns per chord, from the average column length
+    column_seconds = duration / n_columns if duration > 0 else chord_seconds
+    stay = float(np.clip(1.0 - column_seconds / chord_seconds, 0.5, 0.999))
+    transition = librosa.sequence.transition_loop(len(CHORD_LABELS), stay)
+    path = librosa.sequence.viterbi(probabilities, transition)
+
+    changes = np.flatnonzero(np.diff(path, prepend=-1))
+    return np.asarray(times, dtype=np.float64)[changes], [CHORD_LABELS[i] for i in path[changes]]
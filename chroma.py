@@ -0,0 +1,158 @@
+from dataclasses import asdict, dataclass
+
+import librosa
+import numpy as np
+
+CHROMA_METHODS = ('stft', 'cqt', 'cens')
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+@dataclass(frozen=True)
+class ChromaSettings:
+    """
+    How the chromagram is computed.
+
+    Attributes:
+        method (str): 'stft' folds the shared spectrogram into pitch classes,
+            which costs almost nothing extra. 'cqt' uses a constant-Q
+            transform with three bins per semitone, which separates low notes
+            far better. 'cens' smooths and quantises CQT chroma so it is
+            robust to dynamics and timbre, which suits comparing tracks.
+        hop_length (int): The number of samples between chroma frames, or
+            None to use the analysis hop length. Smaller hops give finer
+            frames when zoomed in. 'cqt' and 'cens' are several times faster
+            when it is a power of two.
+    """
+    method: str = 'stft'
+    hop_length: int | None = None
+
+    def __post_init__(self):
+        if self.method not in CHROMA_METHODS:
+            raise ValueError(f"Unknown chroma method {self.method!r}; expected one of {', '.join(CHROMA_METHODS)}.")
+        if self.hop_length is not None and self.hop_length <= 0:
+            raise ValueError("The chroma hop length must be positive.")
+
+    def as_dict(self):
+        return asdict(self)
+
+def compute_chroma(y, sr, settings, hop_length=512, n_fft=2048, spectrogram=None):
+    """
+    Computes a chromagram with the given settings.
+
+    Args:
+        y (np.ndarray): The audio time series.
+        sr (int): The sample rate of y.
+        settings (ChromaSettings): The chroma method and hop length.
+        hop_length (int): The analysis hop length, used when the settings
+            do not give one.
+        n_fft (int): The FFT window size for STFT chroma.
+        spectrogram (np.ndarray): A magnitude STFT of y with this n_fft and
+            hop_length, reused by STFT chroma at the same hop.
+
+    Returns:
+        np.ndarray: The (12, T) chromagram as float32.
+    """
+    hop = settings.hop_length or hop_length
+    if settings.method == 'stft':
+        if spectrogram is None or hop != hop_length:
+            spectrogram = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop))
+        # chroma_stft expects a power spectrogram, so square the magnitudes
+        chromagram = librosa.feature.chroma_stft(S=spectrogram**2, sr=sr, n_fft=n_fft, hop_length=hop)
+    elif settings.method == 'cqt':
+        chromagram = librosa.feature.chroma_cqt(y=y, sr=sr, hop_length=hop, bins_per_octave=36)
+    else:
+        chromagram = librosa.feature.chroma_cens(y=y, sr=sr, hop_length=hop, bins_per_octave=36)
+    return chromagram.astype(np.float32, copy=False)
+
+class ChromaPyramid:
+    """
+    A multi-resolution, tiled copy of a chromagram for drawing.
+
+    Each level averages `factor` consecutive columns of the level below, and
+    every level is split into tiles of a fixed number of columns. Drawing a
+    time range then needs only the few tiles of the level with about one
+    column per pixel, so the full-track view draws a cheap downsampled level
+    and zooming in to a few seconds shows every frame, and neither depends
+    on the track length.
+
+    Attributes:
+        duration (float): The length of the audio in seconds.
+        levels (list[tuple]): (frames_per_column, chroma) tuples, finest
+            first, where chroma is a (12, columns) float16 array.
+        peak (float): The largest chroma value, for a shared colour scale.
+    """
+
+    TILE_COLUMNS = 512
+
+    def __init__(self, chromagram, duration, factor=4, min_columns=1024):
+        """
+        Args:
+            chromagram (np.ndarray): A (12, T) chromagram.
+            duration (float): The length of the audio in seconds.
+            factor (int): The reduction between consecutive levels.
+            min_columns (int): Stop once a level has fewer columns than this.
+        """
+        chroma = np.asarray(chromagram, dtype=np.float16)
+        self.duration = float(duration)
+        self.peak = float(chroma.max()) if chroma.size else 1.0
+        self.levels = [(1, chroma)]
+        frames_per_column = 1
+        while chroma.shape[1] > min_columns:
+            n_columns = int(np.ceil(chroma.shape[1] / factor))
+            pad = n_columns * factor - chroma.shape[1]
+            padded = np.pad(chroma, ((0, 0), (0, pad)), mode='edge')
+            chroma = padded.reshape(12, n_columns, factor).mean(axis=2, dtype=np.float32).astype(np.float16)
+            frames_per_column *= factor
+            self.levels.append((frames_per_column, chroma))
+        n_frames = self.levels[0][1].shape[1]
+        self.seconds_per_frame = self.duration / n_frames if n_frames else 0.0
+
+    @property
+    def nbytes(self):
+        return sum(chroma.nbytes for _, chroma in self.levels)
+
+    def visible_tiles(self, start, end, max_columns):
+        """
+        Returns the tiles that cover a time range.
+
+        Args:
+            start (float): The start of the visible range in seconds.
+            end (float): The end of the visible range in seconds.
+            max_columns (int): Roughly how many columns the view can show,
+                e.g. its width in pixels.
+
+        Returns:
+            list[tuple]: (level, tile) index pairs, for tile().
+        """
+        start = max(0.0, start)
+        end = min(self.duration, end)
+        if end <= start or self.seconds_per_frame == 0:
+            return []
+
+        first_frame = int(start / self.seconds_per_frame)
+        last_frame = int(np.ceil(end / self.seconds_per_frame))
+        # The finest level that fits, falling back to the coarsest
+        for level, (frames_per_column, chroma) in enumerate(self.levels):
+            if (last_frame - first_frame) / frames_per_column <= max_columns:
+                break
+
+        tile_frames = frames_per_column * self.TILE_COLUMNS
+        n_tiles = int(np.ceil(chroma.shape[1] / self.TILE_COLUMNS))
+        first_tile = first_frame // tile_frames
+        last_tile = min(last_frame // tile_frames, n_tiles - 1)
+        return [(level, tile) for tile in range(first_tile, last_tile + 1)]
+
+    def tile(self, level, tile):
+        """
+        Returns one tile and where it goes on the time axis.
+
+        Returns:
+            tuple: (image, start, end), where image is a (columns, 12) view
+            in the column-major order pg.ImageItem expects, and start and
+            end are in seconds.
+        """
+        frames_per_column, chroma = self.levels[level]
+        first = tile * self.TILE_COLUMNS
+        last = min(first + self.TILE_COLUMNS, chroma.shape[1])
+        seconds_per_column = frames_per_column * self.seconds_per_frame
+        return chroma[:, first:last].T, first * seconds_per_column, min(last * seconds_per_column, self.duration)
@@ -0,0 +1,491 @@
+"""
+Spectral-peak fingerprints for recognising the same recording under a
+different file name, format or bitrate.
+
+Every analysed track's fingerprint is a set of landmark hashes, each made
+from a pair of nearby peaks in the spectrogram the analysis already
+computes. The hashes are stored in a SQLite inverted index next to the
+library index, so a newly opened file whose audio was analysed before is
+recognised in milliseconds and its cached results are reused instead of
+re-running the analysis. Near-duplicates across the whole library are found
+with a single query over the index. Tracks are added automatically by the
+GUI and by batch.py --fingerprints.
+
+Example:
+    python fingerprint.py duplicates
+    python fingerprint.py identify "~/Music/track (copy).mp3"
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_FINGERPRINT_PATH = os.path.join(
+    os.environ.get('XDG_DATA_HOME', os.path.expanduser('~/.local/share')),
+    'music_analyser', 'fingerprints.db'
+)
+
+# Hashes pack (anchor bin, target bin, frames between them) into one integer
+FREQUENCY_BITS = 9
+TIME_BITS = 6
+
+def _sliding_max(x, size, axis):
+    # The maximum over a centred window of `size` along `axis`, built from
+    # maxima of shifted copies so it takes log2(size) passes, a fraction
+    # of the time scipy.ndimage.maximum_filter needs
+    pad = [(0, 0)] * x.ndim
+    pad[axis] = (size // 2, size // 2)
+    out = np.pad(x, pad, constant_values=-np.inf)
+    width = 1
+    while width < size:
+        step = min(width, size - width)
+        n = out.shape[axis] - step
+        head = [slice(None)] * x.ndim
+        tail = [slice(None)] * x.ndim
+        head[axis] = slice(0, n)
+        tail[axis] = slice(step, step + n)
+        out = np.maximum(out[tuple(head)], out[tuple(tail)])
+        width += step
+    return out
+
+def spectral_peaks(magnitude, sr, hop_length=512, peaks_per_second=6, neighbourhood=(15, 9), frame_offset=0):
+    """
+    Finds the strongest local maxima of a magnitude spectrogram.
+
+    Peaks survive changes of format, bitrate and level that alter most of
+    the spectrum, which is what makes them usable as landmarks. Only bins
+    below 2**FREQUENCY_BITS are searched, i.e. up to about 5.5 kHz at
+    22050 Hz, where lossy codecs leave the spectrum alone. The strongest
+    peaks_per_second are kept in every second of audio, so the fingerprint
+    is about as dense in quiet passages as in loud ones.
+
+    Args:
+        magnitude (np.ndarray): A (1 + n_fft/2, T) magnitude STFT, or a
+            block of one when streaming.
+        sr (int): The sample rate.
+        hop_length (int): The number of samples between frames.
+        peaks_per_second (int): How many peaks to keep per second.
+        neighbourhood (tuple): The (bins, frames) a peak must be the
+            largest value within.
+        frame_offset (int): The index of the first frame of the block.
+
+    Returns:
+        tuple: (frames, bins), the int32 frame and frequency bin of every
+        peak, in time order.
+    """
+    # Magnitudes are compared directly, as taking logs would not change
+    # which points are maxima or how they rank
+    magnitude = np.ascontiguousarray(magnitude[:2 ** FREQUENCY_BITS])
+    is_peak = magnitude == _sliding_max(_sliding_max(magnitude, neighbourhood[0], axis=0), neighbourhood[1], axis=1)
+    # Silence is flat, and every flat point counts as its own maximum
+    is_peak &= magnitude > 1e-4
+    bins, frames = np.nonzero(is_peak)
+    strengths = magnitude[bins, frames]
+    frames = frames + frame_offset
+
+    # The strongest few in every second of audio
+    second = frames * hop_length // sr
+    order = np.lexsort((-strengths, second))
+    second = second[order]
+    starts = np.flatnonzero(np.diff(second, prepend=-1))
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.append(starts, len(order))))
+    keep = order[rank < peaks_per_second]
+    keep = keep[np.lexsort((bins[keep], frames[keep]))]
+    return frames[keep].astype(np.int32), bins[keep].astype(np.int32)
+
+def landmark_hashes(frames, bins, fan_out=3):
+    """
+    Pairs every peak with the next few peaks after it into landmark hashes.
+
+    A hash holds the two peaks' frequencies and the time between them but
+    not where they occur, so the same audio gives the same hashes wherever
+    it starts in a file.
+
+    Args:
+        frames (np.ndarray): The peak frames from spectral_peaks(), in order.
+        bins (np.ndarray): The peak frequency bins.
+        fan_out (int): How many later peaks each peak is paired with.
+
+    Returns:
+        tuple: (hashes, offsets), int32 arrays holding every hash and the
+        frame of its first peak.
+    """
+    frames = np.asarray(frames, dtype=np.int32)
+    bins = np.asarray(bins, dtype=np.int32)
+    hashes = [np.zeros(0, dtype=np.int32)]
+    offsets = [np.zeros(0, dtype=np.int32)]
+    for step in range(1, min(fan_out, len(frames) - 1) + 1):
+        gap = frames[step:] - frames[:-step]
+        valid = (gap > 0) & (gap < 2 ** TIME_BITS)
+        anchor_bins = bins[:-step][valid]
+        target_bins = bins[step:][valid]
+        hashes.append((anchor_bins << (FREQUENCY_BITS + TIME_BITS)) | (target_bins << TIME_BITS) | gap[valid])
+        offsets.append(frames[:-step][valid])
+    return np.concatenate(hashes), np.concatenate(offsets)
+
+def _best_alignments(keys, shifts, counts):
+    # For every key, e.g. a recording, the time shift with the most matching
+    # hashes. Votes one frame either side are added in, as a copy that
+    # starts part of a hop later splits its matches between two shifts.
+    order = np.lexsort((shifts, keys))
+    keys, shifts, counts = keys[order], shifts[order], counts[order]
+    adjacent = (keys[1:] == keys[:-1]) & (shifts[1:] - shifts[:-1] == 1)
+    votes = counts.copy()
+    votes[1:] += np.where(adjacent, counts[:-1], 0)
+    votes[:-1] += np.where(adjacent, counts[1:], 0)
+
+    order = np.lexsort((-votes, keys))
+    first = order[np.flatnonzero(np.diff(keys[order], prepend=keys[order][:1] - 1))]
+    return keys[first], shifts[first], votes[first]
+
+class FingerprintIndex:
+    """
+    An on-disk inverted index from landmark hashes to the recordings they
+    occur in.
+
+    Every hash is stored once per place it occurs, keyed by the hash, so
+    looking up a fingerprint is one index seek per hash however large the
+    library grows. A match is a recording that shares many hashes with the
+    query at one consistent time shift, which unrelated tracks sharing a
+    few chords never do.
+
+    Fingerprints are only comparable between analyses at the same sample
+    rate and hop length, so only full-quality analyses are indexed.
+
+    Attributes:
+        db_path (str): The SQLite database file.
+    """
+
+    def __init__(self, db_path=DEFAULT_FINGERPRINT_PATH):
+        """
+        Opens the index, creating the database if needed.
+
+        Args:
+            db_path (str): The SQLite database file, or ':memory:'.
+        """
+        self.db_path = db_path
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # Ids are never reused, as the hashes of a replaced or removed
+        # recording would otherwise be counted for the next one added
+        schema = """
+            CREATE TABLE {} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file TEXT UNIQUE,
+                content TEXT,
+                duration REAL,
+                hashes INTEGER,
+                added REAL
+            )
+        """
+        row = self._db.execute("SELECT sql FROM sqlite_master WHERE name = 'recordings'").fetchone()
+        if row is None:
+            self._db.execute(schema.format('recordings'))
+        elif 'AUTOINCREMENT' not in row[0]:
+            # An index made before ids were kept unique is rebuilt with the same ids
+            with self._db:
+                self._db.execute(schema.format('recordings_new'))
+                self._db.execute('INSERT INTO recordings_new SELECT * FROM recordings')
+                self._db.execute('DROP TABLE recordings')
+                self._db.execute('ALTER TABLE recordings_new RENAME TO recordings')
+        # Hashes of replaced or removed recordings are left behind until
+        # prune(), so updates never scan the whole table
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                hash INTEGER,
+                recording INTEGER,
+                offset INTEGER,
+                PRIMARY KEY (hash, recording, offset)
+            ) WITHOUT ROWID
+        """)
+        self._db.execute('CREATE INDEX IF NOT EXISTS recordings_content ON recordings (content)')
+        self._db.execute('CREATE TEMP TABLE IF NOT EXISTS query (hash INTEGER, offset INTEGER)')
+        self._db.commit()
+
+    def add(self, file_path, content, duration, fingerprint):
+        """
+        Adds or replaces a file's fingerprint.
+
+        Args:
+            file_path (str): The audio file.
+            content (str): The hash of the file's contents from
+                AnalysisCache.file_hash(), which finds its cached results.
+            duration (float): The length of the audio in seconds.
+            fingerprint (tuple): (hashes, offsets) from landmark_hashes(), or
+                None for a file that hit the analysis cache and so was never
+                decoded. Such a file is only matched to others with the same
+                content.
+        """
+        file_path = os.path.abspath(file_path)
+        row = self._db.execute('SELECT content FROM recordings WHERE file = ?', (file_path,)).fetchone()
+        # Without a content hash, e.g. with the cache off, the file may have
+        # changed since, so it is always re-indexed
+        if row is not None and content is not None and row[0] == content:
+            return
+        hashes, offsets = fingerprint if fingerprint is not None else (np.zeros(0, dtype=np.int32),) * 2
+        with self._db:
+            self._db.execute('DELETE FROM recordings WHERE file = ?', (file_path,))
+            recording = self._db.execute(
+                'INSERT INTO recordings (file, content, duration, hashes, added) VALUES (?, ?, ?, ?, ?)',
+                (file_path, content, duration, len(hashes), time.time())
+            ).lastrowid
+            self._db.executemany(
+                'INSERT OR IGNORE INTO hashes VALUES (?, ?, ?)',
+                zip(hashes.tolist(), [recording] * len(hashes), offsets.tolist())
+            )
+
+    def remove(self, file_path):
+        with self._db:
+            self._db.execute('DELETE FROM recordings WHERE file = ?', (os.path.abspath(file_path),))
+
+    def get(self, file_path):
+        """
+        Returns the indexed details of a file, or None if it is not indexed.
+        """
+        row = self._db.execute(
+            'SELECT file, content, duration, hashes FROM recordings WHERE file = ?', (os.path.abspath(file_path),)
+        ).fetchone()
+        return None if row is None else dict(zip(('file', 'content', 'duration', 'hashes'), row))
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM recordings').fetchone()[0]
+
+    def identify(self, fingerprint, exclude=None, min_matches=20, min_ratio=0.1):
+        """
+        Finds the indexed recording a fingerprint comes from.
+
+        Args:
+            fingerprint (tuple): (hashes, offsets) from landmark_hashes().
+            exclude (str): A file to leave out, e.g. the query file itself,
+                whose old fingerprint would otherwise match a re-edited
+                version of it.
+            min_matches (int): The fewest hashes that must line up.
+            min_ratio (float): The smallest share of the query's hashes
+                that must line up. Re-encoded copies keep about a fifth of
+                their peaks in place and unrelated tracks a few percent.
+
+        Returns:
+            dict: The best match's file, content hash, duration, the number
+            of aligned hashes as 'matches' and as a share of the query as
+            'score', and 'offset', the frame in the match where the query
+            starts; or None if nothing matches.
+        """
+        hashes, offsets = fingerprint
+        if len(hashes) == 0:
+            return None
+        with self._db:
+            self._db.execute('DELETE FROM temp.query')
+            self._db.executemany('INSERT INTO temp.query VALUES (?, ?)', zip(hashes.tolist(), offsets.tolist()))
+        rows = self._db.execute(
+            'SELECT h.recording, h.offset - q.offset FROM temp.query q JOIN hashes h ON h.hash = q.hash'
+        ).fetchall()
+        if not rows:
+            return None
+
+        pairs, counts = np.unique(np.array(rows, dtype=np.int64), axis=0, return_counts=True)
+        recordings, shifts, votes = _best_alignments(pairs[:, 0], pairs[:, 1], counts)
+        recordings_by_id = self._recordings(recordings.tolist())
+        exclude = os.path.abspath(exclude) if exclude is not None else None
+        for i in np.argsort(-votes, kind='stable'):
+            if votes[i] < max(min_matches, min_ratio * len(hashes)):
+                break
+            match = recordings_by_id.get(int(recordings[i]))
+            if match is None or match['file'] == exclude:
+                continue  # Left behind by a removed or replaced recording
+            return {**match, 'matches': int(votes[i]), 'score': round(float(votes[i]) / len(hashes), 3),
+                    'offset': int(shifts[i])}
+        return None
+
+    def duplicates(self, min_matches=20, min_ratio=0.1, max_recordings=50):
+        """
+        Finds every pair of indexed recordings that share audio, in one query.
+
+        Only hashes shared by two or more recordings are joined, and hashes
+        so common they occur in more than max_recordings are skipped, so
+        the cost follows the number of duplicates rather than the square of
+        the library size. Files with identical contents are always paired,
+        with a score of 1.
+
+        Args:
+            min_matches (int): The fewest hashes that must line up.
+            min_ratio (float): The smallest share of the shorter recording's
+                hashes that must line up.
+            max_recordings (int): Hashes found in more recordings than this
+                carry no information and are ignored.
+
+        Returns:
+            list[dict]: One entry per pair with both files, 'matches',
+            'score' and 'offset' as in identify(), best matches first.
+        """
+        rows = self._db.execute("""
+            WITH shared AS (
+                SELECT hash FROM hashes GROUP BY hash
+                HAVING COUNT(DISTINCT recording) BETWEEN 2 AND ?
+            )
+            SELECT a.recording, b.recording, b.offset - a.offset, COUNT(*)
+            FROM shared
+            JOIN hashes a ON a.hash = shared.hash
+            JOIN hashes b ON b.hash = shared.hash AND b.recording > a.recording
+            GROUP BY a.recording, b.recording, b.offset - a.offset
+            HAVING COUNT(*) > 1
+        """, (max_recordings,)).fetchall()
+        identical = self._db.execute(
+            'SELECT a.id, b.id FROM recordings a JOIN recordings b ON b.content = a.content AND b.id > a.id'
+        ).fetchall()
+
+        pairs = {}
+        if rows:
+            rows = np.array(rows, dtype=np.int64)
+            # One key per pair of recordings
+            width = int(rows[:, :2].max()) + 1
+            keys, shifts, votes = _best_alignments(rows[:, 0] * width + rows[:, 1], rows[:, 2], rows[:, 3])
+            firsts, seconds = np.divmod(keys, width)
+            pairs = {
+                (first, second): (count, shift)
+                for first, second, shift, count in zip(firsts.tolist(), seconds.tolist(), shifts.tolist(), votes.tolist())
+            }
+        recordings_by_id = self._recordings(sorted({i for pair in list(pairs) + identical for i in pair}))
+
+        duplicates = []
+        for first, second in identical:
+            a, b = recordings_by_id[first], recordings_by_id[second]
+            pairs.pop((first, second), None)
+            duplicates.append({'file': a['file'], 'duplicate': b['file'], 'matches': min(a['hashes'], b['hashes']),
+                               'score': 1.0, 'offset': 0})
+        for (first, second), (count, shift) in pairs.items():
+            a, b = recordings_by_id.get(first), recordings_by_id.get(second)
+            if a is None or b is None:
+                continue
+            score = count / max(1, min(a['hashes'], b['hashes']))
+            if count >= min_matches and score >= min_ratio:
+                duplicates.append({'file': a['file'], 'duplicate': b['file'], 'matches': count,
+                                   'score': round(score, 3), 'offset': shift})
+        duplicates.sort(key=lambda pair: -pair['score'])
+        return duplicates
+
+    def prune(self):
+        """
+        Deletes the hashes of removed and replaced recordings.
+
+        Returns:
+            int: The number of hashes deleted.
+        """
+        with self._db:
+            deleted = self._db.execute('DELETE FROM hashes WHERE recording NOT IN (SELECT id FROM recordings)').rowcount
+        self._db.execute('VACUUM')
+        return deleted
+
+    def close(self):
+        self._db.close()
+
+    def _recordings(self, ids):
+        recordings = {}
+        # SQLite limits the number of parameters in one statement
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self._db.execute(
+                f'SELECT id, file, content, duration, hashes FROM recordings WHERE id IN ({",".join("?" * len(chunk))})',
+                chunk
+            ).fetchall()
+            for row in rows:
+                recordings[row[0]] = dict(zip(('file', 'content', 'duration', 'hashes'), row[1:]))
+        return recordings
+
+def find_analysed_copy(analyser, cache, index, max_shift=0.25, max_length_difference=1.0):
+    """
+    Reuses the cached analysis of an earlier copy of a file's audio.
+
+    The analyser only needs to have loaded the audio and computed its
+    fingerprint. A copy counts if it lines up with the file from the start
+    and is about as long, so an excerpt or an extended mix is analysed on
+    its own. Nothing is written here: the caller stores the reused results
+    under this file and adds its fingerprint, so in batch.py only the main
+    process writes to the index.
+
+    Args:
+        analyser (AudioAnalyser): The file being analysed, after
+            compute_fingerprint().
+        cache (AnalysisCache): The cache holding the copy's results.
+        index (FingerprintIndex): The fingerprints to search.
+        max_shift (float): How far in seconds the copy may start from the file.
+        max_length_difference (float): How much longer or shorter in seconds
+            the copy may be.
+
+    Returns:
+        tuple: (result, match), the copy's AnalysisResult relabelled with
+        this file's path and the dict from FingerprintIndex.identify(), or
+        (None, None) if no analysed copy is found.
+    """
+    match = index.identify(analyser.fingerprint, exclude=analyser.file_path)
+    if match is None or match['content'] is None:
+        return None, None
+    frame_seconds = analyser.hop_length / analyser.sr
+    if abs(match['offset'] * frame_seconds) > max_shift or abs(match['duration'] - analyser.duration) > max_length_difference:
+        return None, None
+    result = cache.load(analyser.file_path, analyser.profile, analyser.hop_length, analyser.chroma_settings,
+                        content_hash=match['content'])
+    if result is None:
+        return None, None
+
+    return result, match
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Find copies of analysed recordings by their fingerprints.")
+    parser.add_argument('--fingerprints', default=DEFAULT_FINGERPRINT_PATH, help="The fingerprint database.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    duplicates = commands.add_parser('duplicates', help="Every pair of indexed files with the same audio.")
+    duplicates.add_argument('--min-score', type=float, default=0.1,
+                            help="The share of hashes that must line up (default: 0.1).")
+
+    identify = commands.add_parser('identify', help="Which indexed recording a file is a copy of.")
+    identify.add_argument('file', help="An audio file.")
+
+    commands.add_parser('prune', help="Reclaim the space of removed and replaced recordings.")
+    commands.add_parser('stats', help="Show how many recordings are indexed.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    index = FingerprintIndex(args.fingerprints)
+
+    if args.command == 'stats':
+        print(f"{len(index)} recordings indexed in {args.fingerprints}")
+        return 0
+    if args.command == 'prune':
+        print(f"Deleted {index.prune()} stale hashes from {args.fingerprints}")
+        return 0
+
+    if args.command == 'identify':
+        from analyse import AudioAnalyser
+
+        analyser = AudioAnalyser(os.path.expanduser(args.file))
+        if not analyser.load_audio():
+            return 1
+        analyser.compute_fingerprint()
+        start = time.perf_counter()
+        match = index.identify(analyser.fingerprint, exclude=analyser.file_path)
+        elapsed = time.perf_counter() - start
+        if match is None:
+            print(f"No match among {len(index)} recordings ({elapsed * 1000:.1f} ms)", file=sys.stderr)
+            return 1
+        shift = match['offset'] * analyser.hop_length / analyser.sr
+        print(f"{match['score']:6.1%}  {shift:+7.2f}s  {match['file']}")
+        print(f"Matched among {len(index)} recordings in {elapsed * 1000:.1f} ms", file=sys.stderr)
+        return 0
+
+    start = time.perf_counter()
+    pairs = index.duplicates(min_ratio=args.min_score)
+    elapsed = time.perf_counter() - start
+    for pair in pairs:
+        print(f"{pair['score']:6.1%}  {pair['file']}\n        {pair['duplicate']}")
+    print(f"{len(pairs)} duplicate pairs among {len(index)} recordings in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+import functools
+import json
+import os
+
+import librosa
+import numpy as np
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instruments_model.json')
+
+# Energy ratios, which are pooled as separate energies before dividing so
+# that quiet frames between notes do not swamp them
+SHARES = ['percussive', 'bass', 'mid_harmonic', 'sustained']
+
+# The segment features, in the order the model's weights expect
+FEATURE_NAMES = (
+    [f'{share}_share' for share in SHARES]
+    + ['flatness', 'contrast', 'harmonic_flux']
+)
+
+def frame_features(magnitude, mel_power, sr, n_fft=2048, hop_length=512, sustain=1.0):
+    """
+    Computes the frame-level timbre features the tagger works on.
+
+    Everything is derived from spectrograms the analysis already has, so no
+    extra transform of the audio is needed. The mel spectrogram is split
+    into harmonic and percussive parts by median filtering.
+
+    Args:
+        magnitude (np.ndarray): A (1 + n_fft/2, T) magnitude STFT.
+        mel_power (np.ndarray): The (n_mels, T) mel power spectrogram of it.
+        sr (int): The sample rate.
+        n_fft (int): The FFT window size.
+        hop_length (int): The number of samples between frames.
+        sustain (float): How long in seconds a harmonic must hold its level
+            to count as sustained, which tells pads from melodic parts.
+
+    Returns:
+        np.ndarray: A float32 array with one column per frame. The first
+        2 * len(SHARES) rows are the energy behind each of SHARES and the
+        energy it is a share of, and the rest are the other features in
+        FEATURE_NAMES order.
+    """
+    # Pairs of mel bands are merged before median filtering, which costs
+    # about a quarter as much as filtering every band with twice the kernel
+    n_bands = mel_power.shape[0] // 2 * 2
+    pooled = mel_power[:n_bands].reshape(n_bands // 2, 2, -1).sum(axis=1)
+    band_freqs = librosa.mel_frequencies(n_mels=mel_power.shape[0], fmax=sr / 2)[:n_bands].reshape(-1, 2).mean(axis=1)
+    harmonic, percussive = librosa.decompose.hpss(pooled, kernel_size=9)
+    mid = (band_freqs >= 250) & (band_freqs < 4000)
+
+    harmonic_db = librosa.power_to_db(harmonic, top_db=80.0)
+    harmonic_flux = np.abs(np.diff(harmonic_db, axis=1, prepend=harmonic_db[:, :1])).mean(axis=0)
+    # Mid-range harmonics that stayed within 6 dB of their level over the
+    # last `sustain` seconds, checked at a quarter, half and the full lag
+    mid_db = harmonic_db[mid]
+    held = np.ones(mid_db.shape, dtype=bool)
+    for fraction in (0.25, 0.5, 1.0):
+        lag = min(max(1, int(round(fraction * sustain * sr / hop_length))), mid_db.shape[1])
+        held &= np.abs(mid_db - np.concatenate([mid_db[:, :lag], mid_db[:, :-lag]], axis=1)) < 6.0
+
+    # Low sample rates, e.g. quick previews, have room for fewer octave bands
+    contrast_bands = min(6, int(np.ceil(np.log2(sr / 400))))
+
+    # Drums are judged above 1 kHz, where bass notes cannot mask them. The
+    # small share of the total keeps silent upper bands from counting
+    total = pooled.sum(axis=0)
+    upper = band_freqs >= 1000
+    return np.vstack([
+        percussive[upper].sum(axis=0),
+        harmonic[band_freqs < 150].sum(axis=0),
+        harmonic[mid].sum(axis=0),
+        (harmonic[mid] * held).sum(axis=0),
+        pooled[upper].sum(axis=0) + 0.01 * total,
+        total, total, total,
+        librosa.feature.spectral_flatness(S=magnitude)[0],
+        librosa.feature.spectral_contrast(S=magnitude, sr=sr, n_fft=n_fft, n_bands=contrast_bands).mean(axis=0),
+        harmonic_flux,
+    ]).astype(np.float32)
+
+def segment_features(features, frames_per_segment):
+    """
+    Averages frame features over fixed-length segments.
+
+    Args:
+        features (np.ndarray): An array from frame_features().
+        frames_per_segment (int): The number of frames in each segment. A
+            final partial segment is kept if it is at least half as long.
+
+    Returns:
+        np.ndarray: A (segments, len(FEATURE_NAMES)) array, one row per
+        segment, with the energies turned into log10 shares.
+    """
+    n_rows, n_frames = features.shape
+    n_segments = n_frames // frames_per_segment
+    segments = features[:, :n_segments * frames_per_segment].reshape(n_rows, n_segments, frames_per_segment).mean(axis=2)
+    if n_frames - n_segments * frames_per_segment >= max(1, frames_per_segment // 2) or n_segments == 0:
+        tail = features[:, n_segments * frames_per_segment:].mean(axis=1, keepdims=True)
+        segments = np.concatenate([segments, tail], axis=1)
+
+    n_shares = len(SHARES)
+    shares = np.log10(segments[:n_shares] / (segments[n_shares:2 * n_shares] + 1e-10) + 1e-4)
+    return np.vstack([shares, segments[2 * n_shares:]]).T
+
+class InstrumentTagger:
+    """
+    Tags the instruments heard in a track with a small linear model.
+
+    Frame features are averaged over segments of a couple of seconds, and
+    every segment is scored for every instrument in one matrix product
+    followed by a sigmoid. An instrument is tagged when enough of the
+    segments score above the threshold, so a short solo does not count but
+    a part that runs through the track does.
+
+    The model is a JSON file of per-feature standardisation constants,
+    weights and biases. The bundled instruments_model.json is hand-set
+    from the physics of each instrument family rather than trained on a
+    labelled dataset, so it recognises broad families only and will miss
+    or mislabel parts a trained model would get right. A trained model in
+    the same format can be dropped in with no code changes.
+
+    Attributes:
+        classes (list[str]): The instrument names, in output order.
+        segment_seconds (float): The length of each scored segment.
+        threshold (float): The probability above which a segment counts.
+        min_share (float): The share of segments needed to tag a track.
+    """
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH):
+        """
+        Args:
+            model_path (str): The JSON model file.
+        """
+        with open(model_path) as f:
+            model = json.load(f)
+        if model['features'] != FEATURE_NAMES:
+            raise ValueError(f"{model_path} was made for a different feature set.")
+        self.classes = model['classes']
+        self.segment_seconds = model['segment_seconds']
+        self.threshold = model['threshold']
+        self.min_share = model['min_share']
+        self._mean = np.asarray(model['mean'], dtype=np.float32)
+        self._scale = np.asarray(model['scale'], dtype=np.float32)
+        self._weights = np.asarray(model['weights'], dtype=np.float32)
+        self._bias = np.asarray(model['bias'], dtype=np.float32)
+
+    def predict(self, segments):
+        """
+        Scores every segment for every instrument at once.
+
+        Args:
+            segments (np.ndarray): A (segments, n_features) array.
+
+        Returns:
+            np.ndarray: The (segments, classes) probabilities.
+        """
+        standardised = (segments - self._mean) / self._scale
+        return 1.0 / (1.0 + np.exp(-(standardised @ self._weights + self._bias)))
+
+    def tag(self, features, frames_per_second):
+        """
+        Tags a track from its frame features.
+
+        Args:
+            features (np.ndarray): A (n_features, T) array from frame_features().
+            frames_per_second (float): The frame rate of the features.
+
+        Returns:
+            tuple: (instruments, scores), the tagged instrument names from
+            most to least present and a dict of every instrument's share
+            of segments.
+        """
+        if features.shape[1] == 0:
+            return [], {}
+        frames_per_segment = max(1, int(round(self.segment_seconds * frames_per_second)))
+        probabilities = self.predict(segment_features(features, frames_per_segment))
+        shares = (probabilities > self.threshold).mean(axis=0)
+        scores = {name: round(float(share), 3) for name, share in zip(self.classes, shares)}
+        order = np.argsort(-shares, kind='stable')
+        return [self.classes[i] for i in order if shares[i] >= self.min_share], scores
+
+@functools.lru_cache(maxsize=None)
+def load_tagger(model_path=DEFAULT_MODEL_PATH):
+    """
+    Returns a tagger for the model, loading each model file only once per process.
+    """
+    return InstrumentTagger(model_path)
@@ -0,0 +1,309 @@
+"""
+A local index of analysed tracks for finding tracks that mix well together.
+
+Every analysed track's duration, BPM, key, time signature and mean chroma
+vector is stored in a SQLite database. Queries load the index once into
+numpy arrays and answer with vectorised comparisons, so searching a library
+of 100k tracks by tempo and key, or by chroma similarity, takes milliseconds
+and never re-analyses a file. Tracks are added automatically by the GUI and
+by batch.py --index.
+
+Example:
+    python library.py match --bpm 124 --key "A Minor"
+    python library.py match "~/Music/track.mp3" --tolerance 2
+    python library.py similar "~/Music/track.mp3" --count 20
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from analyse import KEY_NAMES
+
+DEFAULT_LIBRARY_PATH = os.path.join(
+    os.environ.get('XDG_DATA_HOME', os.path.expanduser('~/.local/share')),
+    'music_analyser', 'library.db'
+)
+
+def camelot_code(key):
+    """
+    Returns the Camelot wheel code of a key name, e.g. 'A Minor' -> '8A'.
+    """
+    index = KEY_NAMES.index(key)
+    root, minor = divmod(index, 2)
+    # Minor keys share a number with their relative major, three semitones up
+    major_root = (root + 3) % 12 if minor else root
+    number = (7 * major_root + 7) % 12 + 1
+    return f"{number}{'A' if minor else 'B'}"
+
+def _build_compatibility():
+    # Keys mix harmonically with themselves, their relative major or minor
+    # and the keys a fifth either side, i.e. their neighbours on the wheel
+    codes = [camelot_code(key) for key in KEY_NAMES]
+    numbers = np.array([int(code[:-1]) for code in codes])
+    letters = np.array([code[-1] for code in codes])
+    step = np.abs(numbers[:, None] - numbers[None, :]) % 12
+    step = np.minimum(step, 12 - step)
+    same_letter = letters[:, None] == letters[None, :]
+    return (same_letter & (step <= 1)) | (step == 0)
+
+KEY_COMPATIBILITY = _build_compatibility()
+
+class LibraryIndex:
+    """
+    An on-disk index of per-track features with fast similarity queries.
+
+    Attributes:
+        db_path (str): The SQLite database file.
+    """
+
+    def __init__(self, db_path=DEFAULT_LIBRARY_PATH):
+        """
+        Opens the index, creating the database if needed.
+
+        Args:
+            db_path (str): The SQLite database file, or ':memory:'.
+        """
+        self.db_path = db_path
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS tracks (
+                file TEXT PRIMARY KEY,
+                duration REAL,
+                bpm REAL,
+                key_index INTEGER,
+                time_signature TEXT,
+                chroma BLOB,
+                added REAL
+            )
+        """)
+        self._db.commit()
+        self._arrays = None
+
+    def add(self, result):
+        """
+        Adds or updates a track from a finished analysis.
+
+        Args:
+            result (AnalysisResult or AudioAnalyser): The analysed track.
+        """
+        self.add_many([(result.summary(), np.mean(result.chromagram, axis=1, dtype=np.float32))])
+
+    def add_many(self, tracks):
+        """
+        Adds or updates many tracks in one transaction.
+
+        Args:
+            tracks (iterable): (summary, mean_chroma) pairs, where summary is
+                a dict like AudioAnalyser.summary() and mean_chroma is the
+                track's chromagram averaged over time.
+        """
+        rows = []
+        for summary, chroma in tracks:
+            if summary.get('key') not in KEY_NAMES:
+                continue  # Nothing to match on without a key
+            rows.append((
+                os.path.abspath(summary['file']),
+                summary['duration'],
+                summary['bpm'],
+                KEY_NAMES.index(summary['key']),
+                summary['time_signature'],
+                np.asarray(chroma, dtype=np.float32).tobytes(),
+                time.time(),
+            ))
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        self._arrays = None
+
+    def remove(self, file_path):
+        with self._db:
+            self._db.execute('DELETE FROM tracks WHERE file = ?', (os.path.abspath(file_path),))
+        self._arrays = None
+
+    def get(self, file_path):
+        """
+        Returns the indexed features of a file, or None if it is not indexed.
+        """
+        row = self._db.execute(
+            'SELECT file, duration, bpm, key_index, time_signature, chroma FROM tracks WHERE file = ?',
+            (os.path.abspath(file_path),)
+        ).fetchone()
+        if row is None:
+            return None
+        return {**self._track(row[0], row[1], row[2], row[3], row[4]), 'chroma': np.frombuffer(row[5], dtype=np.float32)}
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM tracks').fetchone()[0]
+
+    def match(self, bpm, key=None, tolerance=3.0, compatible=True, double_time=False, limit=50):
+        """
+        Finds tracks near a tempo, optionally in a key that mixes with `key`.
+
+        Args:
+            bpm (float): The tempo to match.
+            key (str): A key name such as 'A Minor', or None for any key.
+            tolerance (float): The largest BPM difference allowed.
+            compatible (bool): Accept Camelot-compatible keys rather than
+                only the exact key.
+            double_time (bool): Also accept tracks at half or double the
+                tempo, which a DJ can mix at the same beat rate.
+            limit (int): The most tracks to return.
+
+        Returns:
+            list[dict]: Matching tracks, closest tempo first.
+        """
+        arrays = self._load()
+        distance = np.abs(arrays['bpm'] - bpm)
+        if double_time:
+            distance = np.minimum(distance, np.abs(arrays['bpm'] * 2 - bpm))
+            distance = np.minimum(distance, np.abs(arrays['bpm'] / 2 - bpm))
+        mask = distance <= tolerance
+        if key is not None:
+            target = KEY_NAMES.index(key)
+            if compatible:
+                mask &= KEY_COMPATIBILITY[target][arrays['key_index']]
+            else:
+                mask &= arrays['key_index'] == target
+
+        candidates = np.flatnonzero(mask)
+        order = candidates[np.argsort(distance[candidates], kind='stable')][:limit]
+        return [self._row(i, bpm_difference=round(float(distance[i]), 2)) for i in order]
+
+    def similar(self, chroma, count=20, exclude=None):
+        """
+        Finds the tracks whose mean chroma vectors correlate best with `chroma`.
+
+        Args:
+            chroma (np.ndarray): A 12-element mean chroma vector.
+            count (int): The number of tracks to return.
+            exclude (str): A file to leave out, e.g. the query track itself.
+
+        Returns:
+            list[dict]: The nearest tracks, most similar first.
+        """
+        arrays = self._load()
+        query = np.asarray(chroma, dtype=np.float32)
+        query = query - query.mean()
+        query /= max(np.linalg.norm(query), 1e-9)
+        scores = arrays['chroma'] @ query
+        if exclude is not None:
+            scores[arrays['files'] == os.path.abspath(exclude)] = -np.inf
+
+        count = min(count, len(scores))
+        if count == 0:
+            return []
+        # Only the top `count` need sorting, not the whole library
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        return [self._row(i, similarity=round(float(scores[i]), 4)) for i in top if np.isfinite(scores[i])]
+
+    def close(self):
+        self._db.close()
+
+    def _load(self):
+        # The whole index is read into arrays once and reused until it changes
+        if self._arrays is None:
+            rows = self._db.execute(
+                'SELECT file, duration, bpm, key_index, time_signature, chroma FROM tracks'
+            ).fetchall()
+            chroma = np.frombuffer(b''.join(row[5] for row in rows), dtype=np.float32).reshape(len(rows), 12)
+            # Centred and normalised rows make a dot product a correlation
+            chroma = chroma - chroma.mean(axis=1, keepdims=True)
+            chroma /= np.maximum(np.linalg.norm(chroma, axis=1, keepdims=True), 1e-9)
+            self._arrays = {
+                'files': np.array([row[0] for row in rows], dtype=object),
+                'duration': np.array([row[1] for row in rows], dtype=np.float32),
+                'bpm': np.array([row[2] for row in rows], dtype=np.float32),
+                'key_index': np.array([row[3] for row in rows], dtype=np.int8),
+                'time_signature': np.array([row[4] for row in rows], dtype=object),
+                'chroma': chroma,
+            }
+        return self._arrays
+
+    def _row(self, i, **extra):
+        arrays = self._arrays
+        return {
+            **self._track(arrays['files'][i], arrays['duration'][i], arrays['bpm'][i],
+                          arrays['key_index'][i], arrays['time_signature'][i]),
+            **extra,
+        }
+
+    @staticmethod
+    def _track(file_path, duration, bpm, key_index, time_signature):
+        key = KEY_NAMES[int(key_index)]
+        return {
+            'file': file_path,
+            'duration': round(float(duration), 3),
+            'bpm': round(float(bpm), 2),
+            'key': key,
+            'camelot': camelot_code(key),
+            'time_signature': time_signature,
+        }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search the library of analysed tracks.")
+    parser.add_argument('--library', default=DEFAULT_LIBRARY_PATH, help="The library database.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    match = commands.add_parser('match', help="Tracks near a tempo in a compatible key.")
+    match.add_argument('file', nargs='?', help="An indexed track to take the tempo and key from.")
+    match.add_argument('--bpm', type=float, help="The tempo to match.")
+    match.add_argument('--key', choices=KEY_NAMES, metavar='KEY', help="The key to match, e.g. 'A Minor'.")
+    match.add_argument('--tolerance', type=float, default=3.0, help="BPM either side (default: 3).")
+    match.add_argument('--exact-key', action='store_true', help="Only the same key, not compatible ones.")
+    match.add_argument('--double-time', action='store_true', help="Also match half and double tempo.")
+    match.add_argument('--limit', type=int, default=50)
+
+    similar = commands.add_parser('similar', help="The tracks with the most similar chroma profiles.")
+    similar.add_argument('file', help="An indexed track.")
+    similar.add_argument('-n', '--count', type=int, default=20)
+
+    commands.add_parser('stats', help="Show how many tracks are indexed.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    library = LibraryIndex(args.library)
+
+    if args.command == 'stats':
+        print(f"{len(library)} tracks indexed in {args.library}")
+        return 0
+
+    track = None
+    if args.file is not None:
+        track = library.get(os.path.expanduser(args.file))
+        if track is None:
+            print(f"{args.file} is not in the library; analyse it first.", file=sys.stderr)
+            return 1
+
+    # Reading the index is a one-off cost; the query itself is what scales
+    library._load()
+    start = time.perf_counter()
+    if args.command == 'similar':
+        matches = library.similar(track['chroma'], args.count, exclude=track['file'])
+    else:
+        bpm = args.bpm if args.bpm is not None else (track['bpm'] if track else None)
+        if bpm is None:
+            print("Give a track or --bpm to match.", file=sys.stderr)
+            return 1
+        key = args.key or (track['key'] if track else None)
+        matches = [
+            m for m in library.match(bpm, key, args.tolerance, not args.exact_key, args.double_time, args.limit + 1)
+            if track is None or m['file'] != track['file']
+        ][:args.limit]
+    elapsed = time.perf_counter() - start
+
+    for m in matches:
+        score = f"  {m['similarity']:+.3f}" if 'similarity' in m else ''
+        print(f"{m['bpm']:7.2f} BPM  {m['camelot']:>3} {m['key']:<9}{score}  {m['file']}")
+    print(f"{len(matches)} matches from {len(library)} tracks in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,451 @@
+"""
+Real-time analysis of a live input.
+
+LiveAnalyser keeps the last few seconds of features in ring buffers and
+updates the onset envelope, chroma, tempo and key once per hop as audio
+arrives, so estimates follow a DJ set or band with a latency of about one
+analysis window. Audio comes from a microphone or line-in through
+sounddevice, or from a file replayed at real-time speed as a stand-in. The
+GUI's "Live Input" mode draws the same buffers as scrolling plots; run
+this module directly for a headless check of the rolling estimates and of
+how much of each hop the analysis uses.
+
+Example:
+    python live.py replay "media/track.wav"
+    python live.py replay "media/track.wav" --fast
+    python live.py mic --device 2
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import deque
+
+import librosa
+import numpy as np
+import soundfile as sf
+import soxr
+
+from analyse import KEY_NAMES, score_keys
+
+class RingBuffer:
+    """
+    A fixed-capacity buffer of columns that overwrites the oldest first.
+
+    Attributes:
+        data (np.ndarray): The (rows, capacity) storage, in write order
+            modulo capacity.
+        count (int): The number of columns written so far.
+    """
+
+    def __init__(self, rows, capacity, dtype=np.float32):
+        self.data = np.zeros((rows, capacity), dtype=dtype)
+        self.count = 0
+
+    @property
+    def capacity(self):
+        return self.data.shape[1]
+
+    def append(self, column):
+        """
+        Writes one column and returns the column it replaced.
+        """
+        index = self.count % self.capacity
+        replaced = self.data[:, index].copy()
+        self.data[:, index] = column
+        self.count += 1
+        return replaced
+
+    def ordered(self):
+        """
+        Returns the buffered columns oldest first, as a new array.
+        """
+        if self.count < self.capacity:
+            return self.data[:, :self.count].copy()
+        split = self.count % self.capacity
+        return np.concatenate([self.data[:, split:], self.data[:, :split]], axis=1)
+
+class LiveAnalyser:
+    """
+    Incremental tempo, key and chroma estimation over a live audio stream.
+
+    push() may be called from an audio thread; it only queues the samples.
+    process() does the work: it resamples the queued audio and, for every
+    complete hop, takes one windowed FFT of the latest n_fft samples and
+    appends a chroma column, an onset strength value and a min/max waveform
+    pair to ring buffers. The key is scored from a running chroma sum over
+    key_window seconds, and the tempo from the autocorrelation of the last
+    tempo_window seconds of onset strength, so each hop costs the same
+    however long the stream runs. If processing falls behind by more than
+    max_latency seconds the oldest queued audio is dropped.
+
+    Attributes:
+        sr (int): The analysis sample rate.
+        bpm (float): The rolling tempo estimate, or 0.0 until there is enough audio.
+        key (str): The rolling key estimate, or "N/A" until there is enough audio.
+        hops (int): The number of hops analysed.
+        dropped_seconds (float): Audio discarded because processing fell behind.
+        hop_times (deque): The compute time of recent hops in seconds.
+    """
+
+    def __init__(self, sr=22050, n_fft=2048, hop_length=512, history=10.0,
+                 tempo_window=8.0, key_window=30.0, max_latency=0.5):
+        """
+        Args:
+            sr (int): The analysis sample rate input is resampled to.
+            n_fft (int): The FFT window size.
+            hop_length (int): The number of samples between analysis frames.
+            history (float): Seconds of waveform and chroma kept for display.
+            tempo_window (float): Seconds of onset strength the tempo is taken from.
+            key_window (float): Seconds of chroma the key is taken from.
+            max_latency (float): The most audio, in seconds, that may wait in
+                the queue before the oldest is dropped.
+        """
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.max_latency = max_latency
+        self.frames_per_second = sr / hop_length
+
+        self._window = np.hanning(n_fft + 1)[:-1].astype(np.float32)
+        self._chroma_basis = librosa.filters.chroma(sr=sr, n_fft=n_fft).astype(np.float32)
+        self._mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft).astype(np.float32)
+
+        history_frames = int(round(history * self.frames_per_second))
+        self.chroma = RingBuffer(12, history_frames)
+        self.waveform = RingBuffer(2, history_frames)
+        self.onset = RingBuffer(1, int(round(tempo_window * self.frames_per_second)))
+        self._key_chroma = RingBuffer(12, int(round(key_window * self.frames_per_second)))
+        self._key_sum = np.zeros(12)
+
+        # Tempo candidates from 30 to 300 BPM, weighted towards 120 BPM like
+        # librosa.feature.tempo's log-normal prior
+        min_lag = int(np.floor(60 * self.frames_per_second / 300))
+        max_lag = int(np.ceil(60 * self.frames_per_second / 30))
+        self._lags = np.arange(max(1, min_lag), max_lag + 1)
+        lag_bpm = 60 * self.frames_per_second / self._lags
+        self._tempo_prior = np.exp(-0.5 * np.log2(lag_bpm / 120.0) ** 2)
+        self._tempo_estimates = deque(maxlen=8)
+
+        self._queue = deque()
+        self._queued_samples = 0
+        self._lock = threading.Lock()
+        self._resampler = None
+        self._resampler_sr = None
+        self._input_sr = None
+        self._frame = np.zeros(n_fft, dtype=np.float32)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._prev_mel_db = None
+
+        self.bpm = 0.0
+        self.key = "N/A"
+        self.hops = 0
+        self.dropped_seconds = 0.0
+        self.hop_times = deque(maxlen=1000)
+
+    @property
+    def hop_duration(self):
+        """The length of one hop of audio in seconds."""
+        return self.hop_length / self.sr
+
+    @property
+    def latency(self):
+        """Seconds between audio arriving and it being reflected in the estimates."""
+        queued = self._queued_samples / self._input_sr if self._input_sr else 0.0
+        return queued + (len(self._pending) + self.n_fft / 2) / self.sr
+
+    @property
+    def load(self):
+        """The mean compute time per hop as a fraction of the hop's duration."""
+        if not self.hop_times:
+            return 0.0
+        return float(np.mean(self.hop_times)) / self.hop_duration
+
+    def push(self, samples, sr):
+        """
+        Queues a block of input audio. Safe to call from an audio callback.
+
+        Args:
+            samples (np.ndarray): A (frames,) or (frames, channels) block.
+            sr (int): The block's sample rate.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)
+        with self._lock:
+            if self._input_sr != sr:
+                self._queue.clear()
+                self._queued_samples = 0
+                self._input_sr = sr
+            self._queue.append(samples)
+            self._queued_samples += len(samples)
+            # Keep the latency bounded by dropping the oldest audio
+            limit = self.max_latency * sr
+            while self._queued_samples > limit and len(self._queue) > 1:
+                dropped = self._queue.popleft()
+                self._queued_samples -= len(dropped)
+                self.dropped_seconds += len(dropped) / sr
+
+    def process(self):
+        """
+        Analyses every complete hop of the queued audio.
+
+        Returns:
+            int: The number of hops analysed.
+        """
+        with self._lock:
+            blocks = list(self._queue)
+            self._queue.clear()
+            self._queued_samples = 0
+            input_sr = self._input_sr
+        if not blocks:
+            return 0
+
+        samples = np.concatenate(blocks)
+        if input_sr != self.sr:
+            if self._resampler is None or self._resampler_sr != input_sr:
+                self._resampler = soxr.ResampleStream(input_sr, self.sr, 1, dtype='float32', quality='MQ')
+                self._resampler_sr = input_sr
+            samples = self._resampler.resample_chunk(samples)
+        self._pending = np.concatenate([self._pending, samples])
+
+        hops = len(self._pending) // self.hop_length
+        for i in range(hops):
+            start = time.perf_counter()
+            self._analyse_hop(self._pending[i * self.hop_length:(i + 1) * self.hop_length])
+            self.hop_times.append(time.perf_counter() - start)
+        self._pending = self._pending[hops * self.hop_length:]
+        return hops
+
+    def snapshot(self):
+        """
+        Returns copies of the display buffers, oldest first.
+
+        Returns:
+            dict: 'waveform' (2, frames) per-hop min/max, 'chroma' (12, frames)
+            and 'onset' (frames,), plus the current 'bpm' and 'key'.
+        """
+        return {
+            'waveform': self.waveform.ordered(),
+            'chroma': self.chroma.ordered(),
+            'onset': self.onset.ordered()[0],
+            'bpm': self.bpm,
+            'key': self.key,
+        }
+
+    def _analyse_hop(self, hop):
+        # Slide the analysis window along by one hop
+        frame = self._frame
+        frame[:-len(hop)] = frame[len(hop):]
+        frame[-len(hop):] = hop
+        power = np.abs(np.fft.rfft(frame * self._window)) ** 2
+
+        chroma = self._chroma_basis @ power
+        chroma /= max(chroma.max(), 1e-10)
+        self.chroma.append(chroma)
+        self.waveform.append((hop.min(), hop.max()))
+
+        # Spectral flux of the log-mel spectrum, as in onset_strength. This is
+        # power_to_db(top_db=None) without its per-call overhead.
+        mel_db = 10.0 * np.log10(np.maximum(self._mel_basis @ power, 1e-10))
+        if self._prev_mel_db is None:
+            onset = 0.0
+        else:
+            onset = float(np.maximum(0.0, mel_db - self._prev_mel_db).mean())
+        self._prev_mel_db = mel_db
+        self.onset.append(onset)
+
+        # The key window is a running sum, updated by the column that left it
+        replaced = self._key_chroma.append(chroma)
+        self._key_sum += chroma
+        if self._key_chroma.count > self._key_chroma.capacity:
+            self._key_sum -= replaced
+        self.hops += 1
+
+        if self.hops >= self.frames_per_second:
+            self.key = KEY_NAMES[int(np.argmax(score_keys(self._key_sum)))]
+        if self.onset.count >= 2 * self._lags[-1] // 3:
+            self._estimate_tempo()
+
+    def _estimate_tempo(self):
+        onset = self.onset.ordered()[0]
+        onset = onset - onset.mean()
+        n = len(onset)
+        # Autocorrelation by FFT, normalised for the shrinking overlap at long lags
+        spectrum = np.fft.rfft(onset, 2 * n)
+        autocorrelation = np.fft.irfft(np.abs(spectrum) ** 2)[:n]
+        lags = self._lags[self._lags < n - 1]
+        if len(lags) == 0 or autocorrelation[0] <= 0:
+            return
+        scores = autocorrelation[lags] / (n - lags) * self._tempo_prior[:len(lags)]
+        best = int(np.argmax(scores))
+
+        # Refine the lag between frames with a parabola through its neighbours
+        lag = float(lags[best])
+        if 0 < best < len(lags) - 1:
+            left, centre, right = scores[best - 1:best + 2]
+            curvature = left - 2 * centre + right
+            if curvature < 0:
+                lag += 0.5 * (left - right) / curvature
+        self._tempo_estimates.append(60 * self.frames_per_second / lag)
+        # A short median keeps the readout steady without lagging far behind
+        self.bpm = float(np.median(self._tempo_estimates))
+
+class FileReplaySource:
+    """
+    Replays an audio file as if it were a live input, for testing without
+    a sound card.
+
+    Attributes:
+        file_path (str): The replayed file.
+        realtime (bool): Whether blocks are paced to the file's sample rate.
+    """
+
+    def __init__(self, file_path, block_frames=1024, realtime=True):
+        self.file_path = file_path
+        self.block_frames = block_frames
+        self.realtime = realtime
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, callback):
+        """
+        Starts replaying on a background thread.
+
+        Args:
+            callback (callable): Called as callback(block, sr) for each block.
+        """
+        info = sf.info(self.file_path)  # Raises here if the file is unreadable
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(callback, info.samplerate), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, callback, sr):
+        start = time.perf_counter()
+        played = 0
+        for block in sf.blocks(self.file_path, blocksize=self.block_frames, dtype='float32', always_2d=True):
+            if self._stop.is_set():
+                return
+            if self.realtime:
+                # Hand each block over when it would have finished arriving
+                delay = start + (played + len(block)) / sr - time.perf_counter()
+                if delay > 0 and self._stop.wait(delay):
+                    return
+            callback(block, sr)
+            played += len(block)
+
+class MicrophoneSource:
+    """
+    Captures a microphone or line input through sounddevice.
+
+    Attributes:
+        device (int or str): The input device, or None for the default.
+        sr (int): The capture rate, or None for the device's default.
+    """
+
+    def __init__(self, device=None, sr=None, block_frames=512):
+        self.device = device
+        self.sr = sr
+        self.block_frames = block_frames
+        self._stream = None
+
+    @property
+    def running(self):
+        return self._stream is not None and self._stream.active
+
+    def start(self, callback):
+        """
+        Opens the input stream.
+
+        Args:
+            callback (callable): Called as callback(block, sr) from the audio thread.
+
+        Raises:
+            OSError: If PortAudio or the device is unavailable.
+        """
+        import sounddevice as sd
+
+        def on_audio(indata, frames, time_info, status):
+            callback(indata.copy(), sr)
+
+        sr = self.sr or int(sd.query_devices(self.device, 'input')['default_samplerate'])
+        self._stream = sd.InputStream(
+            device=self.device, samplerate=sr, channels=1, dtype='float32',
+            blocksize=self.block_frames, latency='low', callback=on_audio
+        )
+        self._stream.start()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a live input, printing rolling estimates.")
+    sources = parser.add_subparsers(dest='source', required=True)
+    replay = sources.add_parser('replay', help="Replay a file as a live stream.")
+    replay.add_argument('file', help="The audio file to replay.")
+    replay.add_argument('--fast', action='store_true',
+                        help="Replay as fast as the analysis runs, to measure its cost.")
+    mic = sources.add_parser('mic', help="Analyse a microphone or line input.")
+    mic.add_argument('--device', default=None, help="The input device index or name.")
+    mic.add_argument('--seconds', type=float, default=None, help="Stop after this long.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    analyser = LiveAnalyser(max_latency=float('inf') if getattr(args, 'fast', False) else 0.5)
+    if args.source == 'replay':
+        source = FileReplaySource(args.file, realtime=not args.fast)
+        limit = None
+    else:
+        device = int(args.device) if args.device is not None and args.device.isdigit() else args.device
+        source = MicrophoneSource(device)
+        limit = args.seconds
+
+    try:
+        source.start(analyser.push)
+    except Exception as e:
+        print(f"Could not open the input: {e}", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    next_report = 1.0
+    try:
+        while True:
+            running = source.running
+            analyser.process()
+            heard = analyser.hops * analyser.hop_duration
+            if heard >= next_report:
+                next_report += 1.0
+                print(f"{heard:7.1f}s  {analyser.bpm:6.1f} BPM  {analyser.key:<9}  "
+                      f"latency {analyser.latency * 1000:4.0f} ms  load {analyser.load:.1%}")
+            if not running or (limit is not None and time.perf_counter() - started >= limit):
+                break
+            time.sleep(0.005)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.stop()
+    analyser.process()
+
+    hop_times = np.array(analyser.hop_times) * 1000
+    if len(hop_times):
+        print(f"{analyser.hops} hops of {analyser.hop_duration * 1000:.1f} ms: compute mean "
+              f"{hop_times.mean():.3f} ms, p99 {np.percentile(hop_times, 99):.3f} ms, "
+              f"max {hop_times.max():.3f} ms; {analyser.dropped_seconds:.2f}s dropped", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,32 @@
+import time
+START_TIME = time.perf_counter()  # For reporting the cold-start time
+
+import argparse
+import logging
+import os
+import sqlite3
 import sys
-import librosa
+import threading
+from collections import deque
 import numpy as np
-import pygame
 import pyqtgraph as pg
-from PyQt6.QtCore import QRunnable, QThreadPool, QObject, pyqtSignal, QTimer, QThread
+from PyQt6.QtCore import Qt, QRunnable, QThread, QThreadPool, QObject, pyqtSignal, QTimer
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout,
-    QWidget, QFileDialog, QLabel, QMessageBox, QProgressBar
+    QWidget, QFileDialog, QLabel, QMessageBox, QProgressBar, QListWidget, QListWidgetItem
 )
-from analyse import AudioAnalyser
+from analyse import AudioAnalyser, DecodeProfile, PITCH_CLASSES, warm_up
+from beatgrid import export as export_beat_grid
+from cache import AnalysisCache
+from chroma import CHROMA_METHODS, ChromaPyramid, ChromaSettings
+from fingerprint import FingerprintIndex, find_analysed_copy
+from library import LibraryIndex
+from live import FileReplaySource, LiveAnalyser, MicrophoneSource
+from stream import StreamingAnalyser
+from playback import PlaybackEngine
+from plots import ChordLaneItem, LODWaveformItem, SectionRegionsItem, TiledChromagramItem
+from results import AnalysisResult
+from telemetry import Telemetry, log_observer, logger as telemetry_logger
 
 class WorkerSignals(QObject):
     '''
@@ -17,101 +35,469 @@ class WorkerSignals(QObject):
     - finished: No data
     - error: tuple (exctype, value, traceback.format_exc())
     - result: object data returned from processing
+    - partial: tuple (analyser snapshot, fraction done) while streaming
+    - progress: float fraction of the pipeline completed
+    - waveform_ready: WaveformPyramid of the decoded audio
+    - bpm_ready: float tempo in beats per minute
+    - chroma_ready: tuple (chromagram, duration in seconds)
+    - key_ready: str key name
+    - chords_ready: tuple (chord track, duration in seconds)
+    - meter_ready: tuple (time signature, confidence)
+    - sections_ready: tuple (sections, duration in seconds)
+    - instruments_ready: tuple (instrument names, scores by instrument)
     '''
     finished = pyqtSignal()
     error = pyqtSignal(tuple)
     result = pyqtSignal(object)
+    partial = pyqtSignal(tuple)
+    progress = pyqtSignal(float)
+    waveform_ready = pyqtSignal(object)
+    bpm_ready = pyqtSignal(float)
+    chroma_ready = pyqtSignal(tuple)
+    key_ready = pyqtSignal(str)
+    chords_ready = pyqtSignal(tuple)
+    meter_ready = pyqtSignal(tuple)
+    sections_ready = pyqtSignal(tuple)
+    instruments_ready = pyqtSignal(tuple)
+
+class AnalysisCancelled(Exception):
+    """Raised inside a worker when its job has been cancelled."""
+
+class CancelToken:
+    """
+    A thread-safe flag used to ask a running analysis job to stop.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise AnalysisCancelled()
 
 class AnalysisWorker(QRunnable):
     '''
     Worker thread for running the audio analysis.
+
+    The cancellation token is checked between pipeline stages (and between
+    blocks when streaming), so an abandoned job stops at the next boundary
+    instead of running to completion. Background jobs run on a low-priority
+    thread, and a running job can be moved between the two.
     '''
-    def __init__(self, file_path):
+    def __init__(self, file_path, cache=None, token=None, preview=True, chroma=None):
         super().__init__()
         self.file_path = file_path
+        self.cache = cache
+        self.token = token or CancelToken()
+        self.preview = preview
+        self.chroma = chroma
         self.signals = WorkerSignals()
+        self.background = False
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def set_background(self, background):
+        """
+        Lowers the priority of the job's thread while it runs in the
+        background, or restores it when the job is promoted. Safe to call
+        from any thread, before or while the job runs.
+        """
+        with self._thread_lock:
+            self.background = background
+            if self._thread is not None:
+                self._thread.setPriority(QThread.Priority.LowPriority if background else QThread.Priority.NormalPriority)
 
     def run(self):
+        with self._thread_lock:
+            self._thread = QThread.currentThread()
+        self.set_background(self.background)
+        try:
+            self.analyse()
+        finally:
+            # Pool threads are reused, so the next job starts at normal priority
+            with self._thread_lock:
+                self._thread.setPriority(QThread.Priority.NormalPriority)
+                self._thread = None
+            self.signals.finished.emit()
+
+    def analyse(self):
+        fingerprints = None
+        content = None
         try:
-            analyser = AudioAnalyser(self.file_path)
-            if not analyser.load_audio():
+            self.token.raise_if_cancelled()
+
+            if self.cache is not None:
+                # SQLite connections belong to the thread that opened them
+                try:
+                    fingerprints = FingerprintIndex()
+                except sqlite3.Error as e:
+                    print(f"Could not open the fingerprint index: {e}")
+
+                # A cache hit skips decoding the file entirely. The content
+                # hash is reused for storing and fingerprinting the result
+                content = self.cache.file_hash(self.file_path)
+                result = self.cache.load(self.file_path, chroma=self.chroma, content_hash=content)
+                if result is not None:
+                    for stage, _ in AudioAnalyser.STAGES:
+                        self.emit_stage(result, stage, 1.0)
+                    self.signals.result.emit(result)
+                    # Never decoded, so it can only be matched by content
+                    self.add_fingerprint(fingerprints, content, result.duration, None)
+                    return
+
+            # The cached results of an earlier copy of the recording, if found
+            copy = {}
+
+            # Long recordings are streamed block by block so memory stays
+            # bounded, and partial results are shown as they arrive
+            if StreamingAnalyser.should_stream(self.file_path, self.chroma):
+                # Copies are looked for after the first few minutes, rather
+                # than once the whole recording has been decoded
+                def check_copy(partial):
+                    copy['result'], copy['match'] = find_analysed_copy(partial, self.cache, fingerprints)
+                    return copy['result'] is not None
+
+                analyser = StreamingAnalyser(
+                    self.file_path,
+                    progress_callback=lambda snapshot, fraction: self.signals.partial.emit((snapshot, fraction)),
+                    should_stop=self.token.is_cancelled,
+                    telemetry=Telemetry(observers=[log_observer]),
+                    chroma=self.chroma,
+                    copy_check=check_copy if fingerprints is not None else None
+                )
+            else:
+                # A quick low-rate pass puts a BPM and key on screen while
+                # the full-quality analysis runs. It stops once the key is
+                # known, as nothing after that is shown from the preview
+                if self.preview:
+                    preview = AudioAnalyser(self.file_path, profile=DecodeProfile.fast_preview())
+                    for stage, _ in preview.iter_analysis():
+                        self.token.raise_if_cancelled()
+                        if stage == 'key':
+                            self.signals.partial.emit((preview, 0.0))
+                            break
+                analyser = AudioAnalyser(self.file_path, telemetry=Telemetry(observers=[log_observer]), chroma=self.chroma)
+
+            # Each result is sent to the window as soon as its stage is done
+            stages_done = 0
+            for stage, fraction in analyser.iter_analysis():
+                self.token.raise_if_cancelled()
+                # A copy of a recording analysed before, e.g. under another
+                # name or format, reuses its results instead of finishing
+                if stage == 'fingerprint' and fingerprints is not None and not copy:
+                    copy['result'], copy['match'] = find_analysed_copy(analyser, self.cache, fingerprints)
+                if copy.get('result') is not None:
+                    break
+                self.emit_stage(analyser, stage, fraction)
+                stages_done += 1
+            self.token.raise_if_cancelled()
+            if copy.get('result') is not None:
+                result = copy['result']
+                print(f"Recognised {self.file_path} as a copy of {copy['match']['file']}")
+                # Stored under this file too, so it hits the cache next time
+                self.cache.store(result, content_hash=content)
+                self.add_fingerprint(fingerprints, content, result.duration, analyser.fingerprint)
+                for cached_stage, _ in AudioAnalyser.STAGES:
+                    self.emit_stage(result, cached_stage, 1.0)
+                self.signals.result.emit(result)
+                return
+            if stages_done < len(analyser.STAGES):
                 raise ValueError("Could not load the audio file.")
-            
-            analyser.extract_bpm()
-            analyser.extract_chromagram()
-            analyser.time_signature = analyser.estimate_time_signature()
-            
-            self.signals.result.emit(analyser)
+
+            # Only the compact result outlives the worker, so the decoded
+            # waveform and spectrogram are freed with the analyser
+            result = AnalysisResult.from_analyser(analyser)
+            fingerprint = analyser.fingerprint
+            del analyser
+            if self.cache is not None:
+                self.cache.store(result, content_hash=content)
+            self.add_fingerprint(fingerprints, content, result.duration, fingerprint)
+
+            self.signals.result.emit(result)
+        except AnalysisCancelled:
+            pass
+        except Exception as e:
+            self.signals.error.emit((type(e), e, e.__traceback__))
+        finally:
+            if fingerprints is not None:
+                fingerprints.close()
+
+    def add_fingerprint(self, fingerprints, content, duration, fingerprint):
+        if fingerprints is None:
+            return
+        try:
+            fingerprints.add(self.file_path, content, duration, fingerprint)
+        except sqlite3.Error as e:
+            print(f"Could not add {self.file_path} to the fingerprint index: {e}")
+
+    def emit_stage(self, analyser, stage, fraction):
+        """
+        Emits the signal carrying the result of a finished pipeline stage.
+        """
+        if stage == 'waveform':
+            if analyser.waveform_pyramid is None:
+                analyser.compute_waveform_pyramid()
+            self.signals.waveform_ready.emit(analyser.waveform_pyramid)
+        elif stage == 'bpm':
+            self.signals.bpm_ready.emit(float(analyser.bpm))
+        elif stage == 'chroma':
+            self.signals.chroma_ready.emit((analyser.chromagram, analyser.duration))
+        elif stage == 'key':
+            self.signals.key_ready.emit(analyser.key)
+        elif stage == 'chords':
+            self.signals.chords_ready.emit((analyser.chord_track, analyser.duration))
+        elif stage == 'meter':
+            self.signals.meter_ready.emit((analyser.time_signature, analyser.meter_confidence))
+        elif stage == 'structure':
+            self.signals.sections_ready.emit((analyser.sections, analyser.duration))
+        elif stage == 'instruments':
+            self.signals.instruments_ready.emit((analyser.instruments or [], analyser.instrument_scores or {}))
+        self.signals.progress.emit(fraction)
+
+class WarmUpWorker(QRunnable):
+    '''
+    Imports and compiles the analysis code in the background at startup,
+    so the first file the user opens is analysed at full speed.
+    '''
+    def __init__(self, chroma=None):
+        super().__init__()
+        self.chroma = chroma
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            warm_up(self.chroma)
         except Exception as e:
             self.signals.error.emit((type(e), e, e.__traceback__))
         finally:
             self.signals.finished.emit()
 
-class PlaybackWorker(QObject):
-    """Worker for handling audio playback in a separate thread."""
-    positionChanged = pyqtSignal(float)
-    finished = pyqtSignal()
+class AnalysisJob:
+    """
+    A single scheduled analysis.
 
-    def __init__(self):
+    Attributes:
+        generation (int): Increases with every job, so results from older
+            jobs can be recognised and dropped.
+        file_path (str): The file being analysed.
+        worker (AnalysisWorker): The runnable doing the work.
+        foreground (bool): Whether the job's results are shown in the window.
+        promoted (bool): Whether the job started in the background and was
+            moved to the foreground part way through, so the window missed
+            its early stages.
+    """
+    def __init__(self, generation, file_path, worker, foreground):
+        self.generation = generation
+        self.file_path = file_path
+        self.worker = worker
+        self.foreground = foreground
+        self.promoted = False
+
+    def cancel(self):
+        self.worker.token.cancel()
+
+class AnalysisScheduler(QObject):
+    """
+    Runs analysis jobs on a QThreadPool: one foreground job for the track on
+    screen and a backlog of tracks pre-analysed in the background.
+
+    The backlog is analysed one file at a time, and only while no foreground
+    job is running, so pre-analysis never competes with the track the user
+    is waiting for. bump() moves a file, e.g. the next track in the playlist,
+    to the front of the backlog, and asking for a file that is already being
+    pre-analysed promotes that job instead of starting again. Likewise a
+    foreground job that is switched away from is moved to the background
+    rather than restarted, unless a background job is already running.
+
+    Signals:
+        job_started: AnalysisJob, emitted for foreground jobs before they run
+            (or when they are promoted) so their signals can be connected.
+        queue_changed: int number of files still queued.
+        status_changed: tuple (file path, status), where status is one of
+            'queued', 'analysing', 'ready', 'failed' or 'cancelled'.
+        result_ready: tuple (file path, AnalysisResult) for every finished
+            job, foreground or background.
+    """
+    job_started = pyqtSignal(object)
+    queue_changed = pyqtSignal(int)
+    status_changed = pyqtSignal(tuple)
+    result_ready = pyqtSignal(tuple)
+
+    def __init__(self, threadpool, cache=None, max_queued=256, chroma=None):
         super().__init__()
-        self.current_file = None
-        self.is_paused = False
-        self._is_running = False
-        self.timer = None
-
-    def load_file(self, file_path):
-        self.current_file = file_path
-        pygame.mixer.init()
-        pygame.mixer.music.load(self.current_file)
-
-    def play(self):
-        if self.current_file:
-            if not self._is_running:
-                pygame.mixer.music.play()
-                self._is_running = True
-                self.is_paused = False
-                
-                # This timer will run in the new thread's event loop
-                self.timer = QTimer()
-                self.timer.setInterval(100)
-                self.timer.timeout.connect(self.update_position)
-                self.timer.start()
-            elif self.is_paused:
-                pygame.mixer.music.unpause()
-                self.is_paused = False
-                if self.timer:
-                    self.timer.start()
-
-    def pause(self):
-        if self._is_running and not self.is_paused:
-            pygame.mixer.music.pause()
-            self.is_paused = True
-            if self.timer:
-                self.timer.stop()
-
-    def stop(self):
-        if self._is_running:
-            pygame.mixer.music.stop()
-            self._is_running = False
-            self.is_paused = False
-            if self.timer:
-                self.timer.stop()
-            self.positionChanged.emit(0)
-
-    def update_position(self):
-        if pygame.mixer.music.get_busy() and self._is_running and not self.is_paused:
-            pos_ms = pygame.mixer.music.get_pos()
-            pos_s = pos_ms / 1000.0
-            self.positionChanged.emit(pos_s)
-        elif self._is_running: # Song finished
-            self.stop()
-            self.finished.emit()
+        self.threadpool = threadpool
+        self.cache = cache
+        self.chroma = chroma
+        self.max_queued = max_queued
+        self.current = None
+        self._background = None
+        self._generation = 0
+        self._queue = deque()
+        # Every job whose worker has not finished, including cancelled ones,
+        # so a worker is never garbage collected while its thread runs it
+        self._unfinished = set()
+
+    def enqueue(self, file_paths):
+        """
+        Adds files to the end of the background backlog.
+
+        Files that are already queued or being analysed are skipped.
+
+        Returns:
+            int: The number of files dropped because the queue was full.
+        """
+        dropped = 0
+        for file_path in file_paths:
+            if file_path in self._queue or self._running(file_path) is not None:
+                continue
+            if len(self._queue) >= self.max_queued:
+                dropped += 1
+                continue
+            self._queue.append(file_path)
+            self.status_changed.emit((file_path, 'queued'))
+        self.queue_changed.emit(len(self._queue))
+        self._start_next()
+        return dropped
+
+    def analyse_now(self, file_path):
+        """
+        Makes the file the foreground job.
+
+        A different foreground job is released with release_foreground().
+        If the file is already being analysed in the background, that job is
+        promoted rather than restarted.
+        """
+        if self.current is not None and self.current.file_path == file_path:
+            return
+        self.release_foreground(start_next=False)
 
+        if file_path in self._queue:
+            self._queue.remove(file_path)
+        self.queue_changed.emit(len(self._queue))
+
+        if self._background is not None and self._background.file_path == file_path:
+            job, self._background = self._background, None
+            # A new generation, so the window's connections to the job from
+            # an earlier spell in the foreground stay ignored
+            self._generation += 1
+            job.generation = self._generation
+            job.foreground = True
+            job.promoted = True
+            job.worker.set_background(False)
+            self.current = job
+            self.job_started.emit(job)
+        else:
+            self._start(file_path, foreground=True)
+
+    def release_foreground(self, start_next=True):
+        """
+        Moves the foreground job to the background, where it keeps its
+        progress and finishes at a lower priority without being shown.
+
+        If a background job is already running, the foreground job is
+        cancelled instead and its file goes back onto the front of the
+        backlog.
+        """
+        if self.current is None:
+            return
+        job, self.current = self.current, None
+        if self._background is None:
+            job.foreground = False
+            job.worker.set_background(True)
+            self._background = job
+        else:
+            job.cancel()
+            self._queue.appendleft(job.file_path)
+            self.status_changed.emit((job.file_path, 'queued'))
+            self.queue_changed.emit(len(self._queue))
+        if start_next:
+            self._start_next()
+
+    def bump(self, file_path):
+        """
+        Moves a queued file to the front of the backlog.
+        """
+        if file_path in self._queue:
+            self._queue.remove(file_path)
+            self._queue.appendleft(file_path)
+
+    def cancel_all(self):
+        """
+        Cancels the running jobs and empties the queue.
+        """
+        for job in (self.current, self._background):
+            if job is not None:
+                job.cancel()
+        self.current = None
+        self._background = None
+        self._queue.clear()
+        self.queue_changed.emit(0)
+
+    def is_current(self, generation):
+        """
+        Returns True if the generation belongs to the current foreground job.
+        """
+        return self.current is not None and self.current.generation == generation
+
+    def _running(self, file_path):
+        for job in (self.current, self._background):
+            if job is not None and job.file_path == file_path:
+                return job
+        return None
+
+    def _start(self, file_path, foreground):
+        self._generation += 1
+        worker = AnalysisWorker(file_path, self.cache, preview=foreground, chroma=self.chroma)
+        worker.set_background(not foreground)
+        job = AnalysisJob(self._generation, file_path, worker, foreground)
+        self._unfinished.add(job)
+        worker.signals.result.connect(lambda result: self._job_succeeded(job, result))
+        worker.signals.error.connect(lambda error: self.status_changed.emit((file_path, 'failed')))
+        worker.signals.finished.connect(lambda: self._job_finished(job))
+        worker.setAutoDelete(False)
+
+        if foreground:
+            self.current = job
+            self.job_started.emit(job)
+        else:
+            self._background = job
+        self.status_changed.emit((file_path, 'analysing'))
+        # Background jobs run below the foreground job's priority
+        self.threadpool.start(worker, 0 if foreground else -1)
+
+    def _job_succeeded(self, job, result):
+        self.status_changed.emit((job.file_path, 'ready'))
+        self.result_ready.emit((job.file_path, result))
+
+    def _job_finished(self, job):
+        self._unfinished.discard(job)
+        if job is self.current:
+            self.current = None
+        elif job is self._background:
+            self._background = None
+        if job.worker.token.is_cancelled() and job.file_path not in self._queue and self._running(job.file_path) is None:
+            self.status_changed.emit((job.file_path, 'cancelled'))
+        self._start_next()
+
+    def _start_next(self):
+        if self.current is None and self._background is None and self._queue:
+            self._start(self._queue.popleft(), foreground=False)
+            self.queue_changed.emit(len(self._queue))
 
 class MainWindow(QMainWindow):
     """The main window of the Music Analyser application."""
-    def __init__(self):
+    def __init__(self, chroma=None):
+        """
+        Args:
+            chroma (ChromaSettings): How chromagrams are computed.
+        """
         super().__init__()
+        self.chroma_settings = chroma or ChromaSettings()
 
         self.setWindowTitle("ELEC5305 Music Analyser")
         self.setGeometry(100, 100, 1000, 800)
@@ -119,13 +505,46 @@ class MainWindow(QMainWindow):
         # --- Thread Pool for background tasks ---
         self.threadpool = QThreadPool()
 
+        # --- Persistent cache of analysis results ---
+        self.analysis_cache = AnalysisCache()
+
+        # --- Library index searched by library.py ---
+        self.library = LibraryIndex()
+
+        # --- Job scheduler with cancellation and background pre-analysis ---
+        self.scheduler = AnalysisScheduler(self.threadpool, self.analysis_cache, chroma=self.chroma_settings)
+        self.scheduler.job_started.connect(self.connect_job)
+        self.scheduler.queue_changed.connect(self.update_queue_label)
+        self.scheduler.status_changed.connect(self.update_track_status)
+        self.scheduler.result_ready.connect(self.store_result)
+
+        # --- Session: compact results of every analysed playlist track ---
+        self.session_results = {}
+        self.track_items = {}
+
         # --- Central Widget and Layout ---
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
-        layout = QVBoxLayout(self.central_widget)
+        root_layout = QHBoxLayout(self.central_widget)
+
+        # --- Playlist Panel ---
+        playlist_layout = QVBoxLayout()
+        self.playlist = QListWidget()
+        self.playlist.setMinimumWidth(220)
+        self.playlist.itemClicked.connect(lambda item: self.select_track(item.data(Qt.ItemDataRole.UserRole)))
+        self.playlist.itemActivated.connect(lambda item: self.select_track(item.data(Qt.ItemDataRole.UserRole)))
+        self.clear_playlist_button = QPushButton("Clear Playlist")
+        self.clear_playlist_button.clicked.connect(self.clear_playlist)
+        playlist_layout.addWidget(QLabel("Playlist"))
+        playlist_layout.addWidget(self.playlist, stretch=1)
+        playlist_layout.addWidget(self.clear_playlist_button)
+        root_layout.addLayout(playlist_layout)
+
+        layout = QVBoxLayout()
+        root_layout.addLayout(layout, stretch=1)
 
         # --- Load File Button ---
-        self.load_button = QPushButton("Load Audio File")
+        self.load_button = QPushButton("Add Audio Files")
         self.load_button.clicked.connect(self.open_file_dialog)
         layout.addWidget(self.load_button)
 
@@ -144,9 +563,33 @@ class MainWindow(QMainWindow):
         playback_layout.addWidget(self.stop_button)
         layout.addLayout(playback_layout)
 
+        # --- Live Input Buttons ---
+        live_layout = QHBoxLayout()
+        self.live_button = QPushButton("Live Input")
+        self.replay_button = QPushButton("Replay File as Live")
+        self.stop_live_button = QPushButton("Stop Live")
+        self.stop_live_button.setEnabled(False)
+
+        self.live_button.clicked.connect(lambda: self.start_live(MicrophoneSource()))
+        self.replay_button.clicked.connect(self.open_replay_dialog)
+        self.stop_live_button.clicked.connect(self.stop_live)
+
+        live_layout.addWidget(self.live_button)
+        live_layout.addWidget(self.replay_button)
+        live_layout.addWidget(self.stop_live_button)
+        layout.addLayout(live_layout)
+
         # --- File Info Label ---
+        file_info_layout = QHBoxLayout()
         self.file_label = QLabel("No file loaded.")
-        layout.addWidget(self.file_label)
+        self.queue_label = QLabel("")
+        self.export_grid_button = QPushButton("Export Beat Grid")
+        self.export_grid_button.setEnabled(False)
+        self.export_grid_button.clicked.connect(self.export_grid_dialog)
+        file_info_layout.addWidget(self.file_label, stretch=1)
+        file_info_layout.addWidget(self.queue_label)
+        file_info_layout.addWidget(self.export_grid_button)
+        layout.addLayout(file_info_layout)
 
         # --- Header Row for Musical Features ---
         header_layout = QHBoxLayout()
@@ -154,7 +597,7 @@ class MainWindow(QMainWindow):
         self.bpm_label = QLabel("BPM: --")
         self.key_label = QLabel("Key: --")
         self.time_signature_label = QLabel("Time Signature: --")
-        self.instruments_label = QLabel("Instruments: N/A")
+        self.instruments_label = QLabel("Instruments: --")
 
         # --- Style for feature labels ---
         feature_label_style = "font-size: 14pt; font-weight: bold;"
@@ -190,130 +633,490 @@ class MainWindow(QMainWindow):
         self.chromagram_plot.setLabel('bottom', 'Time (s)')
         self.chromagram_plot.setTitle('Chromagram')
 
+        # A thin lane under the chromagram that pans and zooms with it
+        self.chord_plot = pg.PlotWidget()
+        self.chord_plot.setBackground(None)
+        self.chord_plot.setFixedHeight(60)
+        self.chord_plot.setLabel('left', 'Chords')
+        self.chord_plot.getAxis('left').setTicks([[]])
+        self.chord_plot.hideAxis('bottom')
+        self.chord_plot.setMouseEnabled(y=False)
+        self.chord_plot.setYRange(0, 1, padding=0)
+        self.chord_plot.setXLink(self.chromagram_plot)
+        # Equal axis widths keep the lane's time axis under the chromagram's
+        for plot in (self.chromagram_plot, self.chord_plot):
+            plot.getAxis('left').setWidth(56)
+
         layout.addWidget(self.waveform_plot)
         layout.addWidget(self.chromagram_plot)
+        layout.addWidget(self.chord_plot)
 
         # --- Playback Indicator Lines ---
         self.waveform_line = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('y', width=2))
         self.chromagram_line = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('y', width=2))
         self.waveform_plot.addItem(self.waveform_line, ignoreBounds=True)
+        self.chord_line = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('y', width=2))
         self.chromagram_plot.addItem(self.chromagram_line, ignoreBounds=True)
+        self.chord_plot.addItem(self.chord_line, ignoreBounds=True)
         self.waveform_line.hide()
         self.chromagram_line.hide()
+        self.chord_line.hide()
+        self.waveform_item = None
+        self.chromagram_item = None
+        self.chord_item = None
+        self.bar_lines = None
+        self.section_items = []
+
+        # --- Click a plot to seek ---
+        for plot in (self.waveform_plot, self.chromagram_plot, self.chord_plot):
+            plot.scene().sigMouseClicked.connect(lambda event, plot=plot: self.seek_to_click(plot, event))
 
-        # --- Audio Playback Thread ---
-        self.playback_thread = QThread()
-        self.playback_worker = PlaybackWorker()
-        self.playback_worker.moveToThread(self.playback_thread)
+        # --- Audio Playback ---
+        self.playback = PlaybackEngine()
+        self.current_file = None
+        self.current_result = None
 
-        self.playback_worker.positionChanged.connect(self.update_playback_position)
-        self.playback_worker.finished.connect(self.on_playback_finished)
+        # The cursor is redrawn once per display frame while playing, reading
+        # the position straight from the audio clock
+        refresh_rate = self.screen().refreshRate() or 60.0
+        self.cursor_timer = QTimer(self)
+        self.cursor_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.cursor_timer.setInterval(max(1, int(1000 / refresh_rate)))
+        self.cursor_timer.timeout.connect(self.update_playback_position)
 
-        self.playback_thread.start()
+        # --- Live Input: analysed and redrawn at display rate ---
+        self.live_analyser = None
+        self.live_source = None
+        self.live_timer = QTimer(self)
+        self.live_timer.setInterval(max(1, int(1000 / refresh_rate)))
+        self.live_timer.timeout.connect(self.update_live)
 
-        self.current_file = None
+        # --- Startup: warm up the analysis code once the window is up ---
+        self.startup_time = None
+        self.warm_up_time = None
+        self.warm_up_worker = WarmUpWorker(self.chroma_settings)
+        self.warm_up_worker.setAutoDelete(False)
+        self.warm_up_worker.signals.finished.connect(self.warm_up_finished)
+        QTimer.singleShot(0, self.start_warm_up)
+
+    def start_warm_up(self):
+        """
+        Records the time to the first event loop pass and starts the warm-up.
+        """
+        self.startup_time = time.perf_counter() - START_TIME
+        self.statusBar().showMessage(f"Ready in {self.startup_time:.2f}s")
+        self.threadpool.start(self.warm_up_worker, -2)
+
+    def warm_up_finished(self):
+        self.warm_up_time = time.perf_counter() - START_TIME
+        log_observer({'event': 'startup', 'window_s': round(self.startup_time, 3),
+                      'warm_up_s': round(self.warm_up_time, 3)})
+        # Leave the status bar alone if an analysis has reported since
+        if self.statusBar().currentMessage().startswith("Ready in"):
+            self.statusBar().showMessage(
+                f"Ready in {self.startup_time:.2f}s (analysis warmed up after {self.warm_up_time:.1f}s)"
+            )
 
     def open_file_dialog(self):
         """
-        Opens a file dialog to allow the user to select an audio file.
+        Opens a file dialog to allow the user to select one or more audio files.
         """
-        file_path, _ = QFileDialog.getOpenFileName(
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self,
-            "Open Audio File",
+            "Open Audio Files",
             "",
             "Audio Files (*.wav *.mp3);;All Files (*)"
         )
 
-        if file_path:
+        if file_paths:
+            self.start_analysis(file_paths)
+
+    def start_analysis(self, file_paths):
+        """
+        Adds files to the playlist and shows the first of them.
+
+        The other new tracks are pre-analysed in the background, so
+        switching to them later shows their results straight away.
+        """
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        if not file_paths:
+            return
+
+        for file_path in file_paths:
+            if file_path not in self.track_items:
+                item = QListWidgetItem(file_path.split('/')[-1])
+                item.setData(Qt.ItemDataRole.UserRole, file_path)
+                item.setToolTip(file_path)
+                self.playlist.addItem(item)
+                self.track_items[file_path] = item
+
+        # Start the visible track first so the backlog queues behind it
+        self.select_track(file_paths[0])
+        dropped = self.scheduler.enqueue([f for f in file_paths[1:] if f not in self.session_results])
+        if dropped:
+            self.show_error_dialog(f"Only {self.scheduler.max_queued} files can be queued; {dropped} were skipped.")
+
+    def select_track(self, file_path):
+        """
+        Shows a playlist track, analysing it now if it has no result yet.
+
+        The track after it is bumped to the front of the background backlog,
+        so it is usually ready by the time the user moves on.
+        """
+        self.stop_live()
+        self.stop_audio()
+        self.playlist.setCurrentItem(self.track_items[file_path])
+
+        result = self.session_results.get(file_path)
+        if result is not None:
+            self.scheduler.release_foreground()
+            self.progress_bar.setVisible(False)
+            self.show_result(result)
+        else:
             self.file_label.setText(f"Loading: {file_path.split('/')[-1]}...")
-            self.start_analysis(file_path)
+            self.progress_bar.setRange(0, 0)  # Indeterminate until the first stage reports
+            self.progress_bar.setVisible(True)
+            self.bpm_label.setText("BPM: Analyzing...")
+            self.key_label.setText("Key: Analyzing...")
+            self.time_signature_label.setText("Time Signature: Analyzing...")
+            self.instruments_label.setText("Instruments: Analyzing...")
+            self.scheduler.analyse_now(file_path)
 
-    def start_analysis(self, file_path):
+        row = self.playlist.row(self.track_items[file_path])
+        if row + 1 < self.playlist.count():
+            self.scheduler.bump(self.playlist.item(row + 1).data(Qt.ItemDataRole.UserRole))
+
+    def clear_playlist(self):
         """
-        Starts the audio analysis in a background thread.
+        Stops all analysis and forgets every track in the session.
         """
-        self.progress_bar.setVisible(True)
-        self.load_button.setEnabled(False)
-        self.bpm_label.setText("BPM: Analyzing...")
-        self.key_label.setText("Key: Analyzing...")
-        self.time_signature_label.setText("Time Signature: Analyzing...")
+        self.scheduler.cancel_all()
+        self.stop_audio()
+        self.playlist.clear()
+        self.track_items.clear()
+        self.session_results.clear()
+        self.progress_bar.setVisible(False)
 
-        worker = AnalysisWorker(file_path)
-        worker.signals.result.connect(self.analysis_complete)
-        worker.signals.error.connect(self.analysis_error)
-        worker.signals.finished.connect(self.analysis_finished)
-        
-        self.threadpool.start(worker)
+    def store_result(self, ready):
+        """
+        Keeps a finished result, foreground or background, for the session.
+        """
+        file_path, result = ready
+        if file_path not in self.track_items:
+            return  # The playlist was cleared while it ran
+        self.session_results[file_path] = result
+        try:
+            self.library.add(result)
+        except sqlite3.Error as e:
+            print(f"Could not add {file_path} to the library: {e}")
+        self.track_items[file_path].setText(
+            f"{file_path.split('/')[-1]} ({result.bpm:.0f} BPM, {result.key})"
+        )
+
+    def update_track_status(self, status):
+        file_path, status = status
+        item = self.track_items.get(file_path)
+        if item is not None and status != 'ready':
+            item.setText(f"{file_path.split('/')[-1]} ({status})")
+
+    def connect_job(self, job):
+        """
+        Connects a foreground job's signals to the window.
+
+        Every slot is guarded by the job's generation, so anything a
+        cancelled job emits after a newer job has started is ignored.
+        """
+        signals = job.worker.signals
+        # A promoted job has already emitted its early stages, so draw
+        # everything from the result when it arrives
+        connections = [
+            (signals.result, self.show_result if job.promoted else self.analysis_complete),
+            (signals.partial, self.analysis_partial),
+            (signals.progress, self.update_progress),
+            (signals.waveform_ready, self.show_waveform),
+            (signals.bpm_ready, self.show_bpm),
+            (signals.chroma_ready, self.show_chromagram),
+            (signals.key_ready, self.show_key),
+            (signals.chords_ready, self.show_chords),
+            (signals.meter_ready, self.show_time_signature),
+            (signals.sections_ready, self.show_sections),
+            (signals.instruments_ready, self.show_instruments),
+            (signals.error, self.analysis_error),
+        ]
+        for signal, slot in connections:
+            signal.connect(self._if_current(job.generation, slot))
+        signals.finished.connect(lambda: self.analysis_finished(job.generation))
+
+    def _if_current(self, generation, slot):
+        def guarded(*args):
+            if self.scheduler.is_current(generation):
+                slot(*args)
+        return guarded
+
+    def update_queue_label(self, queued):
+        self.queue_label.setText(f"{queued} queued" if queued else "")
+
+    def analysis_partial(self, partial):
+        """
+        Shows provisional results from a preview pass or a streamed recording.
+        """
+        analyser, fraction = partial
+        self.file_label.setText(f"Analysing: {analyser.file_path.split('/')[-1]} ({fraction:.0%})")
+        self.bpm_label.setText(f"BPM: {analyser.bpm:.2f}?")
+        self.key_label.setText(f"Key: {analyser.key}?")
+        if analyser.waveform_pyramid is None:
+            analyser.compute_waveform_pyramid()
+        self.show_waveform(analyser.waveform_pyramid)
+        self.show_chromagram((analyser.chromagram, analyser.duration))
+
+    def update_progress(self, fraction):
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(int(round(fraction * 100)))
+
+    def show_bpm(self, bpm):
+        self.bpm_label.setText(f"BPM: {bpm:.2f}")
+
+    def show_key(self, key):
+        self.key_label.setText(f"Key: {key}")
+
+    def show_time_signature(self, meter):
+        time_signature, confidence = meter
+        self.time_signature_label.setText(f"Time Signature: {time_signature}")
+        self.time_signature_label.setToolTip(f"Confidence: {confidence:.0%}")
+
+    def show_instruments(self, tagged):
+        instruments, scores = tagged
+        self.instruments_label.setText(f"Instruments: {', '.join(instruments) or 'None detected'}")
+        self.instruments_label.setToolTip(
+            "\n".join(f"{name}: heard in {share:.0%} of the track" for name, share in scores.items())
+        )
+
+    def show_result(self, result):
+        """
+        Fills in every label and plot from a finished result.
+        """
+        self.show_bpm(result.bpm)
+        self.show_key(result.key)
+        self.show_time_signature((result.time_signature, result.meter_confidence))
+        if result.instruments is not None:
+            self.show_instruments((result.instruments, result.instrument_scores or {}))
+        result.compute_waveform_pyramid()
+        self.show_waveform(result.waveform_pyramid)
+        self.show_chromagram((result.chromagram, result.duration))
+        if result.chord_track is not None:
+            self.show_chords((result.chord_track, result.duration))
+        if result.sections is not None:
+            self.show_sections((result.sections, result.duration))
+        self.analysis_complete(result)
 
-    def analysis_complete(self, analyser):
+    def analysis_complete(self, result):
         """
         This function is called when the analysis worker has finished.
-        It updates the GUI with the results using pyqtgraph.
+        The labels and plots have already been filled in stage by stage.
         """
-        estimated_key = analyser.estimate_key(analyser.chromagram)
-        
-        self.file_label.setText(f"Loaded: {analyser.file_path.split('/')[-1]}")
-        self.bpm_label.setText(f"BPM: {np.median(analyser.bpm):.2f}")
-        self.key_label.setText(f"Key: {estimated_key}")
-        self.time_signature_label.setText(f"Time Signature: {analyser.time_signature}")
+        self.file_label.setText(f"Loaded: {result.file_path.split('/')[-1]}")
+
+        # Swap in the compacted envelopes, which lets the decoded waveform go
+        if self.waveform_item is not None and result.waveform_pyramid is not None:
+            self.waveform_item.pyramid = result.waveform_pyramid
+            self.waveform_item.update_view()
+
+        # --- Bar lines at every downbeat, drawn as a single curve ---
+        if self.bar_lines is not None:
+            self.waveform_plot.removeItem(self.bar_lines)
+            self.bar_lines = None
+        downbeats = result.downbeat_times()
+        if len(downbeats) and self.waveform_item is not None:
+            peak = self.waveform_item.pyramid.peak
+            self.bar_lines = pg.PlotCurveItem(
+                np.repeat(downbeats, 2), np.tile([-peak, peak], len(downbeats)),
+                connect='pairs', pen=pg.mkPen(color=(220, 220, 220, 70), width=1)
+            )
+            self.waveform_plot.addItem(self.bar_lines, ignoreBounds=True)
+        self.export_grid_button.setEnabled(len(result.beat_times) > 0)
+
+        # Cached results were never timed
+        if result.telemetry is not None:
+            breakdown = result.telemetry.format_breakdown()
+            self.file_label.setToolTip(breakdown)
+            self.statusBar().showMessage(breakdown.splitlines()[0])
+        else:
+            self.file_label.setToolTip("Loaded from the analysis cache")
+            self.statusBar().showMessage("Loaded from the analysis cache")
+
+        # The track is decoded for playback when it is first played, so
+        # switching tracks stays instant
+        self.current_file = result.file_path
+        self.current_result = result
+        if self.playback.file_path != self.current_file:
+            self.playback.close()
 
-        # --- Clear and update plots ---
+    def show_waveform(self, pyramid):
+        """
+        Draws a waveform pyramid onto the waveform plot.
+        """
+        # --- Clear and update the plot ---
+        if self.waveform_item is not None:
+            self.waveform_item.detach()
+            self.waveform_item = None
         self.waveform_plot.clear()
-        self.chromagram_plot.clear()
 
-        # --- Add playback lines back to plots after clearing ---
+        # --- Add the playback line back to the plot after clearing ---
         self.waveform_plot.addItem(self.waveform_line, ignoreBounds=True)
-        self.chromagram_plot.addItem(self.chromagram_line, ignoreBounds=True)
         self.waveform_line.setPos(0)
-        self.chromagram_line.setPos(0)
 
-        # --- Plot 1: Waveform ---
-        time_axis = np.linspace(0, len(analyser.y) / analyser.sr, num=len(analyser.y))
-        self.waveform_plot.plot(time_axis, analyser.y, pen=pg.mkPen(color='#5A2A82', width=1))
+        # Only the pyramid level matching the zoom is drawn, so redraws cost
+        # the same however long the track is
+        self.waveform_plot.setXRange(0, pyramid.duration, padding=0)
+        self.waveform_plot.setYRange(-pyramid.peak, pyramid.peak)
+        self.waveform_plot.setLimits(xMin=0, xMax=pyramid.duration)
+        self.waveform_item = LODWaveformItem(pyramid, pen=pg.mkPen(color='#5A2A82', width=1))
+        self.waveform_item.attach(self.waveform_plot)
+
+    def show_chromagram(self, chroma):
+        """
+        Draws a (chromagram, duration) pair onto the chromagram plot.
+        """
+        chromagram, duration = chroma
+
+        # --- Clear and update the plot ---
+        if self.chromagram_item is not None:
+            self.chromagram_item.detach()
+            self.chromagram_item = None
+        self.chromagram_plot.clear()
 
-        # --- Plot 2: Chromagram ---
-        img = pg.ImageItem(image=analyser.chromagram)
-        self.chromagram_plot.addItem(img)
+        # --- Add the playback line back to the plot after clearing ---
+        self.chromagram_plot.addItem(self.chromagram_line, ignoreBounds=True)
+        self.chromagram_line.setPos(0)
 
-        # Set y-axis ticks for chromagram
-        pitch_classes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+        # Set y-axis ticks for chromagram, centred on each pitch class row
         y_axis = self.chromagram_plot.getAxis('left')
-        ticks = [(i, pitch) for i, pitch in enumerate(pitch_classes)]
+        ticks = [(i + 0.5, pitch) for i, pitch in enumerate(PITCH_CLASSES)]
         y_axis.setTicks([ticks])
-        
-        # Set the color map for the image
-        cmap = pg.colormap.get('viridis')
-        img.setLookupTable(cmap.getLookupTable())
-        
-        # Scale the image correctly
-        img.setRect(0, 0, time_axis[-1], 12)
+
+        # Only the tiles in view are drawn, at about one column per pixel, so
+        # zooming in shows every frame and redraws stay cheap on long tracks
         self.chromagram_plot.setYRange(0, 12)
-        self.chromagram_plot.setXRange(0, time_axis[-1])
+        self.chromagram_plot.setXRange(0, duration, padding=0)
+        self.chromagram_plot.setLimits(xMin=0, xMax=duration)
+        self.chromagram_item = TiledChromagramItem(ChromaPyramid(chromagram, duration))
+        self.chromagram_item.attach(self.chromagram_plot)
+        self.clear_chords()
+        self.clear_sections()
+
+    def show_chords(self, chords):
+        """
+        Draws a (chord track, duration) pair onto the chord lane.
+        """
+        chord_track, duration = chords
+        self.clear_chords()
+        self.chord_item = ChordLaneItem(chord_track, duration)
+        self.chord_item.attach(self.chord_plot)
+
+    def clear_chords(self):
+        if self.chord_item is not None:
+            self.chord_item.detach()
+            self.chord_item = None
+        self.chord_plot.clear()
+        self.chord_plot.addItem(self.chord_line, ignoreBounds=True)
+
+    def show_sections(self, sections):
+        """
+        Shades a (sections, duration) pair behind the waveform and chromagram.
+        """
+        sections, duration = sections
+        self.clear_sections()
+        if sections is None or len(sections[1]) < 2 or self.waveform_item is None:
+            return
+        peak = self.waveform_item.pyramid.peak
+        for plot, label_y in ((self.waveform_plot, peak), (self.chromagram_plot, None)):
+            item = SectionRegionsItem(sections, duration, label_y=label_y)
+            if plot is self.chromagram_plot:
+                # Tinted over the image, which would otherwise hide it
+                item.setZValue(5)
+            plot.addItem(item, ignoreBounds=True)
+            self.section_items.append((plot, item))
+
+    def clear_sections(self):
+        for plot, item in self.section_items:
+            plot.removeItem(item)
+        self.section_items = []
 
-        self.current_file = analyser.file_path
-        self.playback_worker.load_file(self.current_file)
+    def load_playback(self):
+        """
+        Makes sure the current file is decoded for playback.
+
+        Returns:
+            bool: True if the file can be played.
+        """
+        if not self.current_file:
+            self.show_error_dialog("No audio file loaded.")
+            return False
+        if self.playback.file_path != self.current_file and not self.playback.load(self.current_file):
+            self.show_error_dialog(PlaybackEngine.available() or "Could not play the audio file.")
+            return False
+        return True
 
     def play_audio(self):
-        if self.current_file:
-            self.playback_worker.play()
+        if self.load_playback():
+            self.playback.play()
             self.waveform_line.show()
             self.chromagram_line.show()
-        else:
-            self.show_error_dialog("No audio file loaded.")
+            self.chord_line.show()
+            self.cursor_timer.start()
 
     def pause_audio(self):
-        self.playback_worker.pause()
+        self.playback.pause()
+        self.cursor_timer.stop()
+        self.update_playback_position()
 
     def stop_audio(self):
-        self.playback_worker.stop()
+        self.playback.stop()
+        self.cursor_timer.stop()
         self.waveform_line.setPos(0)
         self.chromagram_line.setPos(0)
+        self.chord_line.setPos(0)
         self.waveform_line.hide()
         self.chromagram_line.hide()
+        self.chord_line.hide()
+
+    def seek_audio(self, seconds):
+        """
+        Moves playback, and the cursor, to a time in seconds.
+        """
+        if not self.load_playback():
+            return
+        self.playback.seek(seconds)
+        self.waveform_line.show()
+        self.chromagram_line.show()
+        self.chord_line.show()
+        self.update_playback_position()
+
+    def seek_to_click(self, plot, event):
+        """
+        Seeks to the time under a left click on the waveform, chromagram or
+        chord lane.
+        """
+        if event.button() != Qt.MouseButton.LeftButton or self.current_file is None:
+            return
+        view_box = plot.getViewBox()
+        if not view_box.sceneBoundingRect().contains(event.scenePos()):
+            return
+        self.seek_audio(max(0.0, view_box.mapSceneToView(event.scenePos()).x()))
 
-    def update_playback_position(self, pos_s):
-        self.waveform_line.setPos(pos_s)
-        self.chromagram_line.setPos(pos_s)
+    def update_playback_position(self):
+        if self.playback.finished:
+            self.on_playback_finished()
+            return
+        # Nothing to redraw while the window is hidden
+        if not self.isVisible() or self.isMinimized():
+            return
+        position = self.playback.position
+        if position != self.waveform_line.value():
+            self.waveform_line.setPos(position)
+            self.chromagram_line.setPos(position)
+            self.chord_line.setPos(position)
 
     def on_playback_finished(self):
         self.stop_audio()
@@ -326,13 +1129,24 @@ class MainWindow(QMainWindow):
         self.bpm_label.setText("BPM: --")
         self.key_label.setText("Key: --")
         self.time_signature_label.setText("Time Signature: --")
+        self.instruments_label.setText("Instruments: --")
+        if self.waveform_item is not None:
+            self.waveform_item.detach()
+            self.waveform_item = None
         self.waveform_plot.clear()
+        if self.chromagram_item is not None:
+            self.chromagram_item.detach()
+            self.chromagram_item = None
         self.chromagram_plot.clear()
+        self.clear_chords()
+        self.clear_sections()
 
-    def analysis_finished(self):
-        """Called when the worker thread has finished."""
-        self.progress_bar.setVisible(False)
-        self.load_button.setEnabled(True)
+    def analysis_finished(self, generation):
+        """Called when a foreground worker has finished."""
+        # The scheduler clears its current job in its own finished handler,
+        # so only hide the progress bar if no newer job has replaced it
+        if self.scheduler.current is None or self.scheduler.current.generation == generation:
+            self.progress_bar.setVisible(False)
 
     def show_error_dialog(self, message):
         """Displays an error message in a dialog box."""
@@ -342,14 +1156,174 @@ class MainWindow(QMainWindow):
         dlg.setIcon(QMessageBox.Icon.Critical)
         dlg.exec()
 
+    def export_grid_dialog(self):
+        """
+        Saves the beat grid of the current track for DJ software.
+        """
+        if self.current_result is None:
+            return
+        name = os.path.splitext(os.path.basename(self.current_result.file_path))[0]
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Export Beat Grid",
+            name + ".xml",
+            "rekordbox XML (*.xml);;CSV (*.csv);;JSON (*.json)"
+        )
+        if not file_path:
+            return
+        try:
+            export_beat_grid([self.current_result], file_path)
+        except OSError as e:
+            self.show_error_dialog(f"Could not export the beat grid: {e}")
+            return
+        self.statusBar().showMessage(f"Exported {len(self.current_result.beat_times)} beats to {file_path}")
+
+    def open_replay_dialog(self):
+        """
+        Picks a file to replay in real time as a stand-in for a live input.
+        """
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Replay Audio File as Live Input",
+            "",
+            "Audio Files (*.wav *.flac *.ogg *.mp3);;All Files (*)"
+        )
+        if file_path:
+            self.start_live(FileReplaySource(file_path))
+
+    def start_live(self, source):
+        """
+        Starts analysing a live source, replacing the plots with scrolling views.
+        """
+        self.stop_live()
+        self.stop_audio()
+        # A foreground analysis would draw over the live plots, so move it
+        # to the background, where it finishes without being shown
+        self.scheduler.release_foreground()
+        self.progress_bar.setVisible(False)
+        self.playlist.setCurrentItem(None)
+        self.current_file = None
+        self.current_result = None
+        self.export_grid_button.setEnabled(False)
+
+        analyser = LiveAnalyser()
+        try:
+            source.start(analyser.push)
+        except Exception as e:
+            self.show_error_dialog(f"Could not open the live input: {e}")
+            return
+        self.live_analyser = analyser
+        self.live_source = source
+
+        # --- Clear and update the plots ---
+        if self.waveform_item is not None:
+            self.waveform_item.detach()
+            self.waveform_item = None
+        if self.chromagram_item is not None:
+            self.chromagram_item.detach()
+            self.chromagram_item = None
+        self.waveform_plot.clear()
+        self.chromagram_plot.clear()
+        self.clear_chords()
+        self.clear_sections()
+
+        # Time runs up to 0 at the right edge, where new audio comes in
+        history = analyser.chroma.capacity * analyser.hop_duration
+        for plot in (self.waveform_plot, self.chromagram_plot):
+            plot.setLimits(xMin=-history, xMax=0)
+            plot.setXRange(-history, 0, padding=0)
+        self.waveform_plot.setYRange(-1, 1)
+        self.live_waveform_curve = pg.PlotCurveItem(pen=pg.mkPen(color='#5A2A82', width=1))
+        self.waveform_plot.addItem(self.live_waveform_curve)
+        self.live_chroma_image = pg.ImageItem()
+        self.live_chroma_image.setLookupTable(pg.colormap.get('viridis').getLookupTable())
+        self.chromagram_plot.addItem(self.live_chroma_image)
+
+        self.file_label.setText(f"Live: {getattr(source, 'file_path', None) or 'input device'}")
+        self.file_label.setToolTip("")
+        self.bpm_label.setText("BPM: --")
+        self.key_label.setText("Key: --")
+        self.time_signature_label.setText("Time Signature: --")
+        self.instruments_label.setText("Instruments: --")
+        self.live_button.setEnabled(False)
+        self.replay_button.setEnabled(False)
+        self.stop_live_button.setEnabled(True)
+        self.live_timer.start()
+
+    def update_live(self):
+        """
+        Analyses the audio that arrived since the last frame and scrolls the plots.
+        """
+        analyser = self.live_analyser
+        if analyser is None:
+            return
+        running = self.live_source.running
+        analyser.process()
+        snapshot = analyser.snapshot()
+
+        # One vertical stroke per hop from its minimum to its maximum
+        waveform = snapshot['waveform']
+        n_frames = waveform.shape[1]
+        times = (np.arange(n_frames) - n_frames) * analyser.hop_duration
+        y = np.empty(2 * n_frames, dtype=waveform.dtype)
+        y[0::2] = waveform[0]
+        y[1::2] = waveform[1]
+        self.live_waveform_curve.setData(np.repeat(times, 2), y)
+
+        if n_frames:
+            self.live_chroma_image.setImage(snapshot['chroma'].T, levels=(0, 1))
+            self.live_chroma_image.setRect(-n_frames * analyser.hop_duration, 0, n_frames * analyser.hop_duration, 12)
+
+        if snapshot['bpm']:
+            self.bpm_label.setText(f"BPM: {snapshot['bpm']:.1f}")
+        self.key_label.setText(f"Key: {snapshot['key']}")
+        self.statusBar().showMessage(
+            f"Live: {analyser.latency * 1000:.0f} ms latency, analysis uses {analyser.load:.1%} of each hop"
+        )
+        # A replayed file ends on its own
+        if not running:
+            self.stop_live()
+
+    def stop_live(self):
+        if self.live_source is None:
+            return
+        self.live_timer.stop()
+        self.live_source.stop()
+        self.live_source = None
+        self.live_analyser = None
+        self.live_button.setEnabled(True)
+        self.replay_button.setEnabled(True)
+        self.stop_live_button.setEnabled(False)
+        self.statusBar().showMessage("Live input stopped")
+
     def closeEvent(self, event):
-        self.playback_thread.quit()
-        self.playback_thread.wait()
+        self.stop_live()
+        self.scheduler.cancel_all()
+        self.threadpool.waitForDone(5000)
+        self.playback.close()
+        self.library.close()
         super().closeEvent(event)
 
 # --- Main execution block ---
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    # Per-stage timings are written as JSON Lines when a log file is given
+    telemetry_log = os.environ.get('MUSIC_ANALYSER_TELEMETRY_LOG')
+    if telemetry_log:
+        handler = logging.FileHandler(telemetry_log)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        telemetry_logger.addHandler(handler)
+        telemetry_logger.setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Analyse and play music.")
+    parser.add_argument('--startup-time', action='store_true',
+                        help="Print the cold-start and warm-up times, then exit.")
+    parser.add_argument('--chroma', choices=CHROMA_METHODS, default='stft',
+                        help="How chromagrams are computed (default: stft; cqt resolves low notes better).")
+    parser.add_argument('--chroma-hop', type=int, default=None,
+                        help="Samples between chroma frames (default: 512).")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
 
     # --- Dark Theme with Purple Accents ---
     app.setStyleSheet("""
@@ -394,6 +1368,12 @@ if __name__ == '__main__':
         }
     """)
 
-    main_win = MainWindow()
+    main_win = MainWindow(chroma=ChromaSettings(args.chroma, args.chroma_hop))
     main_win.show()
+    if args.startup_time:
+        def report_startup():
+            print(f"Window ready after {main_win.startup_time:.3f}s, "
+                  f"analysis warmed up after {main_win.warm_up_time:.3f}s")
+            main_win.close()
+        main_win.warm_up_worker.signals.finished.connect(report_startup)
     sys.exit(app.exec())
\ No newline at end of file
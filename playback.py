@@ -0,0 +1,208 @@
+import tempfile
+import threading
+
+import numpy as np
+import soundfile as sf
+
+# sounddevice loads PortAudio when imported, so it is only imported once
+# something is played
+sd = None
+
+# Decoded audio at least this long is kept in a memory-mapped temporary file
+MEMMAP_MIN_DURATION = 20 * 60  # seconds
+
+class PlaybackEngine:
+    """
+    Plays a decoded track through a callback-driven audio output stream.
+
+    The whole track is decoded once, at its native sample rate and channel
+    count, and the output callback copies consecutive frames from that buffer
+    to the sound card. The callback keeps a frame counter and the time the
+    sound card will play each block, so position reports where the listener
+    actually is, to the sample, and stays right across pauses and seeks.
+    position is a plain attribute read, so a GUI can poll it as often as it
+    redraws without any cross-thread signals.
+
+    Attributes:
+        file_path (str): The loaded file.
+        sr (int): The sample rate of the decoded audio.
+        audio (np.ndarray): The decoded (frames, channels) float32 audio.
+        finished (bool): True once playback has reached the end of the track.
+    """
+
+    def __init__(self, latency='low'):
+        """
+        Args:
+            latency (str or float): The output latency requested from PortAudio.
+        """
+        self.latency = latency
+        self.file_path = None
+        self.sr = None
+        self.audio = None
+        self.finished = False
+        self._stream = None
+        self._lock = threading.Lock()
+        self._frame = 0
+        # (first frame of the last block, when it plays, earliest frame to report)
+        self._clock = None
+        self._jumped = True
+
+    @staticmethod
+    def available():
+        """Returns an error message if audio output is unavailable, else None."""
+        global sd
+        if sd is None:
+            try:
+                import sounddevice
+            except OSError as e:  # PortAudio is not installed
+                return f"Audio output is unavailable: {e}"
+            sd = sounddevice
+        return None
+
+    def load(self, file_path):
+        """
+        Decodes a file for playback, stopping whatever was playing.
+
+        Returns:
+            bool: True if the file was decoded and an output stream opened.
+        """
+        self.close()
+        error = self.available()
+        if error is not None:
+            print(error)
+            return False
+        try:
+            self.audio, self.sr = self._decode(file_path)
+            self._stream = sd.OutputStream(
+                samplerate=self.sr, channels=self.audio.shape[1], dtype='float32',
+                latency=self.latency, callback=self._callback, finished_callback=self._on_finished
+            )
+        except Exception as e:
+            print(f"Error loading file for playback: {e}")
+            self.audio = None
+            return False
+        self.file_path = file_path
+        self._frame = 0
+        self.finished = False
+        return True
+
+    @property
+    def loaded(self):
+        return self._stream is not None
+
+    @property
+    def playing(self):
+        return self._stream is not None and self._stream.active
+
+    @property
+    def duration(self):
+        return 0.0 if self.audio is None else len(self.audio) / self.sr
+
+    @property
+    def position(self):
+        """The playback position in seconds."""
+        if self.audio is None:
+            return 0.0
+        clock = self._clock
+        if clock is None or not self.playing:
+            return self._frame / self.sr
+        # Extrapolate from the last block handed to the sound card. Just after
+        # a seek or resume the frames before it are not what is playing, so
+        # the position is held at the jump until the new audio is heard.
+        start, dac_time, floor = clock
+        frame = start + (self._stream.time - dac_time) * self.sr
+        return float(np.clip(frame, floor, self._frame)) / self.sr
+
+    def play(self):
+        if self._stream is None or self._stream.active:
+            return
+        if self.finished or self._frame >= len(self.audio):
+            self.seek(0.0)
+        self.finished = False
+        self._jumped = True
+        # A stream that stopped itself at the end must be stopped before restarting
+        if not self._stream.stopped:
+            self._stream.stop()
+        self._stream.start()
+
+    def pause(self):
+        if self._stream is not None and self._stream.active:
+            # stop() lets the queued blocks play out, so the frame counter is
+            # exactly where the audio paused
+            self._stream.stop()
+            self._clock = None
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.abort()
+        self._clock = None
+        self._frame = 0
+        self.finished = False
+
+    def seek(self, seconds):
+        """
+        Moves playback to a time in seconds; takes effect from the next block.
+        """
+        if self.audio is None:
+            return
+        frame = int(np.clip(seconds * self.sr, 0, len(self.audio)))
+        with self._lock:
+            self._frame = frame
+            self._clock = None
+            self._jumped = True
+        self.finished = False
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.abort()
+            self._stream.close()
+            self._stream = None
+        self.audio = None
+        self.file_path = None
+        self._clock = None
+
+    def _callback(self, outdata, frames, time, status):
+        # Runs on the audio thread: copy the next frames and nothing else
+        with self._lock:
+            start = self._frame
+            chunk = self.audio[start:start + frames]
+            self._frame = start + len(chunk)
+            if self._jumped or self._clock is None:
+                floor = start
+            else:
+                floor = self._clock[2]
+            self._jumped = False
+            self._clock = (start, time.outputBufferDacTime, floor)
+        outdata[:len(chunk)] = chunk
+        if len(chunk) < frames:
+            outdata[len(chunk):] = 0
+            raise sd.CallbackStop()
+
+    def _on_finished(self):
+        if self.audio is not None and self._frame >= len(self.audio):
+            self.finished = True
+
+    @staticmethod
+    def _decode(file_path):
+        try:
+            f = sf.SoundFile(file_path)
+        except Exception:
+            # Formats libsndfile cannot read go through librosa's fallbacks
+            import librosa
+            y, sr = librosa.load(file_path, sr=None, mono=False)
+            return np.ascontiguousarray(np.atleast_2d(y).T, dtype=np.float32), sr
+
+        with f:
+            shape = (f.frames, f.channels)
+            if f.frames / f.samplerate >= MEMMAP_MIN_DURATION:
+                # Long recordings are paged in from disk as they play
+                audio = np.memmap(tempfile.TemporaryFile(), dtype=np.float32, mode='w+', shape=shape)
+            else:
+                audio = np.empty(shape, dtype=np.float32)
+            read = 0
+            for block in f.blocks(blocksize=1 << 16, dtype='float32', always_2d=True):
+                # Frame counts of compressed formats can be estimates
+                block = block[:len(audio) - read]
+                audio[read:read + len(block)] = block
+                read += len(block)
+            return audio[:read], f.samplerate
@@ -0,0 +1,216 @@
+import numpy as np
+import pyqtgraph as pg
+
+from chords import NO_CHORD
+from chroma import PITCH_CLASSES
+
+class ViewFollowingItem:
+    """
+    A mixin for plot items that redraw themselves for the visible range.
+
+    Subclasses implement update_view(), which is called whenever the view
+    box they are attached to pans, zooms or resizes.
+    """
+
+    _view_box = None
+
+    def attach(self, plot_widget):
+        """
+        Adds the item to a plot and updates it whenever the view changes.
+        """
+        plot_widget.addItem(self)
+        self._view_box = plot_widget.getViewBox()
+        self._view_box.sigXRangeChanged.connect(self.update_view)
+        self._view_box.sigResized.connect(self.update_view)
+        self.update_view()
+
+    def detach(self):
+        """
+        Stops following the view, e.g. before the plot is cleared.
+        """
+        if self._view_box is not None:
+            self._view_box.sigXRangeChanged.disconnect(self.update_view)
+            self._view_box.sigResized.disconnect(self.update_view)
+            self._view_box = None
+
+    def update_view(self, *args):
+        """
+        Redraws the item for the current view range. Does nothing here;
+        subclasses override it.
+        """
+
+class LODWaveformItem(ViewFollowingItem, pg.PlotCurveItem):
+    """
+    A curve that draws a WaveformPyramid at the level of detail of its view.
+
+    Only the points inside the visible range are handed to pyqtgraph, and the
+    pyramid level is picked so there are about two points per pixel.
+    """
+
+    def __init__(self, pyramid, **kwargs):
+        """
+        Args:
+            pyramid (WaveformPyramid): The waveform envelopes to draw.
+            **kwargs: Passed on to pg.PlotCurveItem, e.g. pen.
+        """
+        super().__init__(**kwargs)
+        self.pyramid = pyramid
+
+    def update_view(self, *args):
+        if self._view_box is None:
+            return
+        (start, end), _ = self._view_box.viewRange()
+        width = max(1, int(self._view_box.width()))
+        x, y = self.pyramid.view(start, end, 2 * width)
+        self.setData(x, y)
+
+class TiledChromagramItem(ViewFollowingItem, pg.ItemGroup):
+    """
+    Draws a ChromaPyramid as image tiles at the level of detail of its view.
+
+    Only the tiles overlapping the visible range exist as images, and tiles
+    that scroll out of view are dropped, so memory and redraw time depend on
+    the width of the plot rather than the length of the track.
+    """
+
+    def __init__(self, pyramid, colormap='viridis'):
+        """
+        Args:
+            pyramid (ChromaPyramid): The chromagram tiles to draw.
+            colormap (str): The name of a pyqtgraph colour map.
+        """
+        super().__init__()
+        self.pyramid = pyramid
+        self.lookup_table = pg.colormap.get(colormap).getLookupTable()
+        self._tiles = {}
+
+    def update_view(self, *args):
+        if self._view_box is None:
+            return
+        (start, end), _ = self._view_box.viewRange()
+        width = max(1, int(self._view_box.width()))
+        visible = set(self.pyramid.visible_tiles(start, end, width))
+
+        for key in list(self._tiles):
+            if key not in visible:
+                self._tiles.pop(key).setParentItem(None)
+        for key in visible - self._tiles.keys():
+            tile, tile_start, tile_end = self.pyramid.tile(*key)
+            image = pg.ImageItem(tile.astype(np.float32), levels=(0, self.pyramid.peak))
+            image.setLookupTable(self.lookup_table)
+            image.setRect(tile_start, 0, tile_end - tile_start, 12)
+            image.setParentItem(self)
+            self._tiles[key] = image
+
+class ChordLaneItem(ViewFollowingItem, pg.ItemGroup):
+    """
+    Draws a chord timeline as a lane of coloured blocks with chord names.
+
+    Every chord is one bar of a single BarGraphItem, coloured by its root and
+    quality. Names are only drawn for the chords in view that are wide
+    enough on screen to read, so zooming out on a long track shows the
+    colours alone.
+    """
+
+    def __init__(self, chord_track, duration, min_label_pixels=28):
+        """
+        Args:
+            chord_track (tuple): (start_times, chords) from recognise_chords().
+            duration (float): The length of the audio in seconds.
+            min_label_pixels (int): The narrowest block that gets a name.
+        """
+        super().__init__()
+        start_times, self.chords = chord_track
+        self.starts = np.asarray(start_times, dtype=np.float64)
+        self.ends = np.append(self.starts[1:], duration) if len(self.starts) else self.starts
+        self.min_label_pixels = min_label_pixels
+        self._labels = []
+
+        bars = pg.BarGraphItem(
+            x0=self.starts, width=self.ends - self.starts, y0=0.0, height=1.0,
+            brushes=[self.chord_colour(chord) for chord in self.chords], pen=pg.mkPen(None)
+        )
+        bars.setParentItem(self)
+
+    @staticmethod
+    def chord_colour(chord):
+        """
+        Returns the fill colour for a chord label: the hue follows the root
+        around the circle of fifths, minor chords are darker and sevenths
+        paler, and 'N' is grey.
+        """
+        if chord == NO_CHORD:
+            return pg.mkBrush(90, 90, 90, 120)
+        root = chord[:2] if chord[1:2] == '#' else chord[:1]
+        quality = chord[len(root):]
+        hue = (PITCH_CLASSES.index(root) * 7 % 12) / 12
+        colour = pg.QtGui.QColor.fromHsvF(hue, 0.45 if quality == '7' else 0.7, 0.55 if quality == 'm' else 0.85)
+        return pg.mkBrush(colour)
+
+    def update_view(self, *args):
+        if self._view_box is None:
+            return
+        (start, end), _ = self._view_box.viewRange()
+        if end <= start:
+            return
+        pixels_per_second = self._view_box.width() / (end - start)
+        visible = np.flatnonzero(
+            (self.ends > start) & (self.starts < end)
+            & ((self.ends - self.starts) * pixels_per_second >= self.min_label_pixels)
+        )
+
+        # Text items are reused, so panning only moves and renames them
+        while len(self._labels) < len(visible):
+            label = pg.TextItem(color='w', anchor=(0, 0.5))
+            label.setParentItem(self)
+            self._labels.append(label)
+        for label, index in zip(self._labels, visible):
+            label.setText(self.chords[index])
+            label.setPos(max(self.starts[index], start), 0.5)
+            label.show()
+        for label in self._labels[len(visible):]:
+            label.hide()
+
+class SectionRegionsItem(pg.ItemGroup):
+    """
+    Shades the sections of a song as coloured regions behind a plot.
+
+    Sections that share a label share a colour, so repeats of a verse or
+    chorus are easy to spot. The item is meant to be added with ignoreBounds
+    so it never changes the plot's range. It sits behind the other items,
+    so over opaque content such as an image its z value should be raised.
+    """
+
+    # Fill colours for the letters, in order of first appearance
+    PALETTE = [(66, 135, 245), (245, 166, 35), (80, 200, 120), (220, 80, 160), (150, 110, 230), (60, 200, 210)]
+
+    def __init__(self, sections, duration, label_y=None):
+        """
+        Args:
+            sections (tuple): (start_times, labels) from segment_structure().
+            duration (float): The length of the audio in seconds.
+            label_y (float): Where to write each section's name, or None
+                for no names.
+        """
+        super().__init__()
+        start_times, labels = sections
+        starts = np.asarray(start_times, dtype=np.float64)
+        ends = np.append(starts[1:], duration)
+        letters = sorted({label for label in labels if len(label) == 1})
+        for start, end, label in zip(starts, ends, labels):
+            region = pg.LinearRegionItem((start, end), movable=False, brush=self.section_colour(label, letters), pen=pg.mkPen(None))
+            region.setParentItem(self)
+            if label_y is not None:
+                text = pg.TextItem(label, color=(60, 60, 60), anchor=(0, 0))
+                text.setPos(start, label_y)
+                text.setParentItem(self)
+        self.setZValue(-10)
+
+    @classmethod
+    def section_colour(cls, label, letters):
+        """
+        Returns the fill brush for a section label; intros and outros are grey.
+        """
+        if label not in letters:
+            return pg.mkBrush(140, 140, 140, 40)
+        return pg.mkBrush(*cls.PALETTE[letters.index(label) % len(cls.PALETTE)], 45)
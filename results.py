@@ -0,0 +1,166 @@
+import numpy as np
+
+from chroma import ChromaSettings
+from waveform import WaveformPyramid
+
+class AnalysisResult:
+    """
+    The compact, finished result of analysing one file.
+
+    An AudioAnalyser keeps the decoded waveform and the full spectrogram
+    alive, which for a long track is hundreds of MB. A result keeps only what
+    the window and the cache need: the scalar estimates, the chromagram in
+    float16, the min/max overview and a compacted waveform pyramid whose raw
+    samples live in a memory-mapped temporary file. Attribute names match
+    AudioAnalyser's, so a result can be passed anywhere an analyser's results
+    are read, e.g. to AnalysisCache.store().
+
+    Attributes:
+        file_path (str): The analysed file.
+        profile (DecodeProfile): How the file was decoded.
+        sr (int): The analysis sample rate.
+        hop_length (int): The analysis hop length, i.e. the number of
+            samples between STFT and onset frames. The chromagram's own hop
+            is chroma_hop_length, which differs for e.g. CQT chroma.
+        chroma_hop_length (int): The number of samples between chromagram
+            frames, from chroma_settings.
+        duration (float): The length of the audio in seconds.
+        bpm (float): The estimated tempo.
+        beat_times (np.ndarray): The time of every tracked beat in seconds.
+        key (str): The estimated key.
+        key_track (tuple): (start_times, keys) of the windowed key estimates.
+        chord_track (tuple): (start_times, chords) of the chord timeline.
+        sections (tuple): (start_times, labels) of the song's sections.
+        time_signature (str): The estimated time signature.
+        instruments (list[str]): The tagged instruments, or None if not tagged.
+        instrument_scores (dict): Each instrument's share of detected segments.
+        meter_confidence (float): The winning meter's share of the scores.
+        downbeat_phase (int): The index of the first downbeat in beat_times.
+        beats_per_bar (int): The number of beats in a bar.
+        chromagram (np.ndarray): The (12, T) chromagram as float16.
+        beat_chroma (np.ndarray): The (12, beats + 1) beat-synchronous chroma.
+        chroma_settings (ChromaSettings): How the chromagram was computed.
+        waveform_overview (np.ndarray): The (2, bins) min/max overview.
+        waveform_pyramid (WaveformPyramid): The compacted plotting envelopes.
+        telemetry (Telemetry): The run's telemetry, or None if not timed.
+    """
+
+    __slots__ = (
+        'file_path', 'profile', 'sr', 'hop_length', 'duration', 'bpm', 'beat_times', 'key', 'key_track',
+        'chord_track', 'sections', 'time_signature', 'meter_confidence', 'downbeat_phase', 'beats_per_bar', 'chromagram',
+        'beat_chroma', 'chroma_settings', 'instruments', 'instrument_scores',
+        'waveform_overview', 'waveform_pyramid', 'telemetry',
+    )
+
+    def __init__(self, file_path, profile, sr, hop_length, duration, bpm, key, time_signature,
+                 chromagram, waveform_overview, key_track=None, meter_confidence=0.0,
+                 downbeat_phase=0, waveform_pyramid=None, telemetry=None, chroma_settings=None,
+                 beat_times=None, beats_per_bar=0, beat_chroma=None, instruments=None, instrument_scores=None,
+                 chord_track=None, sections=None):
+        self.file_path = file_path
+        self.profile = profile
+        self.sr = sr
+        self.hop_length = hop_length
+        self.duration = float(duration)
+        self.bpm = float(np.median(bpm))
+        self.key = key
+        self.key_track = key_track
+        self.chord_track = chord_track
+        self.sections = sections
+        self.time_signature = time_signature
+        self.meter_confidence = float(meter_confidence)
+        self.downbeat_phase = int(downbeat_phase)
+        self.beats_per_bar = int(beats_per_bar)
+        self.beat_times = np.zeros(0) if beat_times is None else np.asarray(beat_times, dtype=np.float64)
+        self.chromagram = None if chromagram is None else np.asarray(chromagram, dtype=np.float16)
+        self.beat_chroma = None if beat_chroma is None else np.asarray(beat_chroma, dtype=np.float16)
+        self.chroma_settings = chroma_settings or ChromaSettings()
+        self.instruments = instruments
+        self.instrument_scores = instrument_scores
+        self.waveform_overview = waveform_overview
+        self.waveform_pyramid = waveform_pyramid
+        self.telemetry = telemetry
+
+    @property
+    def chroma_hop_length(self):
+        return self.chroma_settings.hop_length or self.hop_length
+
+    @classmethod
+    def from_analyser(cls, analyser, spill_signal=True):
+        """
+        Copies the results out of a finished AudioAnalyser.
+
+        Once the analyser is dropped its waveform and spectrogram are freed;
+        nothing in the result refers to them.
+
+        Args:
+            analyser (AudioAnalyser): An analyser that has run the full pipeline.
+            spill_signal (bool): Keep the raw samples in a memory-mapped
+                temporary file so the waveform plot can still zoom to
+                individual samples.
+        """
+        if analyser.waveform_overview is None:
+            analyser.compute_waveform_overview()
+        if analyser.waveform_pyramid is None:
+            analyser.compute_waveform_pyramid()
+        pyramid = analyser.waveform_pyramid
+        if pyramid is not None:
+            pyramid = pyramid.compact(spill_signal=spill_signal)
+
+        return cls(
+            analyser.file_path, analyser.profile, analyser.sr, analyser.hop_length,
+            analyser.duration, analyser.bpm, analyser.key, analyser.time_signature,
+            analyser.chromagram, analyser.waveform_overview,
+            key_track=analyser.key_track,
+            chord_track=analyser.chord_track,
+            sections=analyser.sections,
+            meter_confidence=analyser.meter_confidence,
+            downbeat_phase=analyser.downbeat_phase,
+            beats_per_bar=analyser.beats_per_bar,
+            beat_times=analyser.beat_times,
+            beat_chroma=analyser.beat_chroma,
+            instruments=analyser.instruments,
+            instrument_scores=analyser.instrument_scores,
+            waveform_pyramid=pyramid,
+            telemetry=analyser.telemetry,
+            chroma_settings=analyser.chroma_settings,
+        )
+
+    def downbeat_times(self):
+        """
+        Returns the time of the first beat of every bar in seconds.
+        """
+        if self.beats_per_bar == 0:
+            return np.zeros(0)
+        return self.beat_times[self.downbeat_phase::self.beats_per_bar]
+
+    def compute_waveform_pyramid(self):
+        """
+        Builds the plotting envelopes from the overview if there are none.
+        """
+        if self.waveform_pyramid is None and self.waveform_overview is not None:
+            self.waveform_pyramid = WaveformPyramid.from_overview(self.waveform_overview, self.duration, self.sr)
+
+    @property
+    def nbytes(self):
+        """The memory held by the result's arrays."""
+        size = 0
+        for array in (self.chromagram, self.beat_chroma, self.beat_times, self.waveform_overview):
+            if array is not None:
+                size += array.nbytes
+        if self.waveform_pyramid is not None:
+            size += self.waveform_pyramid.nbytes
+        return size
+
+    def summary(self):
+        """
+        Returns the scalar analysis results as a JSON-serialisable dict.
+        """
+        return {
+            'file': self.file_path,
+            'duration': round(self.duration, 3),
+            'bpm': round(self.bpm, 2),
+            'key': self.key,
+            'time_signature': self.time_signature,
+            'instruments': ', '.join(self.instruments or []),
+        }
@@ -0,0 +1,328 @@
+import copy
+
+import librosa
+import numpy as np
+import soundfile as sf
+import soxr
+
+from analyse import AudioAnalyser
+from fingerprint import landmark_hashes, spectral_peaks
+from instruments import frame_features
+
+# Tracks at least this long are analysed block by block in the GUI
+STREAMING_MIN_DURATION = 20 * 60  # seconds
+
+# Timbre features are averaged over this many frames as they are streamed,
+# so they take less memory than the chromagram
+INSTRUMENT_POOL = 8
+
+class StreamingAnalyser(AudioAnalyser):
+    """
+    An AudioAnalyser that reads the file in fixed-size blocks.
+
+    Blocks are decoded with soundfile, downmixed, resampled by a streaming
+    resampler and framed exactly as librosa.stft(center=True) would frame the
+    whole signal. Each block updates the chromagram, onset envelope and
+    waveform overview before being discarded. No waveform or spectrogram is
+    kept, so peak memory is set by the block size instead of the track length.
+
+    Attributes:
+        block_frames (int): The number of analysis frames decoded per block.
+        progress_callback (callable): Called as progress_callback(snapshot, fraction)
+            with a copy of the partial results every update_interval seconds of audio.
+        update_interval (float): Seconds of audio between partial result updates.
+        should_stop (callable): Returns True when streaming should be abandoned.
+        copy_check (callable): Called once as copy_check(analyser) after
+            copy_check_seconds of audio, with the fingerprint of the audio
+            so far and the full duration filled in. Streaming stops if it
+            returns True, e.g. because the recording was analysed before
+            under another name, so a long copy is not decoded to the end.
+        copy_check_seconds (float): Seconds of audio fingerprinted before
+            copy_check is called.
+        copy_found (bool): Whether copy_check stopped the streaming.
+    """
+
+    def __init__(self, file_path, profile=None, n_fft=2048, hop_length=512,
+                 block_frames=1024, progress_callback=None, update_interval=30.0, should_stop=None,
+                 telemetry=None, chroma=None, copy_check=None, copy_check_seconds=120.0):
+        """
+        Initializes the StreamingAnalyser.
+
+        Args:
+            file_path (str): The full path to a file soundfile can read.
+            profile (DecodeProfile): How to decode the file. soxr resampler
+                qualities are honoured; other res_types fall back to soxr HQ.
+            n_fft (int): The FFT window size.
+            hop_length (int): The number of samples between analysis frames.
+            block_frames (int): The number of analysis frames per block.
+            progress_callback (callable): Receives partial results while streaming.
+            update_interval (float): Seconds of audio between partial updates.
+            should_stop (callable): Checked before every block; streaming is
+                abandoned as soon as it returns True.
+            copy_check (callable): Looks the partial fingerprint up once
+                copy_check_seconds have been streamed; returning True stops
+                streaming.
+            copy_check_seconds (float): Seconds of audio before copy_check.
+            telemetry (Telemetry): Collects per-stage timings and memory use.
+            chroma (ChromaSettings): Only STFT chroma at the analysis hop
+                length can be streamed.
+        """
+        super().__init__(file_path, profile=profile, n_fft=n_fft, hop_length=hop_length, telemetry=telemetry, chroma=chroma)
+        if not self.can_stream_chroma(self.chroma_settings, hop_length):
+            raise ValueError("Only STFT chroma at the analysis hop length can be streamed.")
+        self.block_frames = block_frames
+        self.instrument_frames = None
+        self.peaks = None
+        self.progress_callback = progress_callback
+        self.update_interval = update_interval
+        self.should_stop = should_stop
+        self.copy_check = copy_check
+        self.copy_check_seconds = copy_check_seconds
+        self.copy_found = False
+
+    @staticmethod
+    def can_stream_chroma(chroma, hop_length=512):
+        """
+        Returns True if chroma with these settings can be built block by block.
+        """
+        return chroma is None or (chroma.method == 'stft' and chroma.hop_length in (None, hop_length))
+
+    @staticmethod
+    def should_stream(file_path, chroma=None):
+        """
+        Returns True if the file is long enough, and readable by soundfile,
+        to be worth streaming, and its chroma settings can be streamed.
+        """
+        if not StreamingAnalyser.can_stream_chroma(chroma):
+            return False
+        try:
+            return sf.info(file_path).duration >= STREAMING_MIN_DURATION
+        except Exception:
+            return False
+
+    # Streaming dominates the run time and leaves little for later stages
+    STAGES = (
+        ('waveform', 0.95),
+        ('fingerprint', 0.95),
+        ('bpm', 0.98),
+        ('chroma', 0.98),
+        ('key', 0.99),
+        ('chords', 0.99),
+        ('meter', 1.0),
+        ('structure', 1.0),
+        ('instruments', 1.0),
+        ('overview', 1.0),
+    )
+
+    def load_audio(self):
+        """
+        Streams the features instead of loading the full waveform.
+        """
+        return self.stream_features()
+
+    def stream_features(self):
+        """
+        Streams the file once, accumulating the chromagram, onset envelope,
+        timbre features and waveform overview.
+
+        Returns:
+            bool: True if the file was read successfully; False if it could
+            not be read, streaming was stopped, or copy_check recognised it.
+        """
+        try:
+            info = sf.info(self.file_path)
+        except Exception as e:
+            print(f"Error loading file: {e}")
+            return False
+
+        profile = self.profile
+        native_sr = info.samplerate
+        self.sr = profile.sr
+        start = min(info.frames, int(profile.offset * native_sr))
+        frames = info.frames - start
+        if profile.duration is not None:
+            frames = min(frames, int(profile.duration * native_sr))
+        expected_samples = int(np.ceil(frames * self.sr / native_sr))
+        samples_per_bin = max(1, expected_samples // 4096)
+
+        resampler = None
+        if native_sr != self.sr:
+            quality = profile.res_type.upper().replace('SOXR_', '')
+            if quality not in ('QQ', 'LQ', 'MQ', 'HQ', 'VHQ'):
+                quality = 'HQ'
+            resampler = soxr.ResampleStream(native_sr, self.sr, 1, dtype='float32', quality=quality)
+
+        # Filterbanks are built once and applied to each block
+        mel_basis = librosa.filters.mel(sr=self.sr, n_fft=self.n_fft)
+        chroma_basis = None
+
+        chroma_blocks = []
+        onset_diff_blocks = []
+        instrument_blocks = []
+        peak_blocks = []
+        frames_done = 0
+        overview_blocks = []
+        prev_mel_db = None
+        pad = self.n_fft // 2
+        frame_buffer = np.zeros(pad, dtype=np.float32)  # centre padding at the start
+        overview_buffer = np.zeros(0, dtype=np.float32)
+        samples_read = 0
+        next_update = self.update_interval * self.sr
+        copy_check_at = self.copy_check_seconds * self.sr if self.copy_check is not None else None
+
+        block_size = self.block_frames * self.hop_length * max(1, round(native_sr / self.sr))
+        blocks = sf.blocks(self.file_path, blocksize=block_size, start=start, frames=frames, dtype='float32', always_2d=True)
+        for block, is_last in self._with_last(blocks):
+            if self.should_stop is not None and self.should_stop():
+                print(f"Stopped streaming {self.file_path}")
+                return False
+            self._count('bytes_decoded', block.nbytes)
+            if profile.channel is None:
+                samples = block.mean(axis=1)
+            else:
+                samples = block[:, min(profile.channel, block.shape[1] - 1)]
+            if resampler is not None:
+                samples = resampler.resample_chunk(samples, last=is_last)
+            if is_last:
+                samples = np.concatenate([samples, np.zeros(pad, dtype=np.float32)])
+                real_samples = len(samples) - pad
+            else:
+                real_samples = len(samples)
+            samples_read += real_samples
+
+            # --- Waveform overview in fixed-size bins ---
+            overview_buffer = np.concatenate([overview_buffer, samples[:real_samples]])
+            n_bins = len(overview_buffer) // samples_per_bin
+            if n_bins:
+                binned = overview_buffer[:n_bins * samples_per_bin].reshape(n_bins, samples_per_bin)
+                overview_blocks.append(np.stack([binned.min(axis=1), binned.max(axis=1)]))
+                overview_buffer = overview_buffer[n_bins * samples_per_bin:]
+
+            # --- Spectral features on every complete frame in the buffer ---
+            frame_buffer = np.concatenate([frame_buffer, samples])
+            if len(frame_buffer) < self.n_fft:
+                continue
+            n_frames = 1 + (len(frame_buffer) - self.n_fft) // self.hop_length
+            used = (n_frames - 1) * self.hop_length + self.n_fft
+            power = np.abs(librosa.stft(frame_buffer[:used], n_fft=self.n_fft, hop_length=self.hop_length, center=False))**2
+            frame_buffer = frame_buffer[n_frames * self.hop_length:]
+
+            if chroma_basis is None:
+                # Tuning is estimated from the first block and then held fixed
+                tuning = librosa.estimate_tuning(S=power, sr=self.sr, n_fft=self.n_fft)
+                chroma_basis = librosa.filters.chroma(sr=self.sr, n_fft=self.n_fft, tuning=tuning)
+            chroma_blocks.append(librosa.util.normalize(chroma_basis @ power, norm=np.inf, axis=0).astype(np.float32))
+
+            magnitude = np.sqrt(power)
+            peak_blocks.append(spectral_peaks(magnitude, self.sr, self.hop_length, frame_offset=frames_done))
+            frames_done += n_frames
+
+            mel_power = mel_basis @ power
+            features = frame_features(magnitude, mel_power, self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+            groups = np.arange(0, features.shape[1], INSTRUMENT_POOL)
+            instrument_blocks.append(np.add.reduceat(features, groups, axis=1) / np.diff(np.append(groups, features.shape[1])))
+
+            mel_db = librosa.power_to_db(mel_power, top_db=None)
+            if prev_mel_db is not None:
+                mel_db_with_prev = np.concatenate([prev_mel_db, mel_db], axis=1)
+            else:
+                mel_db_with_prev = mel_db
+            onset_diff_blocks.append(np.maximum(0.0, np.diff(mel_db_with_prev, axis=1)).mean(axis=0))
+            prev_mel_db = mel_db[:, -1:]
+
+            # A copy is recognised from the start of the recording, so the
+            # rest of it need not be decoded
+            if copy_check_at is not None and samples_read >= copy_check_at and peak_blocks and not is_last:
+                copy_check_at = None
+                self.fingerprint = landmark_hashes(*(np.concatenate(part) for part in zip(*peak_blocks)))
+                self.duration = expected_samples / self.sr
+                if self.copy_check(self):
+                    self.copy_found = True
+                    print(f"Stopped streaming {self.file_path}, a copy of an analysed recording")
+                    return False
+                self.fingerprint = None
+
+            if self.progress_callback is not None and (samples_read >= next_update or is_last):
+                next_update += self.update_interval * self.sr
+                self._finish_features(chroma_blocks, onset_diff_blocks, overview_blocks, samples_read)
+                self.progress_callback(self._snapshot(), min(1.0, samples_read / max(1, expected_samples)))
+
+        if not chroma_blocks:
+            print(f"Error loading file: {self.file_path} is too short to analyse.")
+            return False
+
+        self._finish_features(chroma_blocks, onset_diff_blocks, overview_blocks, samples_read)
+        self.instrument_frames = np.concatenate(instrument_blocks, axis=1)
+        self.peaks = tuple(np.concatenate(part) for part in zip(*peak_blocks))
+        print(f"Successfully streamed {self.file_path}")
+        return True
+
+    def compute_features(self):
+        """
+        Runs the beat tracker on the streamed onset envelope.
+
+        This must be called after stream_features().
+        """
+        if self.onset_env is None:
+            print("Audio not streamed. Please call stream_features() first.")
+            return False
+
+        if self.beat_frames is None:
+            self.tempo, self.beat_frames = librosa.beat.beat_track(onset_envelope=self.onset_env, sr=self.sr, hop_length=self.hop_length)
+        return True
+
+    def compute_fingerprint(self):
+        # The peaks are found block by block in stream_features()
+        if self.peaks is not None:
+            self.fingerprint = landmark_hashes(*self.peaks)
+
+    def extract_chromagram(self):
+        # The chromagram is accumulated block by block in stream_features()
+        pass
+
+    def instrument_features(self):
+        # The features are accumulated block by block in stream_features().
+        # Each block is median filtered on its own, which only blurs the
+        # few frames at its edges
+        return self.instrument_frames, self.sr / (self.hop_length * INSTRUMENT_POOL)
+
+    def compute_waveform_overview(self, bins=4096):
+        # The overview is accumulated block by block in stream_features()
+        pass
+
+    def _finish_features(self, chroma_blocks, onset_diff_blocks, overview_blocks, samples_read):
+        self.chromagram = np.concatenate(chroma_blocks, axis=1)
+
+        # Match librosa.onset.onset_strength, which pads the envelope by the
+        # lag plus half a window so each value lines up with its frame
+        n_frames = self.chromagram.shape[1]
+        lead = 1 + self.n_fft // (2 * self.hop_length)
+        onset_env = np.concatenate([np.zeros(lead, dtype=np.float32)] + onset_diff_blocks)
+        self.onset_env = onset_env[:n_frames]
+
+        if overview_blocks:
+            self.waveform_overview = np.concatenate(overview_blocks, axis=1).astype(np.float32)
+        self.duration = samples_read / self.sr
+
+    def _snapshot(self):
+        # The copy shares the arrays just built by _finish_features, which are
+        # replaced rather than modified in place, so it is safe to hand off
+        snapshot = copy.copy(self)
+        snapshot.progress_callback = None
+        if len(self.onset_env) > 0:
+            snapshot.bpm = float(librosa.feature.tempo(onset_envelope=self.onset_env, sr=self.sr, hop_length=self.hop_length)[0])
+        snapshot.key = self.estimate_key(self.chromagram)
+        return snapshot
+
+    @staticmethod
+    def _with_last(iterable):
+        # Yields (item, is_last) pairs so the final block can flush the resampler
+        iterator = iter(iterable)
+        try:
+            previous = next(iterator)
+        except StopIteration:
+            return
+        for item in iterator:
+            yield previous, False
+            previous = item
+        yield previous, True
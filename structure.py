@@ -0,0 +1,163 @@
+import string
+
+import librosa
+import numpy as np
+
+def banded_similarity(features, width):
+    """
+    Computes the cosine self-similarity of every column with the next few.
+
+    Only the band around the diagonal of the self-similarity matrix is
+    kept, one lag at a time, so memory grows with the number of columns
+    rather than its square: an hour at one column per beat is a few hundred
+    kB where the full matrix would be hundreds of MB.
+
+    Args:
+        features (np.ndarray): A (d, n) feature matrix.
+        width (int): The largest lag, in columns.
+
+    Returns:
+        np.ndarray: A (width + 1, n) array where band[lag, i] is the
+        similarity of columns i and i + lag, or 0 past the end.
+    """
+    norms = np.linalg.norm(features, axis=0)
+    unit = features / np.maximum(norms, 1e-10)
+    n = unit.shape[1]
+    band = np.zeros((width + 1, n), dtype=np.float32)
+    for lag in range(min(width, n - 1) + 1):
+        band[lag, :n - lag] = np.einsum('ij,ij->j', unit[:, :n - lag], unit[:, lag:])
+    return band
+
+def novelty_curve(features, kernel_size):
+    """
+    Slides a checkerboard kernel along the diagonal of the self-similarity
+    matrix of the features (Foote, 2000).
+
+    The curve peaks where the columns before a point are similar to each
+    other and to the columns after it less so, i.e. at section changes.
+    Only the band of the matrix the kernel covers is computed. The features
+    are mirrored at both ends so the edges of the track are not mistaken
+    for changes.
+
+    Args:
+        features (np.ndarray): A (d, n) feature matrix.
+        kernel_size (int): The width of the kernel in columns; even.
+
+    Returns:
+        np.ndarray: The novelty of every column, scaled to a peak of 1.
+    """
+    n = features.shape[1]
+    half = kernel_size // 2
+    band = banded_similarity(np.pad(features, ((0, 0), (half, half)), mode='reflect'), kernel_size)
+
+    offsets = np.arange(-half, half)
+    # A Gaussian-tapered checkerboard: +1 within a side, -1 across
+    taper = np.exp(-0.5 * ((offsets + 0.5) / (0.5 * half)) ** 2)
+    sign = np.where(offsets < 0, -1.0, 1.0)
+
+    novelty = np.zeros(n)
+    for a in range(kernel_size):
+        for b in range(a, kernel_size):
+            lag = b - a
+            weight = sign[a] * sign[b] * taper[a] * taper[b] * (1 if lag == 0 else 2)
+            # S(i + offsets[a], i + offsets[b]) for every column i
+            novelty += weight * band[lag, a:a + n]
+    novelty = np.maximum(novelty, 0.0)
+    peak = novelty.max()
+    return novelty / peak if peak > 0 else novelty
+
+def label_segments(features, starts, threshold=0.15):
+    """
+    Groups segments that sound alike under the same letter.
+
+    Each segment is summarised by its mean and standard deviation, and
+    segments are merged by average-linkage clustering on cosine distance,
+    which only needs a matrix over the segments, not the columns. Silent
+    segments are grouped together.
+
+    Args:
+        features (np.ndarray): A (d, n) feature matrix.
+        starts (np.ndarray): The first column of every segment, ascending
+            and starting at 0.
+        threshold (float): The largest cosine distance between segments
+            that are given the same letter.
+
+    Returns:
+        list[str]: One letter per segment, 'A' for the first group heard,
+        'B' for the second and so on.
+    """
+    if len(starts) == 1:
+        return ['A']
+    # scipy is imported here rather than at the top, as loading it takes
+    # about a second and would otherwise be paid at every startup
+    from scipy.cluster.hierarchy import fcluster, linkage
+
+    counts = np.diff(np.append(starts, features.shape[1]))[:, None]
+    means = np.add.reduceat(features, starts, axis=1).T / counts
+    spreads = np.sqrt(np.maximum(np.add.reduceat(features ** 2, starts, axis=1).T / counts - means ** 2, 0.0))
+    summaries = np.hstack([means, spreads])
+
+    # Silent segments have no direction to compare, so they share a group
+    # of their own rather than giving NaN cosine distances
+    silent = np.linalg.norm(summaries, axis=1) < 1e-6
+    clusters = np.zeros(len(starts), dtype=int)
+    if (~silent).sum() > 1:
+        clusters[~silent] = fcluster(linkage(summaries[~silent], method='average', metric='cosine'), threshold, criterion='distance')
+    else:
+        clusters[~silent] = 1
+
+    # Letters in order of first appearance
+    letters = {}
+    for cluster in clusters:
+        letters.setdefault(cluster, string.ascii_uppercase[len(letters) % 26])
+    return [letters[cluster] for cluster in clusters]
+
+def segment_structure(chroma_vectors, column_seconds, kernel_size=32, min_section=16, embedding=4):
+    """
+    Splits a track into sections and labels the repeated ones alike.
+
+    Section boundaries are peaks of a checkerboard novelty curve along the
+    self-similarity of time-delay embedded chroma, and sections are grouped
+    by clustering their chroma statistics. Adjacent sections with the same
+    label are merged. A first or last section whose label does not recur
+    is called 'Intro' or 'Outro'.
+
+    Args:
+        chroma_vectors (np.ndarray): A (12, n) chromagram with evenly
+            spaced columns, ideally about one per beat.
+        column_seconds (float): The time between columns.
+        kernel_size (int): The novelty kernel width in columns; 32 beats
+            compares the four bars either side of each point.
+        min_section (int): The fewest columns between two boundaries.
+        embedding (int): The number of consecutive columns stacked into
+            each feature, so chord sequences rather than single chords are
+            compared.
+
+    Returns:
+        tuple: (start_times, labels), one entry per section, like
+        AudioAnalyser.estimate_key_track().
+    """
+    n_columns = chroma_vectors.shape[1]
+    if n_columns < 2 * min_section:
+        return np.zeros(1), ['A']
+    kernel_size = min(kernel_size, n_columns // 2 * 2)
+
+    from scipy.signal import find_peaks
+
+    features = librosa.feature.stack_memory(np.asarray(chroma_vectors, dtype=np.float32), n_steps=embedding, mode='edge')
+    novelty = novelty_curve(features, kernel_size)
+    peaks, _ = find_peaks(novelty, distance=min_section, prominence=0.1)
+    peaks = peaks[(peaks >= min_section) & (peaks <= n_columns - min_section)]
+    starts = np.concatenate([[0], peaks]).astype(int)
+
+    labels = label_segments(features, starts)
+    keep = [0] + [i for i in range(1, len(starts)) if labels[i] != labels[i - 1]]
+    starts = starts[keep]
+    labels = [labels[i] for i in keep]
+
+    if len(labels) > 2:
+        if labels.count(labels[0]) == 1:
+            labels[0] = 'Intro'
+        if labels.count(labels[-1]) == 1:
+            labels[-1] = 'Outro'
+    return starts * column_seconds, labels
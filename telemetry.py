@@ -0,0 +1,227 @@
+import cProfile
+import contextlib
+import io
+import json
+import logging
+import pstats
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('music_analyser.telemetry')
+
+def peak_rss_mb():
+    """
+    Returns the process's resident memory high-water mark in MB, or None if
+    the platform does not report it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but bytes on macOS
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+class Telemetry:
+    """
+    Collects structured timing and memory telemetry for one analysis run.
+
+    Each stage records its wall time, the CPU time of the thread running it,
+    the process's memory high-water mark and, optionally, the peak memory
+    traced by tracemalloc. Stages can attach extra details such as array
+    shapes, and counters accumulate values like the number of bytes decoded.
+    Every record is passed to the observers as a flat dict as soon as it is
+    made, and a cProfile capture of the whole run can be switched on.
+
+    Attributes:
+        observers (list[callable]): Called with each event dict.
+        stages (list[dict]): The stage records of the current run.
+        counters (dict): Accumulated counter values of the current run.
+        profile (bool): Whether runs are captured with cProfile.
+        trace_memory (bool): Whether stages record tracemalloc peaks.
+    """
+
+    def __init__(self, observers=None, profile=False, trace_memory=False):
+        """
+        Args:
+            observers (list[callable]): Callbacks receiving every event dict.
+            profile (bool): Capture each run with cProfile.
+            trace_memory (bool): Record tracemalloc peaks per stage. This
+                slows down allocation-heavy stages a little.
+        """
+        self.observers = list(observers or [])
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.file_path = None
+        self.stages = []
+        self.counters = {}
+        self._profiler = None
+        self._run_start = None
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def start_run(self, file_path):
+        """
+        Resets the collected telemetry and starts timing a new run.
+        """
+        self.file_path = file_path
+        self.stages = []
+        self.counters = {}
+        self._run_start = (time.perf_counter(), time.thread_time())
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._emit({'event': 'run_start'})
+
+    def end_run(self):
+        """
+        Stops timing the run and emits its summary.
+        """
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._run_start is None:
+            return
+        self._emit({'event': 'run_end', **self.summary(include_stages=False)})
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Times the code inside the with block as a pipeline stage.
+
+        Yields the stage's record, so the block can add details to it,
+        e.g. record['samples'] = len(y).
+        """
+        record = {'stage': name}
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            traced_start, _ = tracemalloc.get_traced_memory()
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall_start, 6)
+            record['cpu_s'] = round(time.thread_time() - cpu_start, 6)
+            record['peak_rss_mb'] = peak_rss_mb()
+            if self.trace_memory and tracemalloc.is_tracing():
+                _, traced_peak = tracemalloc.get_traced_memory()
+                record['traced_peak_mb'] = round((traced_peak - traced_start) / 2**20, 2)
+            self.stages.append(record)
+            self._emit({'event': 'stage', **record})
+
+    def count(self, name, value):
+        """
+        Adds a value to a named counter, e.g. count('bytes_decoded', y.nbytes).
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self, include_stages=True):
+        """
+        Returns the run's telemetry as a JSON-serialisable dict.
+        """
+        summary = {
+            'file': self.file_path,
+            'total_wall_s': round(sum(s['wall_s'] for s in self.stages), 6),
+            'total_cpu_s': round(sum(s['cpu_s'] for s in self.stages), 6),
+            'peak_rss_mb': peak_rss_mb(),
+            'counters': dict(self.counters),
+        }
+        if include_stages:
+            summary['stages'] = list(self.stages)
+        return summary
+
+    def format_breakdown(self):
+        """
+        Returns the stage timings of the current run as readable text.
+        """
+        summary = self.summary()
+        lines = [f"Analysed in {summary['total_wall_s']:.2f}s "
+                 f"({summary['total_cpu_s']:.2f}s CPU, peak {summary['peak_rss_mb']} MB)"]
+        for record in self.stages:
+            lines.append(f"{record['stage']:<10} {record['wall_s']:7.3f}s")
+        return "\n".join(lines)
+
+    def profile_stats(self, limit=25, sort='cumulative'):
+        """
+        Returns the cProfile report of the last run as text, or None if
+        profiling was off.
+        """
+        if self._profiler is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def dump_profile(self, path):
+        """
+        Saves the cProfile data of the last run for tools such as snakeviz.
+        """
+        if self._profiler is not None:
+            self._profiler.dump_stats(path)
+
+    def _emit(self, event):
+        event = {'file': self.file_path, 'time': round(time.time(), 3), **event}
+        for observer in self.observers:
+            observer(event)
+
+def log_observer(event):
+    """
+    An observer that writes each event as one JSON object to the
+    'music_analyser.telemetry' logger.
+    """
+    logger.info(json.dumps(event))
+
+class TelemetryAggregator:
+    """
+    Aggregates stage timings across many runs, e.g. a batch analysis.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self._stages = {}
+        self._counters = {}
+
+    def add(self, summary):
+        """
+        Adds one run's Telemetry.summary().
+        """
+        self.runs += 1
+        for record in summary.get('stages', []):
+            self._stages.setdefault(record['stage'], []).append(record['wall_s'])
+        for name, value in summary.get('counters', {}).items():
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def report(self):
+        """
+        Returns per-stage totals, means and 95th percentiles, hottest first.
+        """
+        total = sum(sum(times) for times in self._stages.values()) or 1.0
+        rows = []
+        for stage, times in self._stages.items():
+            ordered = sorted(times)
+            rows.append({
+                'stage': stage,
+                'runs': len(times),
+                'total_s': round(sum(times), 3),
+                'mean_s': round(sum(times) / len(times), 4),
+                'p95_s': round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 4),
+                'share': round(sum(times) / total, 3),
+            })
+        rows.sort(key=lambda row: row['total_s'], reverse=True)
+        return {'runs': self.runs, 'stages': rows, 'counters': dict(self._counters)}
+
+    def format_report(self):
+        report = self.report()
+        lines = [f"Stage timings over {report['runs']} runs:"]
+        for row in report['stages']:
+            lines.append(f"  {row['stage']:<10} total {row['total_s']:9.2f}s  mean {row['mean_s']:8.3f}s  "
+                         f"p95 {row['p95_s']:8.3f}s  {row['share']:6.1%}")
+        for name, value in report['counters'].items():
+            lines.append(f"  {name}: {value}")
+        return "\n".join(lines)
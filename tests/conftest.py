@@ -0,0 +1,27 @@
+import pytest
+
+import benchmark
+from analyse import AudioAnalyser
+from results import AnalysisResult
+
+@pytest.fixture(scope='session')
+def synthetic_track(tmp_path_factory):
+    """
+    A 20 s benchmark fixture in C major at 120 BPM in 4/4, with its ground truth.
+    """
+    path = tmp_path_factory.mktemp('audio') / 'c_major_120_4.wav'
+    truth = benchmark.write_fixture(str(path), benchmark.FIXTURES[0], 20)
+    return str(path), truth
+
+@pytest.fixture(scope='session')
+def analysed_track(synthetic_track):
+    """
+    The fully analysed synthetic track, as an AudioAnalyser.
+    """
+    analyser = AudioAnalyser(synthetic_track[0])
+    assert analyser.analyse()
+    return analyser
+
+@pytest.fixture
+def analysed_result(analysed_track):
+    return AnalysisResult.from_analyser(analysed_track, spill_signal=False)
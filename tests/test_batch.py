@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+
+import batch
+
+def test_read_completed_skips_errors_and_truncated_lines(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    output.write_text(
+        json.dumps({'file': '/music/a.wav', 'error': None}) + '\n'
+        + json.dumps({'file': '/music/b.wav', 'error': 'ValueError: Could not load the audio file.'}) + '\n'
+        + json.dumps({'file': '/music/c.wav', 'error': None}) + '\n'
+        + '{"file": "/music/d.wav", "er'
+    )
+    assert batch.read_completed(str(output), 'jsonl') == {'/music/a.wav', '/music/c.wav'}
+    assert batch.read_completed(str(tmp_path / 'missing.jsonl'), 'jsonl') == set()
+
+def test_csv_results_round_trip(tmp_path):
+    output = str(tmp_path / 'results.csv')
+    writer = batch.ResultWriter(output, 'csv')
+    writer.write({'file': '/music/a.wav', 'bpm': 120.0, 'error': None})
+    writer.write({'file': '/music/b.wav', 'error': 'ValueError: Could not load the audio file.'})
+    writer.close()
+    # Appending to an existing file does not repeat the header
+    writer = batch.ResultWriter(output, 'csv')
+    writer.write({'file': '/music/c.wav', 'bpm': 96.0, 'error': None, 'telemetry': {}})
+    writer.close()
+
+    with open(output) as f:
+        assert sum(line.startswith('file,') for line in f) == 1
+    assert batch.read_completed(output, 'csv') == {'/music/a.wav', '/music/c.wav'}
+
+def test_find_audio_files(tmp_path):
+    (tmp_path / 'album').mkdir()
+    for name in ('album/b.WAV', 'album/a.mp3', 'notes.txt', 'c.flac'):
+        (tmp_path / name).write_bytes(b'')
+    files = batch.find_audio_files([str(tmp_path)])
+    assert files == sorted(str(tmp_path / name) for name in ('album/b.WAV', 'album/a.mp3', 'c.flac'))
+    assert batch.find_audio_files([str(tmp_path / '*.flac')]) == [str(tmp_path / 'c.flac')]
+
+def test_resumes_after_failures(tmp_path, synthetic_track, capsys):
+    music = tmp_path / 'music'
+    music.mkdir()
+    track = str(music / 'track.wav')
+    shutil.copy(synthetic_track[0], track)
+    broken = music / 'broken.wav'
+    broken.write_bytes(b'not audio')
+    output = str(tmp_path / 'results.jsonl')
+    argv = [str(music), '-o', output, '--workers', '1', '--no-cache']
+
+    assert batch.main(argv) == 1
+    with open(output) as f:
+        records = {record['file']: record for record in map(json.loads, f)}
+    assert records[track]['error'] is None
+    assert records[track]['key'] == synthetic_track[1]['key']
+    assert records[str(broken)]['error']
+    capsys.readouterr()
+
+    # Only the failed file is tried again
+    with open(output, 'a') as f:
+        f.write('{"file": "' + track)
+    assert batch.main(argv) == 1
+    assert 'Found 2 audio files, 1 already analysed.' in capsys.readouterr().err
+    with open(output) as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[-1])['file'] == str(broken)
+
+    os.remove(broken)
+    assert batch.main(argv) == 0
+    assert 'Found 1 audio files, 1 already analysed.' in capsys.readouterr().err
+
+    assert batch.main(argv + ['--restart']) == 0
+    with open(output) as f:
+        assert [json.loads(line)['file'] for line in f] == [track]
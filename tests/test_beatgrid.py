@@ -0,0 +1,86 @@
+import json
+import os
+import xml.etree.ElementTree as ET
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from beatgrid import beat_table, export, rekordbox_tonality, tempo_markers, write_rekordbox_xml
+
+def steady_result(file_path, bpm=120.0, beats=32, beats_per_bar=4, downbeat_phase=1, jitter=0.0):
+    rng = np.random.default_rng(0)
+    beat_times = 0.25 + np.arange(beats) * 60.0 / bpm + jitter * rng.standard_normal(beats)
+    return SimpleNamespace(
+        file_path=file_path, beat_times=beat_times, beats_per_bar=beats_per_bar, downbeat_phase=downbeat_phase,
+        bpm=bpm, duration=float(beat_times[-1] + 1.0), key='A Minor', time_signature=f"{beats_per_bar}/4",
+    )
+
+def test_steady_grid_is_one_marker():
+    result = steady_result('track.wav', jitter=0.005)
+    markers = tempo_markers(result.beat_times, result.beats_per_bar, result.downbeat_phase)
+    assert len(markers) == 1
+    time, bpm, beat_in_bar = markers[0]
+    assert time == pytest.approx(0.25, abs=0.01)
+    assert bpm == pytest.approx(120.0, abs=0.5)
+    # The first beat is the last of a pickup bar
+    assert beat_in_bar == 4
+
+def test_changing_tempo_gets_a_marker_per_bar():
+    # Two bars at 100 BPM, then two at 140 BPM
+    beat_times = np.concatenate([np.arange(8) * 0.6, 4.8 + np.arange(8) * 60.0 / 140])
+    markers = tempo_markers(beat_times, 4, 0)
+    assert [time for time, _, _ in markers] == pytest.approx(beat_times[[0, 4, 8, 12]])
+    assert [bpm for _, bpm, _ in markers] == pytest.approx([100, 100, 140, 140], abs=1.0)
+    assert [beat for _, _, beat in markers] == [1, 1, 1, 1]
+
+def test_beat_table_counts_bars_from_first_downbeat():
+    rows = beat_table(steady_result('track.wav', beats=6, beats_per_bar=4, downbeat_phase=1))
+    assert [(row['bar'], row['beat_in_bar']) for row in rows] == [(0, 4), (1, 1), (1, 2), (1, 3), (1, 4), (2, 1)]
+
+def test_rekordbox_tonality():
+    assert rekordbox_tonality('A Minor') == 'Am'
+    assert rekordbox_tonality('F# Major') == 'F#'
+    assert rekordbox_tonality('N/A') == ''
+
+def test_rekordbox_xml(tmp_path):
+    results = [steady_result(str(tmp_path / 'my track.wav')), steady_result(str(tmp_path / 'waltz.wav'), bpm=90.0,
+                                                                           beats_per_bar=3, downbeat_phase=0)]
+    path = str(tmp_path / 'collection.xml')
+    write_rekordbox_xml(results, path)
+
+    root = ET.parse(path).getroot()
+    assert root.tag == 'DJ_PLAYLISTS'
+    collection = root.find('COLLECTION')
+    assert collection.get('Entries') == '2'
+    tracks = collection.findall('TRACK')
+    assert [track.get('Name') for track in tracks] == ['my track', 'waltz']
+    assert tracks[0].get('Location') == 'file://localhost' + str(tmp_path / 'my%20track.wav')
+    assert tracks[0].get('AverageBpm') == '120.00'
+    assert tracks[0].get('Tonality') == 'Am'
+    assert tracks[0].get('TotalTime') == str(int(round(results[0].duration)))
+
+    tempos = [track.findall('TEMPO') for track in tracks]
+    assert [tempo.attrib for tempo in tempos[0]] == [{'Inizio': '0.250', 'Bpm': '120.00', 'Metro': '4/4', 'Battito': '4'}]
+    assert [tempo.attrib for tempo in tempos[1]] == [{'Inizio': '0.250', 'Bpm': '90.00', 'Metro': '3/4', 'Battito': '1'}]
+
+def test_export_infers_format(tmp_path, analysed_result, synthetic_track):
+    for name in ('grid.xml', 'grid.csv', 'grid.json'):
+        export([analysed_result], str(tmp_path / name))
+        assert os.path.getsize(tmp_path / name) > 0
+
+    with open(tmp_path / 'grid.json') as f:
+        track = json.load(f)[0]
+    assert track['beats_per_bar'] == analysed_result.beats_per_bar
+    assert len(track['beats']) == len(analysed_result.beat_times)
+    assert len(track['downbeats']) == len(analysed_result.downbeat_times())
+    # The fitted grid is closer to the true tempo than the beat tracker's estimate
+    assert track['tempo_markers'][0]['bpm'] == pytest.approx(synthetic_track[1]['bpm'], abs=0.5)
+
+def test_beat_chroma_has_a_column_per_beat(analysed_track):
+    n_beats = len(analysed_track.beat_times)
+    assert analysed_track.beat_chroma.shape == (12, n_beats + 1)
+    times = analysed_track.beat_chroma_times()
+    assert len(times) == n_beats + 1
+    assert times[0] == 0
+    np.testing.assert_allclose(times[1:], analysed_track.beat_times, atol=analysed_track.chroma_hop_length / analysed_track.sr)
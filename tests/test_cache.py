@@ -0,0 +1,71 @@
+import os
+import shutil
+
+import numpy as np
+
+from analyse import DecodeProfile
+from cache import AnalysisCache
+from chroma import ChromaSettings
+
+def test_key_follows_content_and_parameters(tmp_path, synthetic_track):
+    cache = AnalysisCache(str(tmp_path / 'cache'))
+    path = synthetic_track[0]
+    renamed = str(tmp_path / 'renamed.wav')
+    shutil.copy(path, renamed)
+
+    key = cache.make_key(path, DecodeProfile(), 512)
+    assert cache.make_key(renamed, DecodeProfile(), 512) == key
+    assert cache.make_key(path, DecodeProfile.fast_preview(), 512) != key
+    assert cache.make_key(path, DecodeProfile(), 256) != key
+    assert cache.make_key(path, DecodeProfile(), 512, ChromaSettings('cqt')) != key
+    assert cache.make_key(path, DecodeProfile(), 512, content_hash='0' * 40) != key
+
+    with open(renamed, 'ab') as f:
+        f.write(b'\0')
+    assert cache.make_key(renamed, DecodeProfile(), 512) != key
+
+def test_store_and_load_round_trip(tmp_path, analysed_result):
+    cache = AnalysisCache(str(tmp_path / 'cache'))
+    assert cache.load(analysed_result.file_path) is None
+    cache.store(analysed_result)
+
+    loaded = cache.load(analysed_result.file_path)
+    assert loaded is not None
+    assert loaded.bpm == analysed_result.bpm
+    assert loaded.key == analysed_result.key
+    assert loaded.time_signature == analysed_result.time_signature
+    assert loaded.chromagram.shape == analysed_result.chromagram.shape
+    np.testing.assert_allclose(loaded.beat_times, analysed_result.beat_times)
+    for track in ('key_track', 'chord_track', 'sections'):
+        times, labels = getattr(loaded, track)
+        expected_times, expected_labels = getattr(analysed_result, track)
+        np.testing.assert_allclose(times, expected_times)
+        assert labels == list(expected_labels)
+
+def test_eviction_drops_least_recently_used(tmp_path, analysed_result):
+    cache = AnalysisCache(str(tmp_path / 'cache'))
+    cache.store(analysed_result)
+    entry_size = sum(
+        os.path.getsize(os.path.join(cache.cache_dir, name))
+        for name in os.listdir(cache.cache_dir) if name.endswith('.npz')
+    )
+
+    # Two more entries of the same size under other hop lengths, oldest first
+    entries = []
+    for i, hop_length in enumerate((512, 256, 1024)):
+        analysed_result.hop_length = hop_length
+        cache.store(analysed_result)
+        entry = cache._entry_path(cache.make_key(analysed_result.file_path, analysed_result.profile, hop_length,
+                                                 analysed_result.chroma_settings))
+        os.utime(entry, (1000 + i, 1000 + i))
+        entries.append(entry)
+
+    # Loading the oldest marks it as recently used, so the second is evicted
+    # in its place
+    assert cache.load(analysed_result.file_path, hop_length=512) is not None
+    cache.max_bytes = int(2.5 * entry_size)
+    cache.evict()
+    assert [os.path.exists(entry) for entry in entries] == [True, False, True]
+    cache.max_bytes = int(1.5 * entry_size)
+    cache.evict()
+    assert [os.path.exists(entry) for entry in entries] == [True, False, False]
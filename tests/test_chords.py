@@ -0,0 +1,49 @@
+import numpy as np
+
+from chords import CHORD_LABELS, CHORD_TEMPLATES, NO_CHORD, chord_scores, recognise_chords
+
+def template_columns(labels, columns_each, seed=0):
+    # Each chord's template held for a number of columns, with a little noise
+    rng = np.random.default_rng(seed)
+    blocks = [np.repeat(CHORD_TEMPLATES[CHORD_LABELS.index(label)][:, None], columns_each, axis=1)
+              for label in labels]
+    chroma = np.concatenate(blocks, axis=1)
+    return np.abs(chroma + 0.05 * rng.standard_normal(chroma.shape))
+
+def test_templates_score_their_own_label():
+    scores = chord_scores(CHORD_TEMPLATES.T)
+    assert scores.shape == (len(CHORD_LABELS), len(CHORD_LABELS))
+    np.testing.assert_array_equal(np.argmax(scores, axis=0), np.arange(len(CHORD_LABELS)))
+
+def test_decodes_chord_sequence():
+    chroma = template_columns(['C', 'Am', 'F', 'G7'], 8)
+    times = np.arange(chroma.shape[1]) * 0.5
+    start_times, labels = recognise_chords(chroma, times, duration=16.0)
+    assert labels == ['C', 'Am', 'F', 'G7']
+    np.testing.assert_allclose(start_times, [0.0, 4.0, 8.0, 12.0])
+
+def test_single_noisy_column_does_not_flip_label():
+    # A passing D in place of the E makes the column look like another chord on its own
+    chroma = template_columns(['C'], 16)
+    chroma[2, 8] += 1.0
+    chroma[4, 8] = 0.0
+    assert CHORD_LABELS[int(np.argmax(chord_scores(chroma[:, 8:9])))] != 'C'
+    _, labels = recognise_chords(chroma, np.arange(16) * 0.5, duration=8.0)
+    assert labels == ['C']
+
+def test_silent_columns_are_no_chord():
+    chroma = np.zeros((12, 40))
+    chroma[:, 10:30] = template_columns(['C'], 20)
+    start_times, labels = recognise_chords(chroma, np.arange(40) * 0.5, duration=20.0)
+    assert labels == [NO_CHORD, 'C', NO_CHORD]
+    np.testing.assert_allclose(start_times, [0.0, 5.0, 15.0])
+
+def test_all_silent_is_no_chord():
+    start_times, labels = recognise_chords(np.zeros((12, 10)), np.arange(10), duration=10.0)
+    assert labels == [NO_CHORD]
+    np.testing.assert_allclose(start_times, [0.0])
+
+def test_empty_chromagram():
+    start_times, labels = recognise_chords(np.zeros((12, 0)), np.zeros(0), duration=0.0)
+    assert len(start_times) == 0
+    assert labels == []
@@ -0,0 +1,115 @@
+import librosa
+import numpy as np
+import soundfile as sf
+
+from analyse import AudioAnalyser
+from cache import AnalysisCache
+from fingerprint import FingerprintIndex, find_analysed_copy, landmark_hashes, spectral_peaks
+from results import AnalysisResult
+
+SR = 22050
+HOP_LENGTH = 512
+
+def melody(seed, seconds=20.0):
+    # A random sequence of quarter-second notes with two harmonics each
+    rng = np.random.default_rng(seed)
+    note_samples = SR // 4
+    t = np.arange(note_samples) / SR
+    envelope = np.minimum(1.0, 20 * t) * np.exp(-3 * t)
+    notes = []
+    for midi in rng.integers(48, 84, int(seconds * 4)):
+        f0 = librosa.midi_to_hz(midi)
+        notes.append(envelope * (np.sin(2 * np.pi * f0 * t) + 0.5 * np.sin(4 * np.pi * f0 * t)))
+    return 0.3 * np.concatenate(notes)
+
+def fingerprint(y):
+    magnitude = np.abs(librosa.stft(y.astype(np.float32), n_fft=2048, hop_length=HOP_LENGTH))
+    return landmark_hashes(*spectral_peaks(magnitude, SR, HOP_LENGTH))
+
+def noisy_copy(y, shift_frames, seed):
+    # Quieter, with a little noise, and starting later in the file
+    rng = np.random.default_rng(seed)
+    shifted = np.concatenate([np.zeros(shift_frames * HOP_LENGTH), 0.7 * y])
+    return shifted + 0.005 * rng.standard_normal(len(shifted))
+
+def test_hashes_do_not_depend_on_position():
+    y = melody(0)
+    hashes, offsets = fingerprint(y)
+    shifted_hashes, shifted_offsets = fingerprint(np.concatenate([np.zeros(40 * HOP_LENGTH), y]))
+    assert len(hashes) > 100
+    shared, first, second = np.intersect1d(hashes, shifted_hashes, return_indices=True)
+    assert len(shared) > 0.8 * len(np.unique(hashes))
+    assert np.median(shifted_offsets[second] - offsets[first]) == 40
+
+def test_duplicates_pairs_copies_only():
+    original = melody(0)
+    index = FingerprintIndex(':memory:')
+    index.add('original.wav', 'a', 20.0, fingerprint(original))
+    index.add('copy.mp3', 'b', 21.0, fingerprint(noisy_copy(original, 40, seed=1)))
+    index.add('other.wav', 'c', 20.0, fingerprint(melody(2)))
+
+    duplicates = index.duplicates()
+    assert len(duplicates) == 1
+    pair = duplicates[0]
+    assert {pair['file'], pair['duplicate']} == {index.get('original.wav')['file'], index.get('copy.mp3')['file']}
+    assert abs(pair['offset']) == 40
+    assert pair['score'] >= 0.1
+
+def test_identify_finds_the_original():
+    original = melody(0)
+    index = FingerprintIndex(':memory:')
+    index.add('original.wav', 'a', 20.0, fingerprint(original))
+    index.add('other.wav', 'c', 20.0, fingerprint(melody(2)))
+
+    query = fingerprint(noisy_copy(original, 40, seed=1))
+    match = index.identify(query)
+    assert match['file'] == index.get('original.wav')['file']
+    assert match['content'] == 'a'
+    assert match['offset'] == -40
+    assert index.identify(query, exclude='original.wav') is None
+    assert index.identify(fingerprint(melody(3))) is None
+
+def test_identical_contents_always_pair():
+    index = FingerprintIndex(':memory:')
+    index.add('a.wav', 'same', 20.0, None)
+    index.add('b.wav', 'same', 20.0, None)
+    index.add('c.wav', 'other', 20.0, None)
+    duplicates = index.duplicates()
+    assert len(duplicates) == 1
+    assert duplicates[0]['score'] == 1.0
+    assert {duplicates[0]['file'], duplicates[0]['duplicate']} == {index.get('a.wav')['file'], index.get('b.wav')['file']}
+
+def test_replacing_a_recording():
+    index = FingerprintIndex(':memory:')
+    index.add('a.wav', 'first', 20.0, fingerprint(melody(0)))
+    hashes = index.get('a.wav')['hashes']
+    index.add('a.wav', 'first', 20.0, None)
+    assert index.get('a.wav')['hashes'] == hashes
+
+    index.add('a.wav', 'second', 20.0, fingerprint(melody(2)))
+    assert len(index) == 1
+    assert index.get('a.wav')['content'] == 'second'
+    assert index.prune() == hashes
+
+def test_finds_analysed_copy(tmp_path, analysed_track):
+    cache = AnalysisCache(str(tmp_path / 'cache'))
+    index = FingerprintIndex(str(tmp_path / 'fingerprints.db'))
+    content = cache.file_hash(analysed_track.file_path)
+    cache.store(AnalysisResult.from_analyser(analysed_track, spill_signal=False), content)
+    index.add(analysed_track.file_path, content, analysed_track.duration, analysed_track.fingerprint)
+
+    y, sr = sf.read(analysed_track.file_path)
+    copy_path = str(tmp_path / 'copy.flac')
+    sf.write(copy_path, 0.8 * y, sr)
+    copy = AudioAnalyser(copy_path)
+    copy.load_audio()
+    copy.compute_fingerprint()
+
+    result, match = find_analysed_copy(copy, cache, index)
+    assert match['file'] == analysed_track.file_path
+    assert result.file_path == copy_path
+    assert result.key == analysed_track.key
+    assert result.time_signature == analysed_track.time_signature
+    # Nothing is written to the index
+    assert len(index) == 1
+    index.close()
@@ -0,0 +1,30 @@
+import json
+
+import numpy as np
+
+from instruments import DEFAULT_MODEL_PATH, FEATURE_NAMES, SHARES, InstrumentTagger, frame_features, segment_features
+
+def test_bundled_model_matches_feature_names():
+    with open(DEFAULT_MODEL_PATH) as f:
+        model = json.load(f)
+    assert model['features'] == FEATURE_NAMES
+    n_features = len(FEATURE_NAMES)
+    assert len(model['mean']) == len(model['scale']) == len(model['weights']) == n_features
+    assert all(len(row) == len(model['classes']) for row in model['weights'])
+    # Every feature the analysis computes is read by at least one class
+    assert np.all(np.abs(np.asarray(model['weights'])).sum(axis=1) > 0)
+
+def test_frame_features_have_one_row_per_model_input():
+    import librosa
+
+    sr = 22050
+    t = np.arange(2 * sr) / sr
+    y = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    magnitude = np.abs(librosa.stft(y))
+    mel_power = librosa.feature.melspectrogram(S=magnitude ** 2, sr=sr)
+
+    features = frame_features(magnitude, mel_power, sr)
+    assert features.shape == (len(FEATURE_NAMES) + len(SHARES), magnitude.shape[1])
+    segments = segment_features(features, 20)
+    assert segments.shape[1] == len(FEATURE_NAMES)
+    assert InstrumentTagger().predict(segments).shape == (len(segments), 4)
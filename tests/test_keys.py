@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from analyse import KEY_NAMES, MAJOR_PROFILE, MINOR_PROFILE, score_keys
+
+@pytest.mark.parametrize('root', range(12))
+def test_rotated_profiles_score_their_own_key(root):
+    for mode, profile in (('Major', MAJOR_PROFILE), ('Minor', MINOR_PROFILE)):
+        chroma = np.roll(profile, root)
+        scores = score_keys(chroma)
+        assert scores.shape == (24,)
+        assert KEY_NAMES[int(np.argmax(scores))] == KEY_NAMES[2 * root + (mode == 'Minor')]
+        assert scores.max() == pytest.approx(1.0)
+
+def test_scores_are_pearson_correlations():
+    rng = np.random.default_rng(0)
+    chroma = rng.random((12, 5))
+    scores = score_keys(chroma)
+    assert scores.shape == (24, 5)
+
+    profiles = [np.roll(profile, root) for root in range(12) for profile in (MAJOR_PROFILE, MINOR_PROFILE)]
+    for column in range(chroma.shape[1]):
+        expected = [np.corrcoef(profile, chroma[:, column])[0, 1] for profile in profiles]
+        np.testing.assert_allclose(scores[:, column], expected)
+
+def test_constant_chroma_scores_zero():
+    np.testing.assert_array_equal(score_keys(np.ones((12, 3))), 0)
+
+def test_synthetic_track_key(analysed_track, synthetic_track):
+    assert analysed_track.key == synthetic_track[1]['key']
+    start_times, keys = analysed_track.key_track
+    assert start_times[0] == 0
+    assert set(keys) == {synthetic_track[1]['key']}
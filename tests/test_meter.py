@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from analyse import METERS, score_meters
+
+def accented_beats(beats_per_bar, phase, n_beats=64, seed=0):
+    # Weak beats with a little noise, and a strong accent on every downbeat
+    rng = np.random.default_rng(seed)
+    strengths = 1.0 + 0.2 * rng.standard_normal(n_beats)
+    strengths[phase::beats_per_bar] += 2.0
+    return strengths
+
+@pytest.mark.parametrize('beats_per_bar', [5, 6, 7])
+@pytest.mark.parametrize('phase', [0, 2])
+def test_odd_and_compound_meters_win(beats_per_bar, phase):
+    meters, scores, phases = score_meters(accented_beats(beats_per_bar, phase), list(METERS))
+    best = int(np.argmax(scores))
+    assert meters[best] == beats_per_bar
+    assert phases[best] == phase
+
+def test_meter_labels():
+    assert [METERS[m] for m in (5, 6, 7)] == ["5/4", "6/8", "7/8"]
+
+def test_meters_without_two_bars_are_skipped():
+    meters, scores, phases = score_meters(accented_beats(3, 0, n_beats=12), [3, 4, 5, 7])
+    assert list(meters) == [3, 4, 5]
+    assert len(scores) == len(phases) == 3
+
+def test_flat_strengths_score_zero():
+    meters, scores, phases = score_meters(np.ones(24), [3, 4])
+    np.testing.assert_array_equal(scores, 0)
+    np.testing.assert_array_equal(phases, 0)
+
+def test_synthetic_track_meter(analysed_track, synthetic_track):
+    assert analysed_track.time_signature == synthetic_track[1]['time_signature']
+    assert analysed_track.beats_per_bar == 4
@@ -0,0 +1,56 @@
+import numpy as np
+
+from structure import banded_similarity, label_segments, segment_structure
+
+def progression(chords, repeats, seed):
+    # One column per beat, four beats per chord, with a little noise
+    rng = np.random.default_rng(seed)
+    columns = []
+    for _ in range(repeats):
+        for notes in chords:
+            column = np.zeros(12)
+            column[list(notes)] = 1.0
+            columns.extend([column] * 4)
+    chroma = np.array(columns).T
+    return np.abs(chroma + 0.05 * rng.standard_normal(chroma.shape))
+
+VERSE = [(0, 4, 7), (9, 0, 4), (5, 9, 0), (7, 11, 2)]
+CHORUS = [(2, 6, 9), (11, 2, 6), (4, 8, 11), (1, 4, 8)]
+
+def test_banded_similarity_matches_full_matrix():
+    features = np.random.default_rng(0).random((12, 30))
+    unit = features / np.linalg.norm(features, axis=0)
+    full = unit.T @ unit
+    band = banded_similarity(features, 5)
+    for lag in range(6):
+        np.testing.assert_allclose(band[lag, :30 - lag], np.diag(full, lag), rtol=1e-5)
+        np.testing.assert_array_equal(band[lag, 30 - lag:], 0)
+
+def test_repeated_sections_share_a_label():
+    chroma = np.hstack([progression(VERSE, 2, 0), progression(CHORUS, 2, 1),
+                        progression(VERSE, 2, 2), progression(CHORUS, 2, 3)])
+    start_times, labels = segment_structure(chroma, 0.5)
+    assert labels == ['A', 'B', 'A', 'B']
+    # Boundaries may land a beat or two off, as each feature spans several beats
+    np.testing.assert_allclose(start_times, [0, 16, 32, 48], atol=1.0)
+
+def test_silent_lead_in_gets_its_own_label():
+    chroma = np.abs(np.random.default_rng(0).standard_normal((12, 200)))
+    chroma[:, :20] = 0.0
+    start_times, labels = segment_structure(chroma, 0.5)
+    assert labels == ['A', 'B']
+    np.testing.assert_allclose(start_times, [0, 10])
+
+def test_silent_segments_are_grouped_together():
+    features = np.abs(np.random.default_rng(0).standard_normal((12, 70)))
+    features[:, :10] = 0.0
+    features[:, 50:60] = 0.0
+    assert label_segments(features, np.array([0, 10, 50, 60])) == ['A', 'B', 'A', 'B']
+
+def test_all_silent_segments():
+    assert label_segments(np.zeros((12, 40)), np.array([0, 20])) == ['A', 'A']
+
+def test_short_tracks_are_one_section():
+    start_times, labels = segment_structure(np.ones((12, 10)), 0.5)
+    assert labels == ['A']
+    np.testing.assert_array_equal(start_times, [0])
@@ -0,0 +1,164 @@
+import tempfile
+
+import numpy as np
+
+class WaveformPyramid:
+    """
+    A multi-resolution min/max envelope of a waveform.
+
+    Each level stores the minimum and maximum sample of consecutive bins, with
+    every level `factor` times coarser than the one below it. Drawing a time
+    range then only needs the level whose bin count matches the number of
+    pixels on screen, so the cost of a redraw does not depend on the track
+    length or the zoom. When the view is narrow enough the raw samples are
+    drawn instead, so sample-accurate detail is still available.
+
+    Attributes:
+        sr (int): The sample rate of the waveform.
+        duration (float): The length of the waveform in seconds.
+        levels (list[tuple]): (samples_per_bin, mins, maxs) tuples, finest first.
+        signal (np.ndarray): The raw samples, or None if only envelopes are
+            kept. After compact() this is a read-only memory map of a
+            temporary file rather than an array in memory.
+    """
+
+    def __init__(self, levels, sr, duration, signal=None):
+        self.levels = levels
+        self.sr = sr
+        self.duration = duration
+        self.signal = signal
+
+    @classmethod
+    def from_signal(cls, y, sr, base_bin=16, factor=4, min_bins=1024):
+        """
+        Builds the pyramid from a full waveform.
+
+        Args:
+            y (np.ndarray): The audio time series.
+            sr (int): The sample rate of y.
+            base_bin (int): The number of samples per bin in the finest level.
+            factor (int): The reduction between consecutive levels.
+            min_bins (int): Stop once a level has fewer bins than this.
+        """
+        n_bins = int(np.ceil(len(y) / base_bin))
+        padded = np.pad(y, (0, n_bins * base_bin - len(y)), mode='edge')
+        frames = padded.reshape(n_bins, base_bin)
+        mins, maxs = frames.min(axis=1), frames.max(axis=1)
+
+        levels = [(base_bin, mins, maxs)]
+        samples_per_bin = base_bin
+        while len(mins) > min_bins:
+            n_bins = int(np.ceil(len(mins) / factor))
+            pad = n_bins * factor - len(mins)
+            mins = np.pad(mins, (0, pad), mode='edge').reshape(n_bins, factor).min(axis=1)
+            maxs = np.pad(maxs, (0, pad), mode='edge').reshape(n_bins, factor).max(axis=1)
+            samples_per_bin *= factor
+            levels.append((samples_per_bin, mins, maxs))
+
+        return cls(levels, sr, len(y) / sr, signal=y)
+
+    @classmethod
+    def from_overview(cls, overview, duration, sr):
+        """
+        Builds a single-level pyramid from a cached (2, bins) min/max overview.
+
+        Args:
+            overview (np.ndarray): The waveform_overview of an AudioAnalyser.
+            duration (float): The length of the audio in seconds.
+            sr (int): The sample rate the overview was computed at.
+        """
+        samples_per_bin = duration * sr / overview.shape[1]
+        return cls([(samples_per_bin, overview[0], overview[1])], sr, duration)
+
+    def compact(self, max_bins=2**18, spill_signal=True):
+        """
+        Returns a copy of the pyramid that holds only a few MB in memory.
+
+        Levels with more than max_bins bins are dropped, keeping at least the
+        coarsest one. The raw samples are written to an anonymous temporary
+        file and memory-mapped, so the operating system pages in only the
+        part being viewed and the disk space is freed with the pyramid.
+
+        Args:
+            max_bins (int): The most bins any kept level may have.
+            spill_signal (bool): Keep the raw samples on disk instead of
+                discarding them. Views narrower than the finest kept level
+                are then binned from the mapped samples.
+        """
+        levels = [level for level in self.levels if len(level[1]) <= max_bins] or self.levels[-1:]
+        signal = None
+        if spill_signal and self.signal is not None:
+            with tempfile.TemporaryFile() as f:
+                np.asarray(self.signal, dtype=np.float32).tofile(f)
+                f.flush()
+                # The mapping keeps its own handle, so the file can be closed
+                signal = np.memmap(f, dtype=np.float32, mode='r', shape=(len(self.signal),))
+        return WaveformPyramid(levels, self.sr, self.duration, signal=signal)
+
+    @property
+    def nbytes(self):
+        """The memory held by the envelopes, not counting a mapped signal."""
+        size = sum(mins.nbytes + maxs.nbytes for _, mins, maxs in self.levels)
+        if self.signal is not None and not isinstance(self.signal, np.memmap):
+            size += self.signal.nbytes
+        return size
+
+    @property
+    def peak(self):
+        """The largest absolute amplitude in the waveform."""
+        _, mins, maxs = self.levels[-1]
+        return float(max(np.abs(mins).max(), np.abs(maxs).max()))
+
+    def view(self, start, end, max_points):
+        """
+        Returns the (x, y) points to draw for a time range.
+
+        Args:
+            start (float): The start of the visible range in seconds.
+            end (float): The end of the visible range in seconds.
+            max_points (int): Roughly how many points the view can show,
+                e.g. twice its width in pixels.
+        """
+        start = max(0.0, start)
+        end = min(self.duration, end)
+        if end <= start:
+            return np.zeros(0), np.zeros(0)
+
+        first_sample = int(start * self.sr)
+        last_sample = int(np.ceil(end * self.sr))
+
+        # Zoomed in far enough to draw every sample
+        if self.signal is not None and last_sample - first_sample <= max_points:
+            last_sample = min(last_sample + 1, len(self.signal))
+            x = np.arange(first_sample, last_sample) / self.sr
+            return x, self.signal[first_sample:last_sample]
+
+        # Narrower than the finest level can resolve, so bin the raw samples
+        finest = self.levels[0][0]
+        if self.signal is not None and last_sample - first_sample < max_points / 2 * finest:
+            available = max(1, min(len(self.signal), last_sample) - first_sample)
+            samples_per_bin = int(np.clip(np.ceil(2 * (last_sample - first_sample) / max_points), 1, available))
+            n_bins = available // samples_per_bin
+            frames = np.asarray(self.signal[first_sample:first_sample + n_bins * samples_per_bin])
+            frames = frames.reshape(n_bins, samples_per_bin)
+            x = np.repeat(first_sample + (np.arange(n_bins) + 0.5) * samples_per_bin, 2) / self.sr
+            y = np.empty(len(x), dtype=frames.dtype)
+            y[0::2] = frames.min(axis=1)
+            y[1::2] = frames.max(axis=1)
+            return x, y
+
+        # Otherwise use the finest level that fits, falling back to the coarsest
+        for samples_per_bin, mins, maxs in self.levels:
+            if (last_sample - first_sample) / samples_per_bin <= max_points / 2:
+                break
+
+        first_bin = int(first_sample // samples_per_bin)
+        last_bin = min(int(np.ceil(last_sample / samples_per_bin)) + 1, len(mins))
+        bin_times = (np.arange(first_bin, last_bin) + 0.5) * samples_per_bin / self.sr
+
+        # Draw one vertical stroke per bin from its minimum to its maximum
+        x = np.repeat(bin_times, 2)
+        y = np.empty(len(x), dtype=mins.dtype)
+        y[0::2] = mins[first_bin:last_bin]
+        y[1::2] = maxs[first_bin:last_bin]
+        return x, y